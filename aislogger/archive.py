@@ -0,0 +1,412 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# archive.py (part of "AIS Logger")
+# Bulk import of raw data archives
+#
+# Decodes a file of raw NMEA sentences in several processes and writes
+# the result to a log file in the same format as the logging in the
+# program does (see doc/logfileformat.md), without any GUI or threads
+#
+# Copyright (c) 2006-2009 Erik I.J. Olsson <olcai@users.sourceforge.net>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import datetime
+import multiprocessing
+import optparse
+import os
+import shutil
+import sqlite3 as sqlite
+import tempfile
+import unittest
+
+import decode
+from util import georef
+
+# The messages that are logged, like in MainThread.DbUpdate. Message 4
+# is only logged if base stations are
+logged_messages = set(['1', '2', '3', '4', '5', '18', '19', '24',
+                       'S02', 'S0E', 'S0F'])
+# The columns of the metadata table, after time and MMSI
+metadata_fields = ('imo', 'name', 'type', 'callsign', 'destination', 'eta',
+                   'length', 'width')
+# The number of bytes after the end of a chunk that are read to find
+# the rest of multi-sentence messages started in the chunk
+lookahead = 65536
+
+def splitarchive(filename, chunksize):
+    # Splits the file filename in byte ranges of about chunksize bytes,
+    # each ending with a line break (or the end of the file). Returns
+    # a list of (start, end)
+    size = os.path.getsize(filename)
+    ranges = []
+    archive = open(filename, 'rb')
+    start = 0
+    while start < size:
+        archive.seek(min(start + chunksize, size))
+        # Move on to the start of the next line
+        archive.readline()
+        end = min(archive.tell(), size)
+        ranges.append((start, end))
+        start = end
+    archive.close()
+    return ranges
+
+def decodechunk(arguments):
+    # Decodes the sentences in the byte range start to end of the file
+    # filename, and returns the rows for the position and metadata
+    # tables as two lists, and the first and last time of a line in
+    # the chunk (or None). Each row starts with the time and the file
+    # offset of the sentence, used to sort the rows. Multi-sentence
+    # messages belong to the chunk where they start, so the lines
+    # after end are read for their last parts, while parts at the
+    # start of the chunk of messages started before it are skipped.
+    # Messages get the time from the tag block or timestamp of their
+    # line, or else the time of the last line before it with a time.
+    # The time is None before the first line with a time in the
+    # chunk, and is set by importarchive
+    filename, start, end, basestations = arguments
+    archive = open(filename, 'rb')
+    archive.seek(start)
+    data = archive.read(end - start)
+    following = archive.read(lookahead)
+    archive.close()
+    if not data.endswith('\n'):
+        data += '\n'
+    positions = []
+    metadata = []
+    reassembler = decode.Reassembler()
+    first = last = None
+    for linestart, lineend in decode.checksumranges(data):
+        sentence, timestamp = decode.splittimestamp(data[linestart:lineend])
+        if timestamp is not None:
+            last = timestamp.replace(microsecond=0).isoformat()
+            if first is None:
+                first = last
+        message = decodesentence(reassembler, sentence, timestamp)
+        if message is not None:
+            makerows(message, last, start + linestart, basestations, positions, metadata)
+    chunklast = last
+    # Finish the multi-sentence messages started in this chunk
+    for linestart, lineend in decode.checksumranges(following):
+        if not reassembler.fragments:
+            break
+        sentence, timestamp = decode.splittimestamp(following[linestart:lineend])
+        telegram = sentence.split(',', 5)
+        if telegram[0] != '!AIVDM' or len(telegram) < 6:
+            continue
+        if telegram[2] == '1':
+            # A new message with the same id ends an unfinished one
+            reassembler.fragments.pop(('File', telegram[4], telegram[3]), None)
+            continue
+        if timestamp is not None:
+            last = timestamp.replace(microsecond=0).isoformat()
+        message = decodesentence(reassembler, sentence, timestamp)
+        if message is not None:
+            makerows(message, last, end + linestart, basestations, positions, metadata)
+    return positions, metadata, first, chunklast
+
+def decodesentence(reassembler, sentence, timestamp):
+    # Decodes a checked sentence, joining multi-sentence messages with
+    # reassembler. Returns the decoded message or None
+    try:
+        if sentence.startswith('!AIVDM'):
+            message = reassembler.add('File', sentence, checked=True)
+            if not message:
+                return None
+            return decode.payloadparser(message[0], True, timestamp)
+        elif sentence.startswith('$PAIS'):
+            return decode.telegramparser(sentence, True, timestamp)
+    except (ValueError, KeyError, IndexError):
+        # A sentence with a valid checksum but broken contents
+        return None
+    return None
+
+def makerows(message, time, offset, basestations, positions, metadata):
+    # Appends the rows for the position and the metadata table from
+    # the decoded message to positions and metadata, with time (an ISO
+    # 8601 string or None)
+    if message.get('message') not in logged_messages:
+        return
+    if message['message'] == '4' and not basestations:
+        return
+    mmsi = message['mmsi']
+    if 'latitude' in message and 'longitude' in message:
+        latitude = message['latitude']
+        longitude = message['longitude']
+        try:
+            position_georef = georef(latitude, longitude)
+        except:
+            position_georef = None
+        positions.append((time, offset, mmsi, tofloat(latitude),
+                          tofloat(longitude), position_georef,
+                          tofloat(message.get('sog')),
+                          tofloat(message.get('cog'))))
+    # Static data, with the fields that are in the message
+    fields = [field for field in metadata_fields if field in message]
+    if fields:
+        row = [time, offset, mmsi, ','.join(fields)]
+        for field in metadata_fields:
+            value = message.get(field)
+            # Numbers are removed from the destination, like in
+            # MainThread.DbUpdate
+            if field == 'destination' and value:
+                value = ''.join([letter for letter in value if not letter.isdigit()])
+            row.append(value)
+        metadata.append(tuple(row))
+
+def filltime(rows, time):
+    # Returns rows with the time set to time where it is None
+    return [row[0] is None and (time,) + row[1:] or row for row in rows]
+
+def tofloat(value):
+    # Converts decimals to float, like MainThread.dblog does
+    if value is None:
+        return None
+    return float(value)
+
+def initworker():
+    # Floats are faster and give the same values in the log file
+    decode.setnumericbackend('float')
+
+def importarchive(filename, logfile, processes=None, chunksize=8*1024*1024,
+                  interval=0, basestations=False):
+    # Decodes the raw data file filename in processes processes (as
+    # many as there are cores if None) and adds the result to the log
+    # file logfile, in time order. If interval is set, a position is
+    # only logged if it is at least interval seconds newer than the
+    # last logged position of the object. Returns the number of rows
+    # added to the position and metadata tables
+    connection = sqlite.connect(logfile)
+    createtables(connection)
+    cursor = connection.cursor()
+    chunks = [(filename, start, end, basestations)
+              for start, end in splitarchive(filename, chunksize)]
+    # Rows of lines without a time get the time of the last line
+    # before them with a time, also in an earlier chunk (so the chunks
+    # are taken in order). The rows before the first line with a time
+    # get the time of that line, or the time of the import if no line
+    # has a time
+    first = previous = None
+    pool = multiprocessing.Pool(processes, initworker)
+    try:
+        for positions, metadata, chunkfirst, chunklast in pool.imap(decodechunk, chunks):
+            if previous is not None:
+                positions = filltime(positions, previous)
+                metadata = filltime(metadata, previous)
+            cursor.executemany("INSERT INTO import_position VALUES (?, ?, ?, ?, ?, ?, ?, ?)", positions)
+            cursor.executemany("INSERT INTO import_metadata VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", metadata)
+            first = first or chunkfirst
+            previous = chunklast or previous
+    finally:
+        pool.close()
+        pool.join()
+    if first is None:
+        first = datetime.datetime.now().replace(microsecond=0).isoformat()
+    cursor.execute("UPDATE import_position SET time = ? WHERE time IS NULL;", (first,))
+    cursor.execute("UPDATE import_metadata SET time = ? WHERE time IS NULL;", (first,))
+    position_rows = mergepositions(connection, interval)
+    metadata_rows = mergemetadata(connection)
+    connection.commit()
+    connection.close()
+    return position_rows, metadata_rows
+
+def createtables(connection):
+    # Creates the log tables if needed, and the temporary tables where
+    # the decoded rows are collected before they are copied in time
+    # order to the log tables
+    cursor = connection.cursor()
+    cursor.execute("CREATE TABLE IF NOT EXISTS position (time, mmsi, latitude, longitude, georef, sog, cog);")
+    cursor.execute("CREATE TABLE IF NOT EXISTS metadata (time, mmsi, imo, name, type, callsign, destination, eta, length, width);")
+    cursor.execute("CREATE TEMPORARY TABLE import_position (time, offset, mmsi, latitude, longitude, georef, sog, cog);")
+    cursor.execute("CREATE TEMPORARY TABLE import_metadata (time, offset, mmsi, fields, imo, name, type, callsign, destination, eta, length, width);")
+
+def mergepositions(connection, interval):
+    # Copies the imported positions in time order to the position
+    # table, and returns the number of rows added
+    cursor = connection.cursor()
+    if not interval:
+        cursor.execute("INSERT INTO position (time, mmsi, latitude, longitude, georef, sog, cog) SELECT time, mmsi, latitude, longitude, georef, sog, cog FROM import_position ORDER BY time, offset;")
+        return cursor.rowcount
+    # Only log a position for each object every interval seconds
+    insert = connection.cursor()
+    rows = []
+    count = 0
+    lasttime = {}
+    interval = datetime.timedelta(seconds=interval)
+    for row in cursor.execute("SELECT time, mmsi, latitude, longitude, georef, sog, cog FROM import_position ORDER BY time, offset;"):
+        time = datetime.datetime.strptime(row[0], '%Y-%m-%dT%H:%M:%S')
+        if row[1] in lasttime and time - lasttime[row[1]] < interval:
+            continue
+        lasttime[row[1]] = time
+        rows.append(row)
+        if len(rows) >= 10000:
+            insert.executemany("INSERT INTO position (time, mmsi, latitude, longitude, georef, sog, cog) VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            count += len(rows)
+            rows = []
+    insert.executemany("INSERT INTO position (time, mmsi, latitude, longitude, georef, sog, cog) VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+    return count + len(rows)
+
+def mergemetadata(connection):
+    # Combines the imported static data of each object in time order,
+    # and adds a row to the metadata table when it changes, in the
+    # same way as MainThread.dblog does for objects with an IMO number
+    # (where N/A counts as a number). Returns the number of rows added
+    cursor = connection.cursor()
+    insert = connection.cursor()
+    objects = {}
+    rows = []
+    for row in cursor.execute("SELECT * FROM import_metadata ORDER BY time, offset;"):
+        time, offset, mmsi, fields = row[:4]
+        values = dict(zip(metadata_fields, row[4:]))
+        current = objects.setdefault(mmsi, dict.fromkeys(metadata_fields))
+        old = tuple([current[field] for field in metadata_fields])
+        for field in fields.split(','):
+            # N/A is kept apart from not known, as in the object
+            # database of the program
+            if values[field] is None:
+                current[field] = 'N/A'
+            else:
+                current[field] = values[field]
+        new = tuple([current[field] for field in metadata_fields])
+        if current['imo'] and new != old:
+            data = [time, mmsi]
+            for value in new:
+                if value == 'N/A':
+                    value = None
+                data.append(value)
+            rows.append(data)
+    insert.executemany("INSERT INTO metadata (time, mmsi, imo, name, type, callsign, destination, eta, length, width) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    return len(rows)
+
+
+class TestArchive(unittest.TestCase):
+    position = '!AIVDM,1,1,,A,13uTAH002nJRLAHEwTi674rh04:8,0*2B\r\n'
+    static = ['!AIVDM,2,1,2,A,53u1V`01gnR5<DTn221>qB0thtJ222222222220l0pJ644b?e=kSlTRk,0*0E\r\n',
+              '!AIVDM,2,2,2,A,l2CQp8888888880,2*22\r\n']
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'archive.txt')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, lines):
+        archive = open(self.filename, 'wb')
+        archive.write(''.join(lines))
+        archive.close()
+
+    def testsplitarchive(self):
+        self.write([self.position] * 10 + [self.position.strip()])
+        data = open(self.filename, 'rb').read()
+        for chunksize in (1, 30, len(self.position), 100, 10000):
+            ranges = splitarchive(self.filename, chunksize)
+            # The ranges follow each other and end at line breaks (or
+            # the end of the file)
+            self.assertEqual(ranges[0][0], 0)
+            self.assertEqual(ranges[-1][1], len(data))
+            for (start, end), (nextstart, nextend) in zip(ranges, ranges[1:]):
+                self.assertEqual(end, nextstart)
+                self.assertEqual(data[end-1], '\n')
+        self.assertEqual(len(splitarchive(self.filename, 100)), 4)
+        self.assertEqual(splitarchive(self.filename, 10000), [(0, len(data))])
+
+    def testdecodechunk(self):
+        # A message split between two chunks belongs to the first
+        lines = ['2009-05-05 19:20:35 ' + self.position, self.static[0],
+                 self.static[1], self.position]
+        self.write(lines)
+        middle = len(lines[0]) + len(lines[1])
+        positions, metadata, first, last = decodechunk((self.filename, 0, middle, False))
+        self.assertEqual([row[:3] for row in positions], [('2009-05-05T19:20:35', 0, 265884000)])
+        self.assertEqual([row[:4] for row in metadata], [('2009-05-05T19:20:35', middle, 265316000, 'imo,name,type,callsign,destination,eta,length,width')])
+        self.assertEqual(metadata[0][5], 'S.T OLOF')
+        self.assertEqual((first, last), ('2009-05-05T19:20:35', '2009-05-05T19:20:35'))
+        # Lines without a time before the first one with a time in the
+        # chunk get None
+        positions, metadata, first, last = decodechunk((self.filename, middle, sum(map(len, lines)), False))
+        self.assertEqual([row[:3] for row in positions], [(None, middle + len(lines[2]), 265884000)])
+        self.assertEqual(metadata, [])
+        self.assertEqual((first, last), (None, None))
+        # The last part is only looked for lookahead bytes after the
+        # end of the chunk
+        filler = [self.position] * (lookahead // len(self.position) + 1)
+        self.write([self.static[0]] + filler + [self.static[1]])
+        positions, metadata, first, last = decodechunk((self.filename, 0, len(self.static[0]), False))
+        self.assertEqual(positions, [])
+        self.assertEqual(metadata, [])
+        self.write([self.static[0]] + filler[:-2] + [self.static[1]])
+        positions, metadata, first, last = decodechunk((self.filename, 0, len(self.static[0]), False))
+        self.assertEqual(len(metadata), 1)
+
+    def testmergepositions(self):
+        rows = [('2009-05-05T19:20:40', 10, 1), ('2009-05-05T19:20:35', 300, 2),
+                ('2009-05-05T19:20:35', 200, 1), ('2009-05-05T19:20:50', 0, 1)]
+        for interval, correct in ((0, [(1, '2009-05-05T19:20:35'), (2, '2009-05-05T19:20:35'),
+                                       (1, '2009-05-05T19:20:40'), (1, '2009-05-05T19:20:50')]),
+                                  (10, [(1, '2009-05-05T19:20:35'), (2, '2009-05-05T19:20:35'),
+                                        (1, '2009-05-05T19:20:50')])):
+            connection = sqlite.connect(':memory:')
+            createtables(connection)
+            connection.executemany("INSERT INTO import_position VALUES (?, ?, ?, 57.7, 11.85, 'NKAL 5142', 0.0, 0.0)", rows)
+            self.assertEqual(mergepositions(connection, interval), len(correct))
+            result = connection.execute("SELECT mmsi, time FROM position ORDER BY rowid;").fetchall()
+            self.assertEqual(result, correct)
+            connection.close()
+
+    def testimportarchive(self):
+        # Lines without a time get the time of the last line before
+        # them with one (or of the first line with a time), also from
+        # other chunks, and the rows are logged in file order
+        others = ['!AIVDM,1,1,,A,13u?etPRR;Pn:dDPwUM1Ti@R0000,0*11\r\n',
+                  '!AIVDM,1,1,,B,33KMWfgP?w<tSF0l4Q@>4?wp0000,0*7B\r\n']
+        lines = ([self.position] + others * 5 +
+                 ['2009-05-05 19:20:35 ' + self.position] + others * 5 +
+                 ['2009-05-05 19:20:36 ' + self.position] + others * 5)
+        self.write(lines)
+        logfile = os.path.join(self.directory, 'log.db')
+        self.assertEqual(importarchive(self.filename, logfile, 2, 200), (33, 0))
+        connection = sqlite.connect(logfile)
+        times = [row[0] for row in connection.execute("SELECT time FROM position ORDER BY rowid;")]
+        connection.close()
+        self.assertEqual(times, ['2009-05-05T19:20:35'] * 22 + ['2009-05-05T19:20:36'] * 11)
+
+
+if __name__ == '__main__':
+    cmdlineparser = optparse.OptionParser(usage="%prog [options] file...")
+    cmdlineparser.add_option("-o", "--logfile", dest="logfile", default="aislogger.db", help="Log file to add the decoded data to")
+    cmdlineparser.add_option("-p", "--processes", type="int", dest="processes", default=None, help="Number of processes (default is one for each core)")
+    cmdlineparser.add_option("-s", "--chunksize", type="int", dest="chunksize", default=8, help="Size in megabytes of the parts of the file decoded by each process")
+    cmdlineparser.add_option("-i", "--interval", type="int", dest="interval", default=0, help="Only log a position for an object every this many seconds")
+    cmdlineparser.add_option("-b", "--basestations", action="store_true", dest="basestations", default=False, help="Log base stations")
+    (options, args) = cmdlineparser.parse_args()
+    if not args:
+        cmdlineparser.error("No file to import")
+    for filename in args:
+        started = datetime.datetime.now()
+        positions, metadata = importarchive(filename, options.logfile,
+                                            options.processes,
+                                            options.chunksize * 1024 * 1024,
+                                            options.interval,
+                                            options.basestations)
+        elapsed = datetime.datetime.now() - started
+        elapsed = elapsed.seconds + elapsed.microseconds / 1e6
+        print "%s: %d positions and %d metadata rows in %.1f s (%.0f bytes/s)" % (filename, positions, metadata, elapsed, os.path.getsize(filename) / elapsed)
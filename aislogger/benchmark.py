@@ -0,0 +1,284 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# benchmark.py (part of "AIS Logger")
+# Decoder benchmarks
+#
+# Measures the time it takes to decode a fixed set of sentences, one
+# for each message type that decode.telegramparser supports. The
+# suite (-s) measures each step of the decoding per message type and
+# can save the result as JSON (-j), to compare with a later run (-c)
+#
+# Copyright (c) 2006-2009 Erik I.J. Olsson <olcai@users.sourceforge.net>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import gc
+import json
+import optparse
+import platform
+import timeit
+
+import decode
+
+# A fixed corpus of sentences as (message type, sentence)
+corpus = [('1', '!AIVDM,1,1,,A,13u?etPRR;Pn:dDPwUM1Ti@R0000,0*11'),
+          ('3', '!AIVDM,1,1,,B,33KMWfgP?w<tSF0l4Q@>4?wp0000,0*7B'),
+          ('4', '!AIVDM,1,1,,A,402R5PiuUF=>?wiFP1dm<H100000,0*51'),
+          ('5', '!AIVDM,1,1,,A,53fATb02;`2oTPTWF21LTi<tr0hDU@R2222222169`;676p`0=iCA1C`888888888888880,2*51'),
+          ('5', '!AIVDM,2,1,2,A,53u1V`01gnR5<DTn221>qB0thtJ222222222220l0pJ644b?e=kSlTRk,0*0E\n!AIVDM,2,2,2,A,l2CQp8888888880,2*22'),
+          ('6', '!AIVDM,1,1,,A,63u?etTwCsO<04000PDhhv1<PU0,2*74'),
+          ('8', '!AIVDM,1,1,,A,802R5Ph0BkBTT0EjR36nS2D>ROoJ7wwE=hH0bl0jlGwwwhpIT11;B@V5GP0,2*30'),
+          ('9', '!AIVDM,1,1,,A,91b55wi;hbOS@OdQAC0632P000000,5*15'),
+          ('12', '!AIVDM,1,1,,A,<42Lati0W:Ov=C7P6B?=Pjoihhjhqq,0*19'),
+          ('14', '!AIVDM,1,1,,A,>5?Per18=HB1U:1@E=B0m<L,2*51'),
+          ('18', '!AIVDM,1,1,,A,B52K>;h00Fc>jpUlNV@icwpUl000,0*21'),
+          ('19', '!AIVDM,1,1,,A,C5N3SRP0EnJGEBT>NhTDwwo062PaLELTBJ:V00000000S0D:R220,0*51'),
+          ('21', '!AIVDM,1,1,,B,E>jbWG760W3Rh50W00000000000Okvu@@3><050`HHv000,4*4A'),
+          ('24', '!AIVDM,1,1,,A,H42O55i18tMET00000000000000,2*6D'),
+          ('24', '!AIVDM,1,1,,A,H42O55lti4hhhilD3nink0000000,0*4A'),
+          ('27', '!AIVDM,1,1,,B,K3u?et`0KiT>N6?D,0*1D'),
+          ('S02', '$PAIS,02,0FD2B9F2,8A,1,20FE4A0,06C4E90,08B,0FC,028,00,1,0,0*6F'),
+          ('S04', '$PAIS,04,0FD2B9F2,00,HELLO "THERE",0FD2B9F3,0*12'),
+          ('S06', '$PAIS,06,0FD2B9F2,00,BROADCAST TEXT,0*7C'),
+          ('S07', '$PAIS,07,0FD2B9F2,00,00048454C4C4F,0FD2B9F3,0,0040,0*46'),
+          ('S09', '$PAIS,09,0FD2B9F2,00,ABCDEF,0,0040,0*22'),
+          ('S0D', '$PAIS,0D,06A1DBFF,213EBE0,FC73CC0,02A,60C,12F,0*0F'),
+          ('S0E', '$PAIS,0E,0FD2B9F2,WILSON LEITH@@@@,9HII5@@,008BA06D,0*00'),
+          ('S0F', '$PAIS,0F,0FD2B9F2,46,37,061C781C,EMDEN@@@,0,11170800,0*58')]
+
+def schemalayout(payload):
+    # Returns the fields telegramparser extracts from payload, taken
+    # from decode.aivdm_schema and given as (start, end, kind) where
+    # kind is 'int' or 'text'
+    bits, nbits = decode.sixtoint(payload)
+    key = decode.bitfield(bits, nbits, 0, 6)
+    if key in decode.partitioned_types:
+        key = (key, decode.bitfield(bits, nbits, 38, 40))
+    fields = decode.aivdm_schema.get(key)
+    if fields is None:
+        return None
+    layout = [(0, 6, 'int')]
+    for name, offset, width, kind, scale, na in decode.aivdm_header + fields:
+        if kind in ('text', 'content'):
+            layout.append((offset, offset + width, 'text'))
+        elif kind not in ('binary', 'rawbinary'):
+            layout.append((offset, offset + width, 'int'))
+    return layout
+
+def stringcore(payload, layout):
+    # Extracts all fields in layout the way telegramparser used to do
+    # it, from a string of '0' and '1'
+    bindata = decode.sixtobin(payload)
+    fields = []
+    for start, end, kind in layout:
+        if kind == 'text':
+            fields.append(decode.bintoascii(bindata[start:end]))
+        else:
+            fields.append(int(bindata[start:end],2))
+    return fields
+
+def integercore(payload, layout):
+    # Extracts all fields in layout from a single integer
+    bits, nbits = decode.sixtoint(payload)
+    fields = []
+    for start, end, kind in layout:
+        if kind == 'text':
+            fields.append(decode.inttoascii(bits, nbits, start, end))
+        else:
+            fields.append(decode.bitfield(bits, nbits, start, end))
+    return fields
+
+def timeit_us(function, args, number):
+    # Returns the best time of three runs in microseconds per call
+    timer = timeit.Timer(lambda: function(*args))
+    return min(timer.repeat(3, number)) / number * 1e6
+
+def allocations(function, args, number):
+    # Returns the number of objects tracked by the garbage collector
+    # (containers like dicts, lists and tuples) that each call creates
+    # and that are still alive when it returns, with the results
+    # kept. Python 2 has no counter of all allocations, so temporary
+    # objects, strings and numbers and objects reused from the free
+    # lists of the interpreter are not included
+    results = [None] * number
+    # The first call may set up objects that are kept between calls
+    function(*args)
+    enabled = gc.isenabled()
+    gc.disable()
+    gc.collect()
+    # The count of the collector does not go below 0, so keep some
+    # objects to not lose the ones freed by the calls
+    padding = [[] for i in xrange(1000)]
+    try:
+        before = gc.get_count()[0]
+        for i in xrange(number):
+            results[i] = function(*args)
+        after = gc.get_count()[0]
+    finally:
+        if enabled:
+            gc.enable()
+    return float(after - before) / number
+
+def fulldecode(sentence):
+    # Decodes sentence the way CommHubThread does, with the sentences
+    # of a multi-sentence message joined first
+    if '\n' in sentence:
+        sentence = decode.jointelegrams(sentence)
+    return decode.telegramparser(sentence)
+
+def checksums(lines):
+    # Checks the checksum of each sentence in lines
+    for line in lines:
+        decode.checksum(line)
+
+def operations(sentence):
+    # Returns the decoding steps measured for sentence as a list of
+    # (name, function, arguments). The 6-bit conversions are only
+    # measured for AIVDM sentences
+    lines = sentence.splitlines()
+    steps = [('checksum', checksums, (lines,)),
+             ('jointelegrams', decode.jointelegrams, (sentence,))]
+    if sentence.startswith('!AIVDM'):
+        payload = ''.join([line.split(',')[5] for line in lines])
+        steps.append(('sixtobin', decode.sixtobin, (payload,)))
+        steps.append(('bintoascii', decode.bintoascii,
+                      (decode.sixtobin(payload),)))
+    steps.append(('decode', fulldecode, (sentence,)))
+    return steps
+
+def corpusnames():
+    # Returns a unique name for each sentence in the corpus, the
+    # message type followed by a number for types with several
+    # sentences (like 24#2 for the second type 24 sentence)
+    names = []
+    counts = {}
+    for message, sentence in corpus:
+        counts[message] = counts.get(message, 0) + 1
+        if counts[message] > 1:
+            names.append('%s#%d' % (message, counts[message]))
+        else:
+            names.append(message)
+    return names
+
+def runsuite(number=2000):
+    # Measures each decoding step for each sentence in the corpus and
+    # returns the result as a dictionary that can be saved as JSON.
+    # The static data cache is turned off, to measure the decoding
+    # instead of the cache
+    maxsize = decode.static_cache.maxsize
+    decode.static_cache.maxsize = 0
+    decode.static_cache.clear()
+    result = {'python': platform.python_version(),
+              'numeric_backend': decode.numeric_backend,
+              'number': number,
+              'results': []}
+    for name, (message, sentence) in zip(corpusnames(), corpus):
+        for operation, function, args in operations(sentence):
+            result['results'].append({
+                'name': name,
+                'message': message,
+                'sentences': sentence.count('\n') + 1,
+                'operation': operation,
+                'ns': timeit_us(function, args, number) * 1000,
+                'objects': allocations(function, args, number)})
+    decode.static_cache.maxsize = maxsize
+    return result
+
+def printsuite(result, previous=None):
+    # Prints the result of runsuite as a table with the time and the
+    # objects per message for each step. If previous is given (an
+    # earlier result), the change in time is printed as well
+    before = {}
+    if previous:
+        for row in previous['results']:
+            before[(row['name'], row['operation'])] = row['ns']
+    print "%-6s %-14s %12s %8s %8s" % ('Type', 'Step', 'ns/msg',
+                                       'objects', 'change')
+    for row in result['results']:
+        change = ''
+        old = before.get((row['name'], row['operation']))
+        if old:
+            change = '%+.1f%%' % ((row['ns'] - old) / old * 100)
+        print "%-6s %-14s %12.0f %8.2f %8s" % (row['name'], row['operation'],
+                                              row['ns'], row['objects'],
+                                              change)
+
+def run(number=2000):
+    # Benchmark each sentence in the corpus and print the result
+    print "%-5s %12s %12s %8s %18s" % ('Type', 'String core', 'Int core',
+                                       'Speedup', 'telegramparser')
+    for message, sentence in corpus:
+        parser_time = timeit_us(fulldecode, (sentence,), number)
+        if '\n' in sentence:
+            sentence = decode.jointelegrams(sentence)
+        payload = sentence.split(',')[5]
+        layout = message[0] != 'S' and schemalayout(payload)
+        if layout:
+            string_time = timeit_us(stringcore, (payload, layout), number)
+            integer_time = timeit_us(integercore, (payload, layout), number)
+            print "%-5s %9.2f us %9.2f us %7.1fx %15.2f us" % (message,
+                  string_time, integer_time, string_time / integer_time,
+                  parser_time)
+        else:
+            # $PAIS sentences are hexadecimal and have no 6-bit core
+            print "%-5s %12s %12s %8s %15.2f us" % (message, '-', '-', '-',
+                                                    parser_time)
+
+def runbatch(count=100000):
+    # Compare decoding count position reports one at a time with
+    # telegramparser against decoding them at once with
+    # positionbatchparser
+    sentences = [sentence for message, sentence in corpus
+                 if message in ('1', '2', '3', '18', '19')]
+    sentences = (sentences * (count // len(sentences) + 1))[:count]
+    payloads = [sentence.split(',')[5] for sentence in sentences]
+    single_time = timeit.Timer(lambda: [decode.telegramparser(s) for s in sentences]).timeit(1)
+    batch_time = min(timeit.Timer(lambda: decode.positionbatchparser(payloads)).repeat(3, 1))
+    print "%d position reports" % count
+    print "telegramparser:      %10.0f msgs/sec" % (count / single_time)
+    print "positionbatchparser: %10.0f msgs/sec (%.0fx)" % (count / batch_time,
+                                                          single_time / batch_time)
+
+
+if __name__ == '__main__':
+    cmdlineparser = optparse.OptionParser()
+    cmdlineparser.add_option("-n", "--number", type="int", dest="number", default=2000, help="Number of decodes per timing run")
+    cmdlineparser.add_option("-b", "--batch", type="int", dest="batch", default=0, help="Benchmark the batch decoder with this many position reports instead")
+    cmdlineparser.add_option("-s", "--suite", action="store_true", dest="suite", default=False, help="Measure each decoding step for each message type instead")
+    cmdlineparser.add_option("-j", "--json", dest="json", default=None, help="Save the result of the suite as JSON to this file")
+    cmdlineparser.add_option("-c", "--compare", dest="compare", default=None, help="Compare the result of the suite with an earlier JSON file")
+    cmdlineparser.add_option("-f", "--float", action="store_true", dest="float", default=False, help="Use the float numeric backend")
+    (options, args) = cmdlineparser.parse_args()
+    if options.float:
+        decode.setnumericbackend('float')
+    if options.batch:
+        runbatch(options.batch)
+    elif options.suite or options.json or options.compare:
+        result = runsuite(options.number)
+        previous = None
+        if options.compare:
+            previous = json.load(open(options.compare))
+        printsuite(result, previous)
+        if options.json:
+            output = open(options.json, 'w')
+            json.dump(result, output, indent=1, sort_keys=True)
+            output.close()
+    else:
+        run(options.number)
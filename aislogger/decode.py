@@ -28,11 +28,18 @@
 # THE SOFTWARE.
 
 import binascii
+import calendar
+import collections
 import datetime
 import math
+import operator
+import time
 import decimal
+import StringIO
 import unittest
 
+import numpy
+
 def jointelegrams(inputstring):
     # Creates an AIVDM-message combined of several sentences with a
     # row break between each sentence
@@ -53,11 +60,19 @@ def jointelegrams(inputstring):
     fullphrase = fullphrase + csum[2:]
     return fullphrase
 
-def telegramparser(inputstring):
+def telegramparser(inputstring, lazy=False, timestamp=None):
     # This function decodes certain types of messages from the
     # receiver and returns the interesting data as a dictionary where
     # each key describes the information of each message part
 
+    # If lazy is set, decoded AIVDM messages are returned as
+    # LazyMessage objects instead, which only decode the fields that
+    # are used
+
+    # The messages are timestamped with timestamp, the time the
+    # sentence was received (see splittimestamp), or else with the
+    # current computer time
+
     # Observe that the navigational status is set as an integer
     # according to ITU-R M.1371, and is thus converted for SAAB
     # PAIS messages to these values
@@ -67,6 +82,11 @@ def telegramparser(inputstring):
     # Convert the raw input string to a list of separated values
     telegram = inputstring.split(',')
 
+    # Get current computer time to timestamp messages, if the time
+    # of reception is not known
+    if timestamp is None:
+        timestamp = datetime.datetime.now()
+
     # Depending on what sentence the list contains, extract the
     # information and create a dictionary with the MMSI number as key
     # and a value which contain another dictionary with the actual
@@ -85,227 +105,17 @@ def telegramparser(inputstring):
         # an 'S' to indicate SAAB messages
         message = 'S' + telegram[1]
 
-        # Get current computer time to timestamp messages
-        timestamp = datetime.datetime.now()
-
-        # If the sentence contains 02 - AIS Standard Position:
-        if message == 'S02':
-            # Rate of turn in degrees/minute from -127 to +127 where 128=N/A
-            rateofturn = int(telegram[3], 16)
-            if rateofturn >=0 and rateofturn <128: # Turning right
-                # Convert between ROTais and ROTind
-                rateofturn = int(math.pow((rateofturn/4.733), 2))
-                if rateofturn > 720:
-                    rateofturn = 720 # Full
-            elif rateofturn >128 and rateofturn <=255: # Turning left
-                rateofturn = 256 - rateofturn
-                # Convert between ROTais and ROTind
-                rateofturn = -int(math.pow((rateofturn/4.733), 2))
-                if rateofturn < -720:
-                    rateofturn = -720 # Full
-            else:
-                rateofturn = None # N/A
-            # Navigation status converted to ITU-R M.1371 standard
-            navstatus = telegram[4]
-            if navstatus == '1': navstatus = 0 # Under Way
-            elif navstatus == '2': navstatus = 2 # Not Under Command
-            elif navstatus == '3': navstatus = 3 # Restricted Manoeuvrability
-            elif navstatus == '4': navstatus = 1 # At Anchor
-            elif navstatus == '5': navstatus = None # (MAYDAY?) sets to N/A
-            else: navstatus = None # N/A
-            # Latitude in decimal degrees (DD)
-            latitude = calclatitude(tobin(int(telegram[5],16),27))
-            # Longitude in decimal degrees (DD)
-            longitude = calclongitude(tobin(int(telegram[6],16),28))
-            # Speed over ground in 1/10 knots
-            sog = decimal.Decimal(int(telegram[7],16)) / 10
-            if sog > decimal.Decimal("102.2"):
-                sog = None # N/A
-            # Course over ground in 1/10 degrees where 0=360
-            cog = decimal.Decimal(int(telegram[8],16)) / 10
-            if cog > 360: # 360 and above means 360=N/A
-                cog = None
-            # Heading in whole degrees between 0-359 and 511=N/A
-            heading = int(telegram[9],16)
-            if heading > 359:
-                heading = None # N/A
-            # Position accuracy where 0=bad and 1=good/DGPS
-            posacc = int(telegram[11])
-            # Return a dictionary with descriptive keys
-            return {'mmsi': mmsi,
-                    'rot': rateofturn,
-                    'navstatus': navstatus,
-                    'latitude': latitude,
-                    'longitude': longitude,
-                    'sog': sog,
-                    'cog': cog,
-                    'heading': heading,
-                    'posacc': posacc,
-                    'time': timestamp,
-                    'message': message}
-
-        # If the sentence contains message 04 - Addressed Text Telegram:
-        elif message == 'S04':
-            # Content of message in ASCII (replace any " with ')
-            content = telegram[4].replace('''"''',"'")
-            # Destination MMSI number
-            to_mmsi = int(telegram[5],16)
-            # Return a dictionary with descriptive keys
-            return {'mmsi': mmsi,
-                    'content': content,
-                    'to_mmsi': to_mmsi,
-                    'time': timestamp,
-                    'message': message}
-
-        # If the sentence contains message 06 - Broadcast Text Telegram:
-        elif message == 'S06':
-            # Content of message in ASCII (replace any " with ')
-            content = str(telegram[4]).replace('''"''',"'")
-            # Return a dictionary with descriptive keys
-            return {'mmsi': mmsi,
-                    'content': content,
-                    'time': timestamp,
-                    'message': message}
-
-        # If the sentence contains message 07 - Addressed Binary Telegram:
-        elif message == 'S07':
-            # Binary data payload
-            payload = []
-            for char in telegram[4]:
-                payload.append(tobin(int(char,16),4))
-            payload = ''.join(payload)
-            # Destination MMSI number
-            to_mmsi = int(telegram[5],16)
-            # Application ID (Designated Area Code, DAC) + (Function
-            # Identification, FI)
-            appid = []
-            for char in telegram[7]:
-                appid.append(tobin(int(char,16),4))
-            appid = ''.join(appid)
-            dac = int(appid[0:10],2)
-            fi = int(appid[10:16],2)
-            # Try to decode message payload
-            decoded = binaryparser(dac,fi,payload)
-            # Return a dictionary with descriptive keys
-            return {'mmsi': mmsi,
-                    'to_mmsi': to_mmsi,
-                    'dac': dac,
-                    'fi': fi,
-                    'decoded': decoded,
-                    'time': timestamp,
-                    'message': message}
-
-        # If the sentence contains message 09 - Broadcast Binary Telegram:
-        elif message == 'S09':
-            # Binary data payload
-            payload = []
-            for char in telegram[4]:
-                payload.append(tobin(int(char,16),4))
-            payload = ''.join(payload)
-            # Application ID (Designated Area Code, DAC) + (Function
-            # Identification, FI)
-            appid = []
-            for char in telegram[6]:
-                appid.append(tobin(int(char,16),4))
-            appid = ''.join(appid)
-            dac = int(appid[0:10],2)
-            fi = int(appid[10:16],2)
-            # Try to decode message payload
-            decoded = binaryparser(dac,fi,payload)
-            # Return a dictionary with descriptive keys
-            return {'mmsi': mmsi,
-                    'dac': dac,
-                    'fi': fi,
-                    'decoded': decoded,
-                    'time': timestamp,
-                    'message': message}
-
-        # If the sentence contains message 0D - Standard Position,
-        # aviation, or message 11 - SAR Standard Position
-        elif message == 'S0D' or message == 'S11':
-            # Latitude in decimal degrees (DD)
-            latitude = calclatitude(tobin(int(telegram[3],16),27))
-            # Longitude in decimal degrees (DD)
-            longitude = calclongitude(tobin(int(telegram[4],16),28))
-            # Speed over ground in knots
-            sog = int(telegram[5],16)
-            if sog > 1022:
-                sog = None # N/A
-            # Course over ground in 1/10 degrees where 0=360
-            cog = decimal.Decimal(int(telegram[6],16)) / 10
-            if cog > 360: # 360 and above means 360=N/A
-                cog = None
-            # Altitude in meters, 4095=N/A
-            altitude = int(telegram[7],16)
-            if altitude == 4095:
-                altitude = None # N/A
-            # Return a dictionary with descriptive keys
-            return {'mmsi': mmsi,
-                    'altitude': altitude,
-                    'sog': sog,
-                    'latitude': latitude,
-                    'longitude': longitude,
-                    'cog': cog,
-                    'time': timestamp,
-                    'message': message}
-
-        # If the sentence contains 0E - Identification Data:
-        elif message == 'S0E':
-            # Name, removes the characters @, ' ' and "
-            name = telegram[3].strip('''@ ''').replace('''"''',"'")
-            # Callsign, removes the characters @, ' ' and "
-            callsign = telegram[4].strip('''@ ''').replace('''"''',"'")
-            # IMO number where 00000000=N/A
-            imo = int(telegram[5],16)
-            if imo == 0:
-                imo = None
-            # Return a dictionary with descriptive keys
-            return {'mmsi': mmsi,
-                    'name': name,
-                    'callsign': callsign,
-                    'imo': imo,
-                    'time': timestamp,
-                    'message': message}
-
-        # If the sentence contains 0F - Vessel Data:
-        elif message == 'S0F':
-            # Ship type, a two-digit code where 00=N/A
-            type = int(telegram[3],16)
-            if type == 0:
-                type = None # N/A
-            # Draught in 1/10 meters, where 0.0 = N/A
-            draught = decimal.Decimal(int(telegram[4],16)) / 10
-            if draught == 0:
-                draught = None
-            # Calculate ship width and length in meters from
-            # antenna position in hex
-            # Convert hex->int->bits
-            ant_binnumber = tobin(int(telegram[5],16),count=30)
-            # Add integers from the two parts to form length
-            length = int(ant_binnumber[12:21],2) + int(ant_binnumber[21:30],2)
-            # Add integers from the two parts to form width
-            width = int(ant_binnumber[0:6],2) + int(ant_binnumber[6:12],2)
-            # Destination, removes the characters @, ' ' and "
-            destination = telegram[6].strip('''@ ''').replace('''"''',"'")
-            # Received estimated time of arrival in format
-            # month-day-hour-minute: MMDDHHMM where 00000000=N/A
-            eta = telegram[8]
-            if eta == '00000000':
-                eta = None
-            # Return a dictionary with descriptive keys
-            return {'mmsi': mmsi,
-                    'type': type,
-                    'draught': draught,
-                    'length': length,
-                    'width': width,
-                    'destination': destination,
-                    'eta': eta,
-                    'time': timestamp,
-                    'message': message}
+        # Decode the sentence with the parser for its message type,
+        # static data is looked up in static_cache first
+        parser = pais_parsers.get(message)
+        if parser and message in static_messages:
+            return cachedparser(inputstring.rstrip(), timestamp, parser,
+                                telegram, mmsi, message, timestamp)
+        elif parser:
+            return parser(telegram, mmsi, message, timestamp)
 
-        else:
-            # If we don't decode the message, at least return message type
-            return {'mmsi': mmsi, 'time': timestamp, 'message': message, 'decoded': False}
+        # If we don't decode the message, at least return message type
+        return {'mmsi': mmsi, 'time': timestamp, 'message': message, 'decoded': False}
 
 
     # If the sentence follows the ITU-R M.1371 standard:
@@ -314,398 +124,19 @@ def telegramparser(inputstring):
         if not checksum(inputstring):
             return
 
-        # Convert the 6-bit string to a binary string
-        bindata = sixtobin(telegram[5])
-
-        # Extract the message type number
-        message = str(int(bindata[0:6],2))
-
-        # Get the source MMSI number
-        mmsi = int(bindata[8:38],2)
-
-        # Get current computer time to timestamp messages
-        timestamp = datetime.datetime.now()
-
-        # If the sentence contains message 1, 2 or 3 - Position Report:
-        if message == '1' or message == '2' or message == '3':
-            # Navigation status according to ITU-R M.1371
-            navstatus = int(bindata[38:42],2)
-            if navstatus == 0: navstatus = 0 # Under Way
-            elif navstatus == 1: navstatus = 1 # At Anchor
-            elif navstatus == 2: navstatus = 2 # Not Under Command
-            elif navstatus == 3: navstatus = 3 # Restricted Manoeuvrability
-            elif navstatus == 4: navstatus = 4 # Constrained by her draught
-            elif navstatus == 5: navstatus = 5 # Moored
-            elif navstatus == 6: navstatus = 6 # Aground
-            elif navstatus == 7: navstatus = 7 # Engaged in Fishing
-            elif navstatus == 8: navstatus = 8 # Under way sailing
-            else: navstatus = None # N/A
-            # Rate of turn in degrees/minute from -127 to +127 where 128=N/A
-            sign_rateofturn = int(bindata[42])
-            rateofturn = int(bindata[43:50],2)
-            if rateofturn > 126:
-                rateofturn = None # N/A
-            elif sign_rateofturn and rateofturn > 1:
-                # Turning left
-                rateofturn = 128 - rateofturn
-                # Convert between ROTais and ROTind
-                rateofturn = -int(math.pow((rateofturn/4.733), 2))
-                if rateofturn < -720:
-                    rateofturn = -720 # Full
-            else:
-                # Turning right
-                # Convert between ROTais and ROTind
-                rateofturn = int(math.pow((rateofturn/4.733), 2))
-                if rateofturn > 720:
-                    rateofturn = 720 # Full
-            # Speed over ground in 1/10 knots
-            sog = decimal.Decimal(int(bindata[50:60],2)) / 10
-            if sog > decimal.Decimal("102.2"):
-                sog = None # N/A
-            # Position accuracy where 0=bad and 1=good/DGPS
-            posacc = int(bindata[60],2)
-            # Longitude in decimal degrees (DD)
-            longitude = calclongitude(bindata[61:89])
-            # Latitude in decimal degrees (DD)
-            latitude = calclatitude(bindata[89:116])
-            # Course over ground in 1/10 degrees between 0-359
-            cog = decimal.Decimal(int(bindata[116:128],2)) / 10
-            if cog > 360: # 360 and above means 360=N/A
-                cog = None
-            # Heading in whole degrees between 0-359 and 511=N/A
-            heading = int(bindata[128:137],2)
-            if heading > 359:
-                heading = None # N/A
-            # Return a dictionary with descriptive keys
-            return {'mmsi': mmsi,
-                    'rot': rateofturn,
-                    'navstatus': navstatus,
-                    'latitude': latitude,
-                    'longitude': longitude,
-                    'sog': sog,
-                    'cog': cog,
-                    'heading': heading,
-                    'posacc': posacc,
-                    'time': timestamp,
-                    'message': message}
-
-        # If the sentence contains message 4 - Base Station Report:
-        elif message == '4':
-            # Bits 38-78 contains current station time in UTC
-            try:
-                station_time = datetime.datetime(int(bindata[38:52],2),
-                                                 int(bindata[52:56],2),
-                                                 int(bindata[56:61],2),
-                                                 int(bindata[61:66],2),
-                                                 int(bindata[66:72],2),
-                                                 int(bindata[72:78],2))
-            except ValueError:
-                station_time = None # N/A
-            # Position accuracy where 0=bad and 1=good/DGPS
-            posacc = int(bindata[78],2)
-            # Longitude in decimal degrees (DD)
-            longitude = calclongitude(bindata[79:107])
-            # Latitude in decimal degrees (DD)
-            latitude = calclatitude(bindata[107:134])
-            # Return a dictionary with descriptive keys
-            return {'mmsi': mmsi,
-                    'station_time': station_time,
-                    'posacc': posacc,
-                    'latitude': latitude,
-                    'longitude': longitude,
-                    'time': timestamp,
-                    'message': message}
-
-        # If the sentence contains message 5 - Ship Static and Voyage
-        # Related Data:
-        elif message == '5' and int(bindata[38:40],2) == 0:
-            # IMO number where 00000000=N/A
-            imo = int(bindata[40:70],2)
-            if imo == 0:
-                imo = None # N/A
-            # Callsign, removes the characters @, ' ' and "
-            callsign = bintoascii(bindata[70:112]).strip('''@ ''').replace('''"''',"'")
-            # Name, removes the characters @, ' ' and "
-            name = bintoascii(bindata[112:232]).strip('''@ ''').replace('''"''',"'")
-            # Ship type, a two-digit code where 00=N/A
-            type = int(bindata[232:240],2)
-            if type == 0:
-                type = None # N/A
-            # Ship length calculated from antenna position
-            length = (int(bindata[240:249],2) + int(bindata[249:258],2))
-            # Ship width calculated from antenna position
-            width = (int(bindata[258:264],2) + int(bindata[264:270],2))
-            # Received estimated time of arrival in format
-            # month-day-hour-minute: MMDDHHMM where 00000000=N/A
-            eta = (str(int(bindata[274:278],2)).zfill(2) +
-                  str(int(bindata[278:283],2)).zfill(2) +
-                  str(int(bindata[283:288],2)).zfill(2) +
-                  str(int(bindata[288:294],2)).zfill(2))
-            if eta == '00000000':
-                eta = None
-            # Draught in 1/10 meters, where 0.0 == N/A
-            draught = decimal.Decimal(int(bindata[294:302],2)) / 10
-            if draught == 0:
-                draught = None
-            # Destination, removes the characters @, ' ' and "
-            destination = bintoascii(bindata[302:422]).strip('''@ ''').replace('''"''',"'")
-            # Return a dictionary with descriptive keys
-            return {'mmsi': mmsi,
-                    'imo': imo,
-                    'callsign': callsign,
-                    'name': name,
-                    'type': type,
-                    'length': length,
-                    'width': width,
-                    'eta': eta,
-                    'destination': destination,
-                    'draught': draught,
-                    'time': timestamp,
-                    'message': message}
-
-        # If the sentence contains message 6 - Addressed Binary Message:
-        elif message == '6':
-            # Sequence number
-            sequence = int(bindata[38:40],2)
-            # Destination MMSI number
-            to_mmsi = int(bindata[40:70],2)
-            # Application ID (Designated Area Code, DAC) + (Function
-            # Identification, FI)
-            dac = int(bindata[72:82],2)
-            fi = int(bindata[82:88],2)
-            # Binary data payload
-            payload = bindata[88:1048]
-            # Try to decode message payload
-            decoded = binaryparser(dac,fi,payload)
-            # Return a dictionary with descriptive keys
-            return {'mmsi': mmsi,
-                    'sequence': sequence,
-                    'to_mmsi': to_mmsi,
-                    'dac': dac,
-                    'fi': fi,
-                    'decoded': decoded,
-                    'time': timestamp,
-                    'message': message}
-
-        # If the sentence contains message 8 - Binary Broadcast Message:
-        elif message == '8':
-            # Application ID (Designated Area Code, DAC) + (Function
-            # Identification, FI)
-            dac = int(bindata[40:50],2)
-            fi = int(bindata[50:56],2)
-            # Binary data payload
-            payload = bindata[56:1008]
-            # Try to decode message payload
-            decoded = binaryparser(dac,fi,payload)
-            # Return a dictionary with descriptive keys
-            return {'mmsi': mmsi,
-                    'dac': dac,
-                    'fi': fi,
-                    'decoded': decoded,
-                    'time': timestamp,
-                    'message': message}
-
-        # If the sentence contains message 9 - SAR Aircraft position
-        # report:
-        elif message == '9':
-            # Altitude in meters, 4095=N/A, 4094=>4094
-            altitude = int(bindata[38:50],2)
-            if altitude == 4095:
-                altitude = None # N/A
-            # Speed over ground in knots, 1023=N/A, 1022=>1022
-            sog = int(bindata[50:60],2)
-            if sog == 1023:
-                sog = None # N/A
-            # Position accuracy where 0=bad and 1=good/DGPS
-            posacc = int(bindata[60],2)
-            # Longitude in decimal degrees (DD)
-            longitude = calclongitude(bindata[61:89])
-            # Latitude in decimal degrees (DD)
-            latitude = calclatitude(bindata[89:116])
-            # Course over ground in 1/10 degrees between 0-359
-            cog = decimal.Decimal(int(bindata[116:128],2)) / 10
-            if cog > 360: # 360 and above means 360=N/A
-                cog = None
-            # Return a dictionary with descriptive keys
-            return {'mmsi': mmsi,
-                    'altitude': altitude,
-                    'sog': sog,
-                    'posacc': posacc,
-                    'latitude': latitude,
-                    'longitude': longitude,
-                    'cog': cog,
-                    'time': timestamp,
-                    'message': message}
-
-        # If the sentence contains message 12 - Addressed safety
-        # related message:
-        elif message == '12':
-            # Sequence number
-            sequence = int(bindata[38:40],2)
-            # Destination MMSI number
-            to_mmsi = int(bindata[40:70],2)
-            # Content of message in ASCII (replace any " with ')
-            content = bintoascii(bindata[72:1008]).replace('''"''',"'")
-            # Return a dictionary with descriptive keys
-            return {'mmsi': mmsi,
-                    'sequence': sequence,
-                    'to_mmsi': to_mmsi,
-                    'content': content,
-                    'time': timestamp,
-                    'message': message}
-
-        # If the sentence contains message 14 - Safety related
-        # Broadcast Message:
-        elif message == '14':
-            # Content of message in ASCII (replace any " with ')
-            content = bintoascii(bindata[40:1008]).replace('''"''',"'")
-            # Return a dictionary with descriptive keys
-            return {'mmsi': mmsi,
-                    'content': content,
-                    'time': timestamp,
-                    'message': message}
-
-        # If the sentence contains message 18 - Standard Class B CS
-        # Position Report:
-        elif message == '18':
-            # Speed over ground in 1/10 knots
-            sog = decimal.Decimal(int(bindata[46:56],2)) / 10
-            if sog > decimal.Decimal("102.2"):
-                sog = None # N/A
-            # Position accuracy where 0=bad and 1=good/DGPS
-            posacc = int(bindata[56],2)
-            # Longitude in decimal degrees (DD)
-            longitude = calclongitude(bindata[57:85])
-            # Latitude in decimal degrees (DD)
-            latitude = calclatitude(bindata[85:112])
-            # Course over ground in 1/10 degrees between 0-359
-            cog = decimal.Decimal(int(bindata[112:124],2)) / 10
-            if cog > 360: # 360 and above means 360=N/A
-                cog = None
-            # Heading in whole degrees between 0-359 and 511=N/A
-            heading = int(bindata[124:133],2)
-            if heading > 359:
-                heading = None # N/A
-            # Return a dictionary with descriptive keys
-            return {'mmsi': mmsi,
-                    'latitude': latitude,
-                    'longitude': longitude,
-                    'sog': sog,
-                    'cog': cog,
-                    'heading': heading,
-                    'posacc': posacc,
-                    'time': timestamp,
-                    'message': message}
-
-        # If the sentence contains message 19 - Extended Class B
-        # Equipment Position Report:
-        elif message == '19':
-            # Speed over ground in 1/10 knots
-            sog = decimal.Decimal(int(bindata[46:56],2)) / 10
-            if sog > decimal.Decimal("102.2"):
-                sog = None # N/A
-            # Position accuracy where 0=bad and 1=good/DGPS
-            posacc = int(bindata[56],2)
-            # Longitude in decimal degrees (DD)
-            longitude = calclongitude(bindata[57:85])
-            # Latitude in decimal degrees (DD)
-            latitude = calclatitude(bindata[85:112])
-            # Course over ground in 1/10 degrees between 0-359
-            cog = decimal.Decimal(int(bindata[112:124],2)) / 10
-            if cog > 360: # 360 and above means 360=N/A
-                cog = None
-            # Heading in whole degrees between 0-359 and 511=N/A
-            heading = int(bindata[124:133],2)
-            if heading > 359:
-                heading = None # N/A
-            # Name, removes the characters @, ' ' and "
-            name = bintoascii(bindata[143:263]).strip('''@ ''').replace('''"''',"'")
-            # Ship type, a two-digit code where 00=N/A
-            type = int(bindata[263:271],2)
-            if type == 0:
-                type = None # N/A
-            # Ship length calculated from antenna position
-            length = (int(bindata[271:280],2) + int(bindata[280:289],2))
-            # Ship width calculated from antenna position
-            width = (int(bindata[289:295],2) + int(bindata[295:301],2))
-            # Return a dictionary with descriptive keys
-            return {'mmsi': mmsi,
-                    'latitude': latitude,
-                    'longitude': longitude,
-                    'sog': sog,
-                    'cog': cog,
-                    'heading': heading,
-                    'posacc': posacc,
-                    'name': name,
-                    'type': type,
-                    'length': length,
-                    'width': width,
-                    'time': timestamp,
-                    'message': message}
-
-        # If the sentence contains message 24 - Class B CS Static Data
-        # Report:
-        elif message == '24':
-            # See if it is message part A or B
-            if int(bindata[38:40]) == 0: # Part A
-                # Name, removes the characters @, ' ' and "
-                name = bintoascii(bindata[40:160]).strip('''@ ''').replace('''"''',"'")
-                # Return a dictionary with descriptive keys
-                return {'mmsi': mmsi,
-                        'name': name,
-                        'time': timestamp,
-                        'message': message}
-            else: # Part B
-                # Ship type, a two-digit code where 00=N/A
-                type = int(bindata[40:48],2)
-                if type == 0:
-                    type = None # N/A
-                # Vendor ID, removes the characters @, ' ' and "
-                vendor = bintoascii(bindata[48:90]).strip('''@ ''').replace('''"''',"'")
-                # Callsign, removes the characters @, ' ' and "
-                callsign = bintoascii(bindata[90:132]).strip('''@ ''').replace('''"''',"'")
-                # Ship length calculated from antenna position
-                length = (int(bindata[132:141],2) + int(bindata[141:150],2))
-                # Ship width calculated from antenna position
-                width = (int(bindata[150:156],2) + int(bindata[156:162],2))
-                # Return a dictionary with descriptive keys
-                return {'mmsi': mmsi,
-                        'type': type,
-                        'vendor': vendor,
-                        'callsign': callsign,
-                        'length': length,
-                        'width': width,
-                        'time': timestamp,
-                        'message': message}
-
-        else:
-            # If we don't decode the message, at least return message type
-            return {'mmsi': mmsi, 'time': timestamp, 'message': message, 'decoded': False}
-
-
+        # Decode the payload with the decoder for its message type
+        return aivdmpayloadparser(telegram[5], timestamp, lazy)
     # If the sentence contains NMEA-compliant position data (from own GPS):
     if telegram[0][-3] == 'GGA' and telegram[0][0] == '$':
         # Check the checksum
         if not checksum(inputstring):
             return
         # Latitude
-        degree = int(telegram[2][0:2])
-        minutes = decimal.Decimal(telegram[2][2:9])
-        if telegram[3] == 'N':
-            latitude = degree + (minutes / 60)
-        else:
-            latitude = -(degree + (minutes / 60))
-        latitude = latitude.quantize(decimal.Decimal('1E-6'))
+        latitude = nmeadegrees(telegram[2][0:2], telegram[2][2:9],
+                               telegram[3] != 'N')
         # Longitude
-        degree = int(telegram[4][0:3])
-        minutes = decimal.Decimal(telegram[4][3:10])
-        if telegram[5] == 'E':
-            longitude = degree + (minutes / 60)
-        else:
-            longitude = -(degree + (minutes / 60))
-        longitude = longitude.quantize(decimal.Decimal('1E-6'))
-        # Timestamp the message with local time
-        timestamp = datetime.datetime.now()
+        longitude = nmeadegrees(telegram[4][0:3], telegram[4][3:10],
+                               telegram[5] != 'E')
         # Return a dictionary with descriptive keys
         return {'ownlatitude': latitude, 'ownlongitude': longitude, 'time': timestamp}
     if telegram[0][-3:] == 'RMC' and telegram[0][0] == '$':
@@ -713,134 +144,913 @@ def telegramparser(inputstring):
         if not checksum(inputstring):
             return
         # Latitude
-        degree = int(telegram[3][0:2])
-        minutes = decimal.Decimal(telegram[3][2:9])
-        if telegram[4] == 'N':
-            latitude = degree + (minutes / 60)
-        else:
-            latitude = -(degree + (minutes / 60))
-        latitude = latitude.quantize(decimal.Decimal('1E-6'))
+        latitude = nmeadegrees(telegram[3][0:2], telegram[3][2:9],
+                               telegram[4] != 'N')
         # Longitude
-        degree = int(telegram[5][0:3])
-        minutes = decimal.Decimal(telegram[5][3:10])
-        if telegram[6] == 'E':
-            longitude = degree + (minutes / 60)
-        else:
-            longitude = -(degree + (minutes / 60))
-        longitude = longitude.quantize(decimal.Decimal('1E-6'))
+        longitude = nmeadegrees(telegram[5][0:3], telegram[5][3:10],
+                               telegram[6] != 'E')
         # Speed over ground
-        sog = decimal.Decimal(telegram[7])
+        sog = tonumber(telegram[7])
         # Course over ground
-        cog = decimal.Decimal(telegram[8])
+        cog = tonumber(telegram[8])
         
-        # Timestamp the message with local time
-        timestamp = datetime.datetime.now()
         # Return a dictionary with descriptive keys
         return {'ownlatitude': latitude, 'ownlongitude': longitude, 'ownsog': sog, 'owncog': cog, 'time': timestamp}
 
 
+def tonumber(text):
+    # Converts text to a decimal.Decimal or a float, depending on the
+    # numeric backend (see setnumericbackend)
+    if numeric_backend == 'float':
+        return float(text)
+    return decimal.Decimal(text)
+
+def tenths(value):
+    # Returns the integer value devided by 10 as a decimal.Decimal or a
+    # float, depending on the numeric backend
+    if numeric_backend == 'float':
+        return value / 10.0
+    return decimal.Decimal(value) / 10
+
+def nmeadegrees(degree, minutes, negative):
+    # Converts the degree and minutes text of an NMEA position to
+    # decimal degrees (DD) with six decimal digits, negative for
+    # South and West
+    if numeric_backend == 'float':
+        degree = round(int(degree) + float(minutes) / 60, 6)
+        if negative:
+            return -degree
+        return degree
+    degree = int(degree) + (decimal.Decimal(minutes) / 60)
+    if negative:
+        degree = -degree
+    return degree.quantize(decimal.Decimal('1E-6'))
+
+def paisposition(telegram, mmsi, message, timestamp):
+    # Decodes $PAIS message 02 - AIS Standard Position
+    # Rate of turn in degrees/minute from -127 to +127 where 128=N/A
+    rateofturn = int(telegram[3], 16)
+    if rateofturn >=0 and rateofturn <128: # Turning right
+        # Convert between ROTais and ROTind
+        rateofturn = int(math.pow((rateofturn/4.733), 2))
+        if rateofturn > 720:
+            rateofturn = 720 # Full
+    elif rateofturn >128 and rateofturn <=255: # Turning left
+        rateofturn = 256 - rateofturn
+        # Convert between ROTais and ROTind
+        rateofturn = -int(math.pow((rateofturn/4.733), 2))
+        if rateofturn < -720:
+            rateofturn = -720 # Full
+    else:
+        rateofturn = None # N/A
+    # Navigation status converted to ITU-R M.1371 standard
+    navstatus = telegram[4]
+    if navstatus == '1': navstatus = 0 # Under Way
+    elif navstatus == '2': navstatus = 2 # Not Under Command
+    elif navstatus == '3': navstatus = 3 # Restricted Manoeuvrability
+    elif navstatus == '4': navstatus = 1 # At Anchor
+    elif navstatus == '5': navstatus = None # (MAYDAY?) sets to N/A
+    else: navstatus = None # N/A
+    # Latitude in decimal degrees (DD)
+    latitude = intlatitude(int(telegram[5],16), 27, numeric_backend == 'float')
+    # Longitude in decimal degrees (DD)
+    longitude = intlongitude(int(telegram[6],16), 28, numeric_backend == 'float')
+    # Speed over ground in 1/10 knots
+    sog = int(telegram[7],16)
+    if sog > 1022:
+        sog = None # N/A
+    else:
+        sog = tenths(sog)
+    # Course over ground in 1/10 degrees where 0=360
+    cog = int(telegram[8],16)
+    if cog > 3600: # 360 and above means 360=N/A
+        cog = None
+    else:
+        cog = tenths(cog)
+    # Heading in whole degrees between 0-359 and 511=N/A
+    heading = int(telegram[9],16)
+    if heading > 359:
+        heading = None # N/A
+    # Position accuracy where 0=bad and 1=good/DGPS
+    posacc = int(telegram[11])
+    # Return a dictionary with descriptive keys
+    return {'mmsi': mmsi,
+            'rot': rateofturn,
+            'navstatus': navstatus,
+            'latitude': latitude,
+            'longitude': longitude,
+            'sog': sog,
+            'cog': cog,
+            'heading': heading,
+            'posacc': posacc,
+            'time': timestamp,
+            'message': message}
+
+def paisaddressedtext(telegram, mmsi, message, timestamp):
+    # Decodes $PAIS message 04 - Addressed Text Telegram
+    # Content of message in ASCII (replace any " with ')
+    content = telegram[4].replace('''"''',"'")
+    # Destination MMSI number
+    to_mmsi = int(telegram[5],16)
+    # Return a dictionary with descriptive keys
+    return {'mmsi': mmsi,
+            'content': content,
+            'to_mmsi': to_mmsi,
+            'time': timestamp,
+            'message': message}
+
+def paisbroadcasttext(telegram, mmsi, message, timestamp):
+    # Decodes $PAIS message 06 - Broadcast Text Telegram
+    # Content of message in ASCII (replace any " with ')
+    content = str(telegram[4]).replace('''"''',"'")
+    # Return a dictionary with descriptive keys
+    return {'mmsi': mmsi,
+            'content': content,
+            'time': timestamp,
+            'message': message}
+
+def paisaddressedbinary(telegram, mmsi, message, timestamp):
+    # Decodes $PAIS message 07 - Addressed Binary Telegram
+    # Binary data payload
+    payload = hextobin(telegram[4])
+    # Destination MMSI number
+    to_mmsi = int(telegram[5],16)
+    # Application ID (Designated Area Code, DAC) + (Function
+    # Identification, FI)
+    appid = int(telegram[7],16)
+    appid_bits = len(telegram[7]) * 4
+    dac = bitfield(appid, appid_bits, 0, 10)
+    fi = bitfield(appid, appid_bits, 10, 16)
+    # Try to decode message payload
+    decoded = binaryparser(dac,fi,payload)
+    # Return a dictionary with descriptive keys
+    return {'mmsi': mmsi,
+            'to_mmsi': to_mmsi,
+            'dac': dac,
+            'fi': fi,
+            'decoded': decoded,
+            'time': timestamp,
+            'message': message}
+
+def paisbroadcastbinary(telegram, mmsi, message, timestamp):
+    # Decodes $PAIS message 09 - Broadcast Binary Telegram
+    # Binary data payload
+    payload = hextobin(telegram[4])
+    # Application ID (Designated Area Code, DAC) + (Function
+    # Identification, FI)
+    appid = int(telegram[6],16)
+    appid_bits = len(telegram[6]) * 4
+    dac = bitfield(appid, appid_bits, 0, 10)
+    fi = bitfield(appid, appid_bits, 10, 16)
+    # Try to decode message payload
+    decoded = binaryparser(dac,fi,payload)
+    # Return a dictionary with descriptive keys
+    return {'mmsi': mmsi,
+            'dac': dac,
+            'fi': fi,
+            'decoded': decoded,
+            'time': timestamp,
+            'message': message}
+
+def paisaircraftposition(telegram, mmsi, message, timestamp):
+    # Decodes $PAIS message 0D - Standard Position, aviation, and
+    # message 11 - SAR Standard Position
+    # Latitude in decimal degrees (DD)
+    latitude = intlatitude(int(telegram[3],16), 27, numeric_backend == 'float')
+    # Longitude in decimal degrees (DD)
+    longitude = intlongitude(int(telegram[4],16), 28, numeric_backend == 'float')
+    # Speed over ground in knots
+    sog = int(telegram[5],16)
+    if sog > 1022:
+        sog = None # N/A
+    # Course over ground in 1/10 degrees where 0=360
+    cog = int(telegram[6],16)
+    if cog > 3600: # 360 and above means 360=N/A
+        cog = None
+    else:
+        cog = tenths(cog)
+    # Altitude in meters, 4095=N/A
+    altitude = int(telegram[7],16)
+    if altitude == 4095:
+        altitude = None # N/A
+    # Return a dictionary with descriptive keys
+    return {'mmsi': mmsi,
+            'altitude': altitude,
+            'sog': sog,
+            'latitude': latitude,
+            'longitude': longitude,
+            'cog': cog,
+            'time': timestamp,
+            'message': message}
+
+def paisidentification(telegram, mmsi, message, timestamp):
+    # Decodes $PAIS message 0E - Identification Data
+    # Name, removes the characters @, ' ' and "
+    name = telegram[3].strip('''@ ''').replace('''"''',"'")
+    # Callsign, removes the characters @, ' ' and "
+    callsign = telegram[4].strip('''@ ''').replace('''"''',"'")
+    # IMO number where 00000000=N/A
+    imo = int(telegram[5],16)
+    if imo == 0:
+        imo = None
+    # Return a dictionary with descriptive keys
+    return {'mmsi': mmsi,
+            'name': name,
+            'callsign': callsign,
+            'imo': imo,
+            'time': timestamp,
+            'message': message}
+
+def paisvesseldata(telegram, mmsi, message, timestamp):
+    # Decodes $PAIS message 0F - Vessel Data
+    # Ship type, a two-digit code where 00=N/A
+    type = int(telegram[3],16)
+    if type == 0:
+        type = None # N/A
+    # Draught in 1/10 meters, where 0.0 = N/A
+    draught = int(telegram[4],16)
+    if draught == 0:
+        draught = None
+    else:
+        draught = tenths(draught)
+    # Calculate ship width and length in meters from
+    # antenna position in hex
+    # Convert hex->int and look at the 30 lowest bits
+    ant_number = int(telegram[5],16)
+    # Add integers from the two parts to form length
+    length = bitfield(ant_number,30,12,21) + bitfield(ant_number,30,21,30)
+    # Add integers from the two parts to form width
+    width = bitfield(ant_number,30,0,6) + bitfield(ant_number,30,6,12)
+    # Destination, removes the characters @, ' ' and "
+    destination = telegram[6].strip('''@ ''').replace('''"''',"'")
+    # Received estimated time of arrival in format
+    # month-day-hour-minute: MMDDHHMM where 00000000=N/A
+    eta = telegram[8]
+    if eta == '00000000':
+        eta = None
+    # Return a dictionary with descriptive keys
+    return {'mmsi': mmsi,
+            'type': type,
+            'draught': draught,
+            'length': length,
+            'width': width,
+            'destination': destination,
+            'eta': eta,
+            'time': timestamp,
+            'message': message}
+
+# The parser for each $PAIS message type
+pais_parsers = {'S02': paisposition,
+                'S04': paisaddressedtext,
+                'S06': paisbroadcasttext,
+                'S07': paisaddressedbinary,
+                'S09': paisbroadcastbinary,
+                'S0D': paisaircraftposition,
+                'S11': paisaircraftposition,
+                'S0E': paisidentification,
+                'S0F': paisvesseldata}
+
+def payloadparser(payload, lazy=False, timestamp=None):
+    # Decodes an AIVDM payload that has already been checked and
+    # joined, like the ones returned by Reassembler, in the same way
+    # as telegramparser decodes a sentence
+    if timestamp is None:
+        timestamp = datetime.datetime.now()
+    return aivdmpayloadparser(payload, timestamp, lazy)
+
+def aivdmpayloadparser(payload, timestamp, lazy=False):
+    # Decodes an AIVDM payload. Unless lazy is set, static data
+    # payloads are looked up in static_cache first
+    if not lazy and payload[:1] in static_symbols:
+        return cachedparser(payload, timestamp, sixbitparser, payload,
+                            timestamp)
+    return sixbitparser(payload, timestamp, lazy)
+
+def sixbitparser(payload, timestamp, lazy=False):
+    # Decodes an AIVDM payload without looking in any cache
+    bits, nbits = sixtoint(payload)
+    return aivdmparser(bits, nbits, timestamp, lazy)
+
+class DecodeCache(object):
+    # A least recently used cache of decoded messages, with counters
+    # for the number of hits and misses
+    #   maxsize -- the largest number of messages kept
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.items = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        # Returns the message kept for key, or None
+        try:
+            value = self.items.pop(key)
+        except KeyError:
+            self.misses += 1
+            return None
+        # Move it last, as the most recently used
+        self.items[key] = value
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        # Keeps value for key, forgetting the least recently used
+        # message if the cache is full
+        if len(self.items) >= self.maxsize:
+            if not self.items:
+                return
+            self.items.popitem(last=False)
+        self.items[key] = value
+
+    def clear(self):
+        self.items.clear()
+
+# The cache for static and voyage related data, which is sent
+# unchanged every few minutes: AIVDM messages 5 and 24 (payloads
+# starting with these symbols) and $PAIS messages 0E and 0F
+static_cache = DecodeCache()
+static_symbols = set(['5', 'H'])
+static_messages = set(['S0E', 'S0F'])
+
+def cachedparser(key, timestamp, parser, *arguments):
+    # Returns a copy of the message for key in static_cache, or else
+    # the message from parser(*arguments) which is then kept in the
+    # cache. The time of the returned message is set to timestamp
+    message = static_cache.get(key)
+    if message is None:
+        message = parser(*arguments)
+        if message is None:
+            return None
+        static_cache.put(key, message)
+    message = dict(message)
+    message['time'] = timestamp
+    return message
+
+def aivdmparser(bits, nbits, timestamp, lazy=False):
+    # Decodes an AIVDM payload, given as the integer bits holding nbits
+    # bits, with the decoder generated for its message type from
+    # aivdm_schema. If lazy is set, a LazyMessage is returned instead
+    if lazy:
+        decoders = lazy_messages
+    else:
+        decoders = aivdm_decoders
+    msgtype = bitfield(bits,nbits,0,6)
+    # Some message types have parts with different layouts
+    if msgtype in partitioned_types:
+        decoder = decoders.get((msgtype, bitfield(bits,nbits,38,40)))
+    else:
+        decoder = decoders.get(msgtype)
+    if decoder:
+        return decoder(bits, nbits, timestamp)
+    # If we don't decode the message, at least return message type
+    return {'mmsi': bitfield(bits,nbits,8,38), 'time': timestamp,
+            'message': str(msgtype), 'decoded': False}
+
+# The data type of the array returned by positionbatchparser. Values
+# with a N/A-state are NaN for the float fields and -1 for heading and
+# navstatus
+position_dtype = numpy.dtype([('mmsi', numpy.int32),
+                              ('lat', numpy.float64),
+                              ('lon', numpy.float64),
+                              ('sog', numpy.float64),
+                              ('cog', numpy.float64),
+                              ('heading', numpy.int16),
+                              ('navstatus', numpy.int8),
+                              ('rot', numpy.float64),
+                              ('posacc', numpy.uint8),
+                              ('msgtype', numpy.uint8)])
+
+def positionbatchparser(payloads):
+    # This function decodes a list or array of AIVDM payloads at once
+    # and returns the position reports among them (message 1, 2, 3, 18
+    # and 19) as a numpy array of type position_dtype. Payloads of other
+    # message types, and payloads that are too short or contain symbols
+    # outside the character table, are left out.
+
+    # The fields we need all lie within the first 23 symbols (138 bits).
+    # Shorter payloads are padded with NUL, which is not a valid symbol
+    nsymbols = 23
+    symbols = numpy.array(payloads, dtype='S%d' % nsymbols)
+    symbols = symbols.view(numpy.uint8).reshape(-1, nsymbols).astype(numpy.int16)
+    valid = ((symbols >= 48) & (symbols < 120)).all(axis=1)
+    # Convert the symbols to 6-bit integers, then to a matrix of bits
+    # with one row for each payload
+    symbols = symbols - 48
+    symbols[symbols > 39] -= 8
+    bits = ((symbols[:,:,numpy.newaxis] >> numpy.arange(5, -1, -1)) & 1)
+    bits = bits.reshape(-1, nsymbols * 6).astype(numpy.int64)
+
+    def field(start, end):
+        # Returns the unsigned integers in bit positions start to end
+        return bits[:,start:end].dot(1 << numpy.arange(end - start - 1, -1, -1))
+
+    # Only keep valid position reports
+    msgtype = field(0, 6)
+    classa = (msgtype >= 1) & (msgtype <= 3)
+    classb = (msgtype == 18) | (msgtype == 19)
+    keep = valid & (classa | classb)
+    bits = bits[keep]
+    msgtype = msgtype[keep]
+    classa = classa[keep]
+    classb = classb[keep]
+
+    result = numpy.empty(len(bits), dtype=position_dtype)
+    result['msgtype'] = msgtype
+    result['mmsi'] = field(8, 38)
+
+    # Navigation status and rate of turn only exist in message 1, 2, 3
+    navstatus = field(38, 42)
+    navstatus[(navstatus > 8) | classb] = -1 # N/A
+    result['navstatus'] = navstatus
+    # Rate of turn, converted between ROTais and ROTind as in
+    # telegramparser where 128=N/A
+    sign_rateofturn = field(42, 43)
+    rateofturn = field(43, 50)
+    left = (sign_rateofturn == 1) & (rateofturn > 1)
+    rot = numpy.trunc((numpy.where(left, 128 - rateofturn, rateofturn) / 4.733) ** 2)
+    rot = numpy.minimum(rot, 720) # Full
+    rot[left] = -rot[left]
+    rot[(rateofturn > 126) | classb] = numpy.nan # N/A
+    result['rot'] = rot
+
+    # The rest of the fields in message 18 and 19 are placed four bits
+    # earlier than in message 1, 2 and 3, so line them up with those
+    bits[classb,4:] = bits[classb,:-4].copy()
+
+    # Speed over ground in 1/10 knots, where 1023=N/A (and 1022=>102.2)
+    sog = field(50, 60)
+    result['sog'] = numpy.where(sog > 1022, numpy.nan, sog / 10.0)
+    # Position accuracy where 0=bad and 1=good/DGPS
+    result['posacc'] = field(60, 61)
+    # Longitude and latitude in decimal degrees (DD), quantized to six
+    # decimal digits like calclongitude and calclatitude
+    longitude = field(61, 89)
+    sign = longitude >> 27
+    longitude = longitude & ((1 << 27) - 1)
+    na = longitude == 181*600000
+    longitude = numpy.where(sign == 1, longitude - (1 << 27), longitude)
+    longitude = numpy.round(longitude / 600000.0, 6)
+    longitude[na] = numpy.nan # N/A
+    result['lon'] = longitude
+    latitude = field(89, 116)
+    sign = latitude >> 26
+    latitude = latitude & ((1 << 26) - 1)
+    na = latitude == 91*600000
+    latitude = numpy.where(sign == 1, latitude - (1 << 26), latitude)
+    latitude = numpy.round(latitude / 600000.0, 6)
+    latitude[na] = numpy.nan # N/A
+    result['lat'] = latitude
+    # Course over ground in 1/10 degrees where 3600 and above is N/A
+    cog = field(116, 128)
+    result['cog'] = numpy.where(cog > 3600, numpy.nan, cog / 10.0)
+    # Heading in whole degrees between 0-359 and 511=N/A
+    heading = field(128, 137)
+    heading[heading > 359] = -1 # N/A
+    result['heading'] = heading
+
+    return result
+
+
 def binaryparser(dac,fi,data):
     # This function decodes known binary messages and returns the
     # interesting data as a dictionary where each key describes
-    # the information of each message part.
+    # the information of each message part. The decoders are
+    # generated from binary_schema below
 
     # For each value where we have a N/A-state None is returned
 
-    # Initiate a return dict
-    retdict = {}
-
-    # If the message is IFM 0: free text message
-    if dac == 1 and fi == 0:
-        return {'text': bintoascii(data[12:]).strip('''@ ''').replace('''"''',"'")}
-
-    # If the message is an IMO Meterology and Hydrology Message,
-    # as specified in IMO SN/Circ. 236, Annex 2, Application 1:
-    elif dac == 1 and fi == 11:
-        # Latitude in decimal degrees (DD)
-        retdict['latitude'] = calclatitude(data[0:24])
-        # Longitude in decimal degrees (DD)
-        retdict['longitude'] = calclongitude(data[24:49])
-        # Bits 49-65 contains current station time in UTC (ddhhmm)
-        # We use computer time as a baseline for year and month
-        try:
-            station_time = datetime.datetime.utcnow()
-            station_time = station_time.replace(day=int(data[49:54],2),
-                                                hour=int(data[54:59],2),
-                                                minute=int(data[59:65],2),
-                                                second=0, microsecond=0)
-            retdict['station_time'] = station_time
-        except ValueError:
-            retdict['station_time'] = None # N/A
-        # Average of wind speed values for the last ten minutes, knots
-        retdict['average_wind_speed'] = standard_int_field(data[65:72])
-        # Wind gust (maximum wind speed value) during the last ten
-        # minutes, knots
-        retdict['wind_gust'] = standard_int_field(data[72:79])
-        # Wind direction in whole degrees
-        retdict['wind_direction'] = standard_int_field(data[79:88])
-        # Wind gust direction in whole degrees
-        retdict['wind_gust_direction'] = standard_int_field(data[88:97])
-        # Air temperature in 0.1 degrees Celsius from -60.0 to +60.0
-        retdict['air_temperature'] = standard_decimal_tenth_signed_field(data[97:108])
-        # Relative humidity in percent
-        retdict['relative_humidity'] = standard_int_field(data[108:115])
-        # Dew point in 0.1 degrees Celsius from -20.0 to +50.0
-        retdict['dew_point'] = standard_decimal_tenth_signed_field(data[115:125])
-        # Air pressure in whole hPa
-        retdict['air_pressure'] = standard_int_field(data[125:134])
-        # Air pressure tendency where 0=steady, 1=decreasing, 2=increasing
-        retdict['air_pressure_tendency'] = standard_int_field(data[134:136])
-        # Horizontal visibility in 0.1 NM steps
-        retdict['horizontal_visibility'] = standard_decimal_tenth_field(data[136:144])
-        # Water level including tide, deviation from local chart datum,
-        # in 0.1 m from -10.0 to 30.0 m
-        retdict['water_level_incl_tide'] = standard_decimal_tenth_signed_field(data[144:153])
-        # Water level trend where 0=steady, 1=decreasing, 2=increasing
-        retdict['water_level_trend'] = standard_int_field(data[153:155])
-        # Surface current speed including tide in 0.1 kt steps
-        retdict['surface_current_speed_incl_tide'] = standard_decimal_tenth_field(data[155:163])
-        # Surface current direction in whole degrees
-        retdict['surface_current_direction'] = standard_int_field(data[163:172])
-        # Current speed #2, chosen below sea surface, in 0.1 kt steps
-        retdict['current_speed_2'] = standard_decimal_tenth_field(data[172:180])
-        # Current direction #2, chosen below sea surface in whole degrees
-        retdict['current_direction_2'] = standard_int_field(data[180:189])
-        # Current measuring level #2, whole meters below sea surface
-        retdict['current_measuring_level_2'] = standard_int_field(data[189:194])
-        # Current speed #3, chosen below sea surface, in 0.1 kt steps
-        retdict['current_speed_3'] = standard_decimal_tenth_field(data[194:202])
-        # Current direction #3, chosen below sea surface in whole degrees
-        retdict['current_direction_3'] = standard_int_field(data[202:211])
-        # Current measuring level #3, whole meters below sea surface
-        retdict['current_measuring_level_3'] = standard_int_field(data[211:216])
-        # Significant wave height in 0.1 m steps
-        retdict['significant_wave_height'] = standard_decimal_tenth_field(data[216:224])
-        # Wave period in whole seconds
-        retdict['wave_period'] = standard_int_field(data[224:230])
-        # Wave direction in whole degrees
-        retdict['wave_direction'] = standard_int_field(data[230:239])
-        # Swell height in 0.1 m steps
-        retdict['swell_height'] = standard_decimal_tenth_field(data[239:247])
-        # Swell period in whole seconds
-        retdict['swell_period'] = standard_int_field(data[247:253])
-        # Swell direction in whole degrees
-        retdict['swell_direction'] = standard_int_field(data[253:262])
-        # Sea state according to Beaufort scale (0-12)
-        retdict['sea_state'] = standard_int_field(data[262:266])
-        # Water temperature in 0.1 degrees Celsius from -10.0 to +50.0
-        retdict['water_temperature'] = standard_decimal_tenth_signed_field(data[266:276])
-        # Precipitation type according to WMO
-        retdict['precipitation_type'] = standard_int_field(data[276:279])
-        # Salinity in parts per thousand from 0.0 to 50.0
-        retdict['salinity'] = standard_decimal_tenth_field(data[279:288])
-        # Ice, Yes/No
-        retdict['ice'] = standard_int_field(data[288:290])
-        # Return a dictionary with descriptive keys
-        return retdict
-
     # If we cannot decode the message, return None
-    else:
+    decoder = binarydecoder(dac, fi)
+    if decoder is None:
         return None
+    if not data:
+        return decoder(0, 0)
+    return decoder(int(data,2), len(data))
+
+
+# The bit layout of each supported AIVDM message type according to
+# ITU-R M.1371. Each field is given as a tuple
+# (name, bit offset, width, kind, scale, N/A) where
+#   kind  -- how the bits are converted, see field_kinds below
+#   scale -- if set, the value is divided by scale and returned as
+#            a decimal.Decimal
+#   N/A   -- if set, a condition on the raw integer which makes the
+#            field None (N/A), such as '> 1022' or '== 0'
+# A width of None means the rest of the payload. All messages also
+# get the MMSI number from aivdm_header. Message types where the layout
+# depends on the part number in bits 38-40 are keyed on (type, part)
+aivdm_header = [('mmsi', 8, 30, 'uint', None, None)]
+
+aivdm_schema = {
+    # Message 1, 2 and 3 - Position Report
+    1: [('navstatus', 38, 4, 'uint', None, '> 8'),
+        ('rot', 42, 8, 'rot', None, None),
+        ('sog', 50, 10, 'uint', 10, '> 1022'),       # 1/10 knots
+        ('posacc', 60, 1, 'uint', None, None),
+        ('longitude', 61, 28, 'longitude', None, None),
+        ('latitude', 89, 27, 'latitude', None, None),
+        ('cog', 116, 12, 'uint', 10, '> 3600'),      # 1/10 degrees
+        ('heading', 128, 9, 'uint', None, '> 359')],
+    # Message 4 - Base Station Report
+    4: [('station_time', 38, 40, 'datetime', None, None),
+        ('posacc', 78, 1, 'uint', None, None),
+        ('longitude', 79, 28, 'longitude', None, None),
+        ('latitude', 107, 27, 'latitude', None, None)],
+    # Message 5 - Ship Static and Voyage Related Data
+    (5, 0): [('imo', 40, 30, 'uint', None, '== 0'),
+             ('callsign', 70, 42, 'text', None, None),
+             ('name', 112, 120, 'text', None, None),
+             ('type', 232, 8, 'uint', None, '== 0'),
+             ('length', 240, 18, 'dimension', None, None),
+             ('width', 258, 12, 'dimension', None, None),
+             ('eta', 274, 20, 'eta', None, '== 0'),
+             ('draught', 294, 8, 'uint', 10, '== 0'),    # 1/10 meters
+             ('destination', 302, 120, 'text', None, None)],
+    # Message 6 - Addressed Binary Message
+    6: [('sequence', 38, 2, 'uint', None, None),
+        ('to_mmsi', 40, 30, 'uint', None, None),
+        ('dac', 72, 10, 'uint', None, None),
+        ('fi', 82, 6, 'uint', None, None),
+        ('decoded', 88, 960, 'binary', None, None),
+        ('data', 88, 960, 'rawbinary', None, None)],
+    # Message 8 - Binary Broadcast Message
+    8: [('dac', 40, 10, 'uint', None, None),
+        ('fi', 50, 6, 'uint', None, None),
+        ('decoded', 56, 952, 'binary', None, None),
+        ('data', 56, 952, 'rawbinary', None, None)],
+    # Message 9 - SAR Aircraft position report
+    9: [('altitude', 38, 12, 'uint', None, '== 4095'),  # meters
+        ('sog', 50, 10, 'uint', None, '== 1023'),       # knots
+        ('posacc', 60, 1, 'uint', None, None),
+        ('longitude', 61, 28, 'longitude', None, None),
+        ('latitude', 89, 27, 'latitude', None, None),
+        ('cog', 116, 12, 'uint', 10, '> 3600')],
+    # Message 12 - Addressed safety related message
+    12: [('sequence', 38, 2, 'uint', None, None),
+         ('to_mmsi', 40, 30, 'uint', None, None),
+         ('content', 72, 936, 'content', None, None)],
+    # Message 14 - Safety related Broadcast Message
+    14: [('content', 40, 968, 'content', None, None)],
+    # Message 18 - Standard Class B CS Position Report
+    18: [('sog', 46, 10, 'uint', 10, '> 1022'),
+         ('posacc', 56, 1, 'uint', None, None),
+         ('longitude', 57, 28, 'longitude', None, None),
+         ('latitude', 85, 27, 'latitude', None, None),
+         ('cog', 112, 12, 'uint', 10, '> 3600'),
+         ('heading', 124, 9, 'uint', None, '> 359')],
+    # Message 21 - Aids-to-navigation Report
+    21: [('aid_type', 38, 5, 'uint', None, '== 0'),
+         ('name', 43, 120, 'text', None, None),
+         ('posacc', 163, 1, 'uint', None, None),
+         ('longitude', 164, 28, 'longitude', None, None),
+         ('latitude', 192, 27, 'latitude', None, None),
+         ('length', 219, 18, 'dimension', None, None),
+         ('width', 237, 12, 'dimension', None, None)],
+    # Message 24 - Class B CS Static Data Report, part A
+    (24, 0): [('name', 40, 120, 'text', None, None)],
+    # Message 24 - Class B CS Static Data Report, part B
+    (24, 1): [('type', 40, 8, 'uint', None, '== 0'),
+              ('vendor', 48, 42, 'text', None, None),
+              ('callsign', 90, 42, 'text', None, None),
+              ('length', 132, 18, 'dimension', None, None),
+              ('width', 150, 12, 'dimension', None, None)],
+    # Message 27 - Long Range AIS Broadcast message
+    27: [('posacc', 38, 1, 'uint', None, None),
+         ('navstatus', 40, 4, 'uint', None, '> 8'),
+         ('longitude', 44, 18, 'longitude', None, None),
+         ('latitude', 62, 17, 'latitude', None, None),
+         ('sog', 79, 6, 'uint', None, '== 63'),         # knots
+         ('cog', 85, 9, 'uint', None, '> 359')]}        # degrees
+aivdm_schema[2] = aivdm_schema[3] = aivdm_schema[1]
+# Message 19 - Extended Class B Equipment Position Report
+aivdm_schema[19] = aivdm_schema[18] + [
+    ('name', 143, 120, 'text', None, None),
+    ('type', 263, 8, 'uint', None, '== 0'),
+    ('length', 271, 18, 'dimension', None, None),
+    ('width', 289, 12, 'dimension', None, None)]
+# The message types that had no hand-written decoder to match, where
+# fields beyond the end of a short payload are None (N/A) instead of
+# cut like slices of a binary string
+truncated_types = set([21, 27])
+aivdm_schema[(24, 2)] = aivdm_schema[(24, 3)] = aivdm_schema[(24, 1)]
+
+# The bit layout of each supported binary message application, keyed
+# on (DAC, FI), in the same format as aivdm_schema. Bit offsets are
+# counted from the start of the binary payload
+binary_schema = {
+    # IFM 0: free text message
+    (1, 0): [('text', 12, None, 'text', None, None)],
+    # IMO Meterology and Hydrology Message, as specified in IMO SN/Circ.
+    # 236, Annex 2, Application 1
+    (1, 11): [('latitude', 0, 24, 'latitude', None, None),
+              ('longitude', 24, 25, 'longitude', None, None),
+              ('station_time', 49, 16, 'dayhourminute', None, None),
+              ('average_wind_speed', 65, 7, 'uint', None, '== 127'),
+              ('wind_gust', 72, 7, 'uint', None, '== 127'),
+              ('wind_direction', 79, 9, 'uint', None, '== 511'),
+              ('wind_gust_direction', 88, 9, 'uint', None, '== 511'),
+              ('air_temperature', 97, 11, 'int', 10, '== 2047'),
+              ('relative_humidity', 108, 7, 'uint', None, '== 127'),
+              ('dew_point', 115, 10, 'int', 10, '== 1023'),
+              ('air_pressure', 125, 9, 'uint', None, '== 511'),
+              ('air_pressure_tendency', 134, 2, 'uint', None, '== 3'),
+              ('horizontal_visibility', 136, 8, 'uint', 10, '== 255'),
+              ('water_level_incl_tide', 144, 9, 'int', 10, '== 511'),
+              ('water_level_trend', 153, 2, 'uint', None, '== 3'),
+              ('surface_current_speed_incl_tide', 155, 8, 'uint', 10, '== 255'),
+              ('surface_current_direction', 163, 9, 'uint', None, '== 511'),
+              ('current_speed_2', 172, 8, 'uint', 10, '== 255'),
+              ('current_direction_2', 180, 9, 'uint', None, '== 511'),
+              ('current_measuring_level_2', 189, 5, 'uint', None, '== 31'),
+              ('current_speed_3', 194, 8, 'uint', 10, '== 255'),
+              ('current_direction_3', 202, 9, 'uint', None, '== 511'),
+              ('current_measuring_level_3', 211, 5, 'uint', None, '== 31'),
+              ('significant_wave_height', 216, 8, 'uint', 10, '== 255'),
+              ('wave_period', 224, 6, 'uint', None, '== 63'),
+              ('wave_direction', 230, 9, 'uint', None, '== 511'),
+              ('swell_height', 239, 8, 'uint', 10, '== 255'),
+              ('swell_period', 247, 6, 'uint', None, '== 63'),
+              ('swell_direction', 253, 9, 'uint', None, '== 511'),
+              ('sea_state', 262, 4, 'uint', None, '== 15'),
+              ('water_temperature', 266, 10, 'int', 10, '== 1023'),
+              ('precipitation_type', 276, 3, 'uint', None, '== 7'),
+              ('salinity', 279, 9, 'uint', 10, '== 511'),
+              ('ice', 288, 2, 'uint', None, '== 3')]}
+
+# Python expressions converting the bits of a field of each kind,
+# where {value} is the unsigned integer in the field
+field_kinds = {
+    # Unsigned integer
+    'uint': '{value}',
+    # A sign bit followed by the magnitude. As in
+    # standard_int_signed_field, only the magnitude is used
+    'int': '{value} & {magnitude}',
+    # Text, removes the characters @, ' ' and "
+    'text': '''inttoascii(bits,nbits,{start},{end}).strip('@ ').replace('"',"'")''',
+    # Text content (replace any " with ')
+    'content': '''inttoascii(bits,nbits,{start},{end}).replace('"',"'")''',
+    # Latitude and longitude in decimal degrees (DD), from the number
+    # of bits there are in a short payload (which gives None, like
+    # calclatitude and calclongitude for a short binary string)
+    'latitude': 'intlatitude({value}, min(nbits, {end}) - {start})',
+    'longitude': 'intlongitude({value}, min(nbits, {end}) - {start})',
+    # Rate of turn in degrees/minute
+    'rot': 'introt({value})',
+    # Ship length or width calculated from the two parts of the
+    # antenna position
+    'dimension': 'bitfield(bits,nbits,{start},{middle}) + bitfield(bits,nbits,{middle},{end})',
+    # Estimated time of arrival as a MMDDHHMM string
+    'eta': 'inteta({value})',
+    # Station time in UTC
+    'datetime': 'intdatetime({value})',
+    # Station time in UTC as day, hour and minute
+    'dayhourminute': 'intdayhourminute({value})',
+    # Binary payload, decoded with binary_decoders
+    'binary': 'intbinaryparser(bits,nbits,{start},{end})',
+    # Binary payload as (integer, number of bits), if not decoded
+    'rawbinary': 'intrawbinary(bits,nbits,{start},{end})'}
+
+# The same for the float backend
+float_field_kinds = dict(field_kinds,
+                         latitude='intlatitude({value}, min(nbits, {end}) - {start}, True)',
+                         longitude='intlongitude({value}, min(nbits, {end}) - {start}, True)')
+
+def fieldsource(field, backend='decimal'):
+    # Returns a list of Python source lines that decode field, a tuple
+    # from one of the schemas, from the integer bits holding nbits bits
+    # to a local variable with the same name as the field. Fractional
+    # values are decimal.Decimal or float depending on backend
+    name, offset, width, kind, scale, na = field
+    if backend == 'float':
+        kinds = float_field_kinds
+    else:
+        kinds = field_kinds
+    if width is None:
+        end = 'nbits'
+        middle = magnitude = None
+    else:
+        end = offset + width
+        middle = offset + width // 2
+        magnitude = (1 << (width - 1)) - 1
+    lines = []
+    value = 'bitfield(bits,nbits,%s,%s)' % (offset, end)
+    if na:
+        # Extract the raw integer only once
+        lines.append('raw = ' + value)
+        value = 'raw'
+    expression = kinds[kind].format(value=value, start=offset, end=end,
+                                    width=width, middle=middle,
+                                    magnitude=magnitude)
+    if scale and backend == 'float':
+        expression = '(%s) / %d.0' % (expression, scale)
+    elif scale:
+        expression = 'decimal.Decimal(%s) / %d' % (expression, scale)
+    if na:
+        expression = 'None if raw %s else %s' % (na, expression)
+    lines.append('%s = %s' % (name, expression))
+    return lines
+
+def decodersource(name, arguments, fields, constants={}, truncated=False,
+                  backend='decimal'):
+    # Returns the Python source of a function called name that decodes
+    # fields and returns them in a dictionary together with the items
+    # in constants (key and Python expression). If truncated is set,
+    # fields beyond the end of a short payload are None (N/A)
+    lines = ['def %s(%s):' % (name, arguments)]
+    for field in fields:
+        source = fieldsource(field, backend)
+        if truncated and field[2] is not None:
+            lines.append('    if nbits < %d: %s = None' % (field[1] + field[2], field[0]))
+            lines.append('    else:')
+            lines.extend(['        ' + line for line in source])
+        else:
+            lines.extend(['    ' + line for line in source])
+    items = ['%r: %s' % (field[0], field[0]) for field in fields]
+    items.extend(['%r: %s' % item for item in sorted(constants.items())])
+    lines.append('    return {%s}' % ', '.join(items))
+    return '\n'.join(lines) + '\n'
+
+class LazyMessage(object):
+    # A decoded AIVDM message that can be used like the dictionary
+    # returned by telegramparser (in, get, iteritems and so on). It
+    # holds the payload bits and decodes each field the first time it
+    # is accessed. A subclass with a slot for each field is generated
+    # for each message type in aivdm_schema, where an unset slot means
+    # that the field is not decoded yet
+    __slots__ = ('bits', 'nbits', 'time', 'source', 'extra')
+
+    # Set in the generated subclasses: the message type, the field
+    # names in schema order and a decoder function for each field
+    message = None
+    fieldnames = ()
+    decoders = {}
+
+    def __init__(self, bits, nbits, timestamp):
+        self.bits = bits
+        self.nbits = nbits
+        self.time = timestamp
+        # Dictionary for any other keys that are set
+        self.extra = None
+
+    def __getitem__(self, key):
+        decoder = self.decoders.get(key)
+        if decoder is not None:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                # Decode the field and keep the value
+                value = decoder(self.bits, self.nbits)
+                setattr(self, key, value)
+                return value
+        if key == 'time' or key == 'source':
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key)
+        if self.extra is not None and key in self.extra:
+            return self.extra[key]
+        if key == 'message':
+            return self.message
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key in self.decoders or key == 'time' or key == 'source':
+            setattr(self, key, value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def __contains__(self, key):
+        if key in self.decoders or key == 'message':
+            return True
+        if key == 'time' or key == 'source':
+            return hasattr(self, key)
+        return self.extra is not None and key in self.extra
+
+    has_key = __contains__
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        keys = list(self.fieldnames)
+        keys.append('message')
+        for key in ('time', 'source'):
+            if hasattr(self, key):
+                keys.append(key)
+        if self.extra is not None:
+            keys.extend([key for key in self.extra if key not in keys])
+        return keys
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def iteritems(self):
+        for key in self.keys():
+            yield key, self[key]
+
+    def items(self):
+        return list(self.iteritems())
+
+    def values(self):
+        return [value for key, value in self.iteritems()]
+
+    def copy(self):
+        # Returns all fields decoded in a normal dictionary
+        return dict(self.iteritems())
+
+    def __eq__(self, other):
+        if isinstance(other, (dict, LazyMessage)):
+            return self.copy() == dict(other)
+        return NotImplemented
+
+    def __ne__(self, other):
+        if isinstance(other, (dict, LazyMessage)):
+            return self.copy() != dict(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return repr(self.copy())
+
+def fielddecodersource(name, field, truncated=False, backend='decimal'):
+    # Returns the Python source of a function called name that decodes
+    # and returns only field. If truncated is set, the field is None
+    # if it goes beyond the end of a short payload
+    lines = ['def %s(bits, nbits):' % name]
+    if truncated and field[2] is not None:
+        lines.append('    if nbits < %d: return None' % (field[1] + field[2]))
+    lines.extend(['    ' + line for line in fieldsource(field, backend)])
+    lines.append('    return %s' % field[0])
+    return '\n'.join(lines) + '\n'
+
+def makedecoders(backend):
+    # Generates a decoder function for each message type in
+    # aivdm_schema and each application in binary_schema, and a
+    # LazyMessage subclass for each message type with a decoder
+    # function for each field. Returns three dicts with them keyed on
+    # the schema keys (aivdm decoders, lazy messages, binary decoders)
+    aivdm_decoders = {}
+    lazy_messages = {}
+    for key, fields in aivdm_schema.items():
+        if isinstance(key, tuple):
+            name = 'aivdm_%d_%d' % key
+            message = str(key[0])
+        else:
+            name = 'aivdm_%d' % key
+            message = str(key)
+        fields = aivdm_header + fields
+        truncated = key in truncated_types
+        # The functions get the module globals but are put in namespace
+        namespace = {}
+        exec decodersource(name, 'bits, nbits, timestamp', fields,
+                           {'time': 'timestamp', 'message': repr(message)},
+                           truncated, backend) in globals(), namespace
+        aivdm_decoders[key] = namespace[name]
+        fieldnames = tuple([field[0] for field in fields])
+        # A field must not hide an attribute of LazyMessage
+        assert not [f for f in fieldnames if hasattr(LazyMessage, f)]
+        namespace = {}
+        for field in fields:
+            exec fielddecodersource(field[0], field, truncated, backend) in globals(), namespace
+        lazy_messages[key] = type('LazyMessage' + name[5:], (LazyMessage,),
+                                  {'__slots__': fieldnames,
+                                   'message': message,
+                                   'fieldnames': fieldnames,
+                                   'decoders': namespace})
+    binary_decoders = {}
+    for key, fields in binary_schema.items():
+        name = 'binary_%d_%d' % key
+        namespace = {}
+        exec decodersource(name, 'bits, nbits', fields, truncated=True,
+                           backend=backend) in globals(), namespace
+        binary_decoders[key] = namespace[name]
+    return aivdm_decoders, lazy_messages, binary_decoders
+
+# The generated decoders for each numeric backend
+decoder_sets = {'decimal': makedecoders('decimal'),
+                'float': makedecoders('float')}
+# The message types that are keyed on (type, part)
+partitioned_types = set([key[0] for key in aivdm_schema if isinstance(key, tuple)])
+
+def setnumericbackend(backend):
+    # Selects if the fractional values decoded by telegramparser
+    # (positions, speeds, courses and so on) are decimal.Decimal
+    # ('decimal', the default) or float ('float'). Float positions are
+    # rounded to six decimals, like the quantized decimals
+    global numeric_backend, aivdm_decoders, lazy_messages, binary_decoders
+    aivdm_decoders, lazy_messages, binary_decoders = decoder_sets[backend]
+    numeric_backend = backend
+    # The cached messages were decoded with the previous backend
+    static_cache.clear()
+
+setnumericbackend('decimal')
 
 def standard_int_field(data):
     # This function simplifies in checking for N/A-values
@@ -887,36 +1097,207 @@ def tobin(x, count=8):
     # the number of bits
     return "".join(map(lambda y:str((x>>y)&1), range(count-1, -1, -1)))
 
+# The widths and masks used by xorbytes to fold an integer in half
+xor_folds = [(width, (1 << width) - 1)
+             for width in (4096, 2048, 1024, 512, 256, 128, 64, 32, 16, 8)]
+
+def xorbytes(data):
+    # Returns all bytes in the string data XOR:ed together. The bytes
+    # are read as a single integer, which is folded in half until only
+    # one byte remains
+    if len(data) > 1024:
+        return reduce(operator.xor, bytearray(data), 0)
+    elif not data:
+        return 0
+    value = int(binascii.b2a_hex(data), 16)
+    nbits = len(data) << 3
+    for width, mask in xor_folds:
+        if width < nbits:
+            value = (value >> width) ^ (value & mask)
+    return int(value)
+
 def makechecksum(s):
     # Calculate a checksum from sentence
-    csum = 0
-    i = 0
-    s = s[1:s.rfind('*')] # Remove ! or $ and *xx in the sentence
-
-    while (i < len(s)):
-        inpt = binascii.b2a_hex(s[i])
-        inpt = int(inpt,16)
-        csum = csum ^ inpt #xor
-        i += 1
-
-    return csum
+    # Remove ! or $ and *xx in the sentence
+    return xorbytes(s[1:s.rfind('*')])
 
 def checksum(s):
     # Create a checksum and compare it with the supplied checksum
     # If they are identical return 1, if not return 0
+    star = s.rfind('*')
     try:
         # Create an integer of the two characters after the *, to the right
-        supplied_csum = int(s[s.rfind('*')+1:s.rfind('*')+3], 16)
+        supplied_csum = int(s[star+1:star+3], 16)
     except: return ''
 
-    # Create the checksum
-    csum = makechecksum(s)
+    # Create the checksum and compare
+    return xorbytes(s[1:star]) == supplied_csum
+
+# The value of each hexadecimal digit, and 255 for all other bytes
+hex_values = numpy.empty(256, numpy.uint8)
+hex_values.fill(255)
+for digit in '0123456789ABCDEFabcdef':
+    hex_values[ord(digit)] = int(digit, 16)
+
+def checksumranges(buffer):
+    # Checks the checksum of every complete line (ended by a line
+    # feed) in buffer, a string read from a file or a socket, at once.
+    # Returns a list of (start, end) for the lines with a valid
+    # checksum, where buffer[start:end] is the line without the line
+    # break. The sentence of a line may have a tag block or a
+    # timestamp around it (see splittimestamp), which is not part of
+    # the checksum. A trailing incomplete line is not checked
+    data = numpy.frombuffer(buffer, numpy.uint8)
+    ends = numpy.flatnonzero(data == ord('\n'))
+    stars = numpy.flatnonzero(data == ord('*'))
+    marks = numpy.flatnonzero((data == ord('!')) | (data == ord('$')))
+    if not len(ends) or not len(stars) or not len(marks):
+        return []
+    starts = numpy.empty_like(ends)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    # The last * on each line, where the checksum digits follow
+    index = numpy.searchsorted(stars, ends) - 1
+    star = stars[numpy.maximum(index, 0)]
+    # The first ! or $ on each line, where the sentence starts
+    first = numpy.searchsorted(marks, starts)
+    mark = marks[numpy.minimum(first, len(marks) - 1)]
+    valid = ((index >= 0) & (first < len(marks)) & (mark >= starts) &
+             (star > mark) & (star + 3 <= ends))
+    # The XOR of all bytes up to each byte, so that the XOR of the
+    # bytes between the first character and the * is found with one
+    # XOR for each line
+    running = numpy.bitwise_xor.accumulate(data)
+    csum = running[numpy.maximum(star - 1, 0)] ^ running[mark]
+    last = len(data) - 1
+    high = hex_values[data[numpy.minimum(star + 1, last)]]
+    low = hex_values[data[numpy.minimum(star + 2, last)]]
+    valid &= (high < 16) & (low < 16) & (csum == (high << 4 | low))
+    # Leave out the carriage return of lines ended by CR LF
+    ends = ends - (data[numpy.maximum(ends - 1, 0)] == ord('\r'))
+    return zip(starts[valid].tolist(), ends[valid].tolist())
+
+def sentenceindex(line):
+    # Returns the index in line where the NMEA sentence starts (at the
+    # first ! or $), or -1 if there is none
+    mark = line.find('!')
+    dollar = line.find('$')
+    if mark == -1 or 0 <= dollar < mark:
+        return dollar
+    return mark
+
+def sentencetype(line):
+    # Returns the message type of the AIS sentence in line as a string
+    # like in telegramparser ('1', 'S02'), without checking or
+    # decoding it. Returns None for other sentences and for the second
+    # and later sentences of multi-sentence messages
+    start = sentenceindex(line)
+    if line.startswith('!AIVDM', start):
+        telegram = line[start:].split(',', 6)
+        if len(telegram) < 7 or telegram[2] != '1':
+            return None
+        try:
+            return str(sixbit_values[telegram[5][:1]])
+        except KeyError:
+            return None
+    elif line.startswith('$PAIS', start):
+        telegram = line[start:].split(',', 2)
+        if len(telegram) == 3:
+            return 'S' + telegram[1]
+    return None
+
+def splittimestamp(line):
+    # Splits a received line in the NMEA sentence and the time it was
+    # received, as a datetime in local time, or None if the line has
+    # no time. These ways of adding the time are understood:
+    #  - NMEA 4 tag blocks before the sentence, with the UNIX time in
+    #    the c parameter, like \s:r003669945,c:1241544035*53\!AIVDM...
+    #  - a UNIX time or an ISO 8601 date and time (like
+    #    2009-05-05 19:20:35.123) before the sentence, as many
+    #    receivers and loggers write it
+    #  - a UNIX time as the last field after the checksum, like
+    #    !AIVDM...*5C,b003669977,1241544035 from the USCG NAIS
+    first = line[:1]
+    if first == '!' or first == '$':
+        star = line.rfind('*')
+        if line[star+3:star+4] != ',':
+            # Just the sentence, the common case
+            return line, None
+        return line[:star+3], epochtime(line[star+4:].rsplit(',', 1)[-1])
+    start = sentenceindex(line)
+    if start == -1:
+        return line, None
+    sentence = line[start:]
+    if first == '\\':
+        # Tag blocks: \parameter:value,...*hh\
+        tags = line[1:start-1].split('\\')[0]
+        star = tags.rfind('*')
+        try:
+            if xorbytes(tags[:star]) != int(tags[star+1:star+3], 16):
+                return sentence, None
+        except ValueError:
+            return sentence, None
+        for tag in tags[:star].split(','):
+            if tag.startswith('c:'):
+                return sentence, epochtime(tag[2:])
+        return sentence, None
+    return sentence, parsetime(line[:start])
+
+def epochtime(text):
+    # Returns the UNIX time in text, in seconds or milliseconds, as a
+    # datetime in local time, or None
+    try:
+        seconds = float(text)
+        if seconds > 1e11:
+            seconds = seconds / 1000
+        return datetime.datetime.fromtimestamp(seconds)
+    except (ValueError, OverflowError):
+        return None
 
-    # Compare and return
-    if csum == supplied_csum:
-        return True
-    else:
-        return False
+class MessageClock(object):
+    # The current time in the time of the messages: the time of the
+    # newest message plus the time that has passed since it came. For
+    # live data that is the wall clock time, and for a replayed
+    # archive (also faster than real time) it is the time in the
+    # archive, if its lines have tag block or receiver times
+    def __init__(self):
+        self.newest = None
+        # The UNIX time when the newest message came
+        self.received = None
+
+    def update(self, timestamp, now):
+        # Takes the time of a message (a datetime) that came at the
+        # UNIX time now
+        if self.newest is None or timestamp > self.newest:
+            self.newest = timestamp
+            self.received = now
+
+    def time(self, now):
+        # Returns the current time as a datetime, at the UNIX time now
+        if self.newest is None:
+            return datetime.datetime.fromtimestamp(now)
+        return self.newest + datetime.timedelta(seconds=now - self.received)
+
+def parsetime(text):
+    # Returns the time in text, a UNIX time or an ISO 8601 date and
+    # time with a T or a space between them, as a datetime in local
+    # time, or None. Times without a time zone are taken as local
+    # time, and times ending with Z as UTC
+    text = text.strip(' \t;,[]')
+    if text[:1].isdigit() and text.replace('.', '', 1).isdigit():
+        return epochtime(text)
+    utc = text.endswith('Z')
+    date, dot, fraction = text.rstrip('Z').replace('T', ' ', 1).partition('.')
+    try:
+        timestamp = datetime.datetime.strptime(date, '%Y-%m-%d %H:%M:%S')
+    except ValueError:
+        return None
+    if fraction.isdigit():
+        timestamp = timestamp.replace(microsecond=int(fraction[:6].ljust(6, '0')))
+    if utc:
+        return epochtime(calendar.timegm(timestamp.timetuple()) +
+                         timestamp.microsecond / 1e6)
+    return timestamp
 
 def sixtobin(encstring):
     # Converts encstring from coded 6-bit symbols to a binary string
@@ -937,6 +1318,76 @@ def sixtobin(encstring):
         totalbin = totalbin + tobin(symbol, count=6)
     return totalbin
 
+# Precomputed table for the 6-bit symbols in AIVDM payloads. Maps each
+# valid symbol to the six bits it represents (same table as in sixtobin)
+sixbit_table = {}
+for symbol in range(48, 120):
+    if symbol < 88:
+        sixbit_table[chr(symbol)] = tobin(symbol - 48, count=6)
+    else:
+        sixbit_table[chr(symbol)] = tobin(symbol - 56, count=6)
+
+# Precomputed table mapping each valid 6-bit symbol to its integer value
+sixbit_values = dict([(symbol, int(bits, 2)) for symbol, bits in sixbit_table.items()])
+
+# Precomputed table mapping a 6-bit integer to its ASCII character
+ascii_table = ''.join([chr(symbol + 64) for symbol in range(32)] +
+                      [chr(symbol) for symbol in range(32, 64)])
+
+def sixtoint(encstring):
+    # Converts encstring from coded 6-bit symbols to an integer and
+    # returns the integer together with its number of bits. A symbol
+    # that does not exist in the character table ends the payload
+    # (like in sixtobin)
+    value = 0
+    count = 0
+    for x in encstring:
+        symbol = sixbit_values.get(x)
+        if symbol is None:
+            break
+        value = value << 6 | symbol
+        count += 1
+    return value, count * 6
+
+def bitfield(bits, nbits, start, end):
+    # Returns the unsigned integer in bit positions start to end of
+    # the integer bits (holding nbits bits), counted from the left. As
+    # with slicing a binary string, the field ends at nbits if end is
+    # beyond it, and fields beyond nbits are 0
+    end = min(end, nbits)
+    if end <= start:
+        return 0
+    return int((bits >> (nbits - end)) & ((1 << (end - start)) - 1))
+
+def inttobin(bits, nbits, start, end):
+    # Returns the bit positions start to end of the integer bits as a
+    # binary string. As with slicing a string, end may be beyond nbits
+    end = min(end, nbits)
+    if end <= start:
+        return ''
+    return format(bitfield(bits, nbits, start, end), '0%db' % (end - start))
+
+def inttoascii(bits, nbits, start, end):
+    # Converts the bit positions start to end of the integer bits to an
+    # ASCII string, in the same way as bintoascii does for binary strings
+    count = (min(end, nbits) - start) // 6
+    if count <= 0:
+        return ''
+    value = bits >> (nbits - start - count * 6)
+    chars = []
+    for i in range(count):
+        chars.append(ascii_table[value & 63])
+        value = value >> 6
+    chars.reverse()
+    return ''.join(chars)
+
+def hextobin(hexstring):
+    # Converts a string of hexadecimal symbols to a binary string with
+    # four bits per symbol
+    if not hexstring:
+        return ''
+    return format(int(hexstring, 16), '0%db' % (len(hexstring) * 4))
+
 def bintoascii(binstring):
     # Converts binstring from binary integers to an ASCII string
     totalascii = ''
@@ -1010,7 +1461,559 @@ def calclongitude(binary_longitude):
     # Return a value quantized to six decimal digits
     return degree.quantize(decimal.Decimal('1E-6'))
 
+def intlatitude(value, nbits, tofloat=False):
+    # Calculates latitude from the integer value holding nbits bits,
+    # in the same way as calclatitude does for a binary string. If
+    # tofloat is set, a float rounded to six decimals is returned
+    if nbits == 17:
+        factor = 600 # 10 * 60
+        power = 16
+    elif nbits == 24:
+        factor = 60000 # 1000 * 60
+        power = 23
+    elif nbits == 27:
+        factor = 600000 # 10000 * 60
+        power = 26
+    else:
+        # Better to return None than a wrong value
+        return None
+    # Split in the signed bit and the rest
+    sign = (value >> power) & 1
+    latitude = value & ((1 << power) - 1)
+    # See if the latitude are undefined (lat=91)
+    if latitude == 91*factor:
+        return None # N/A
+    # Else, calculate the latitude
+    if tofloat:
+        if sign: # Negative == South
+            return -round(float((1 << power) - latitude) / factor, 6)
+        return round(float(latitude) / factor, 6)
+    if sign: # Negative == South
+        latitude = (1 << power) - latitude
+        degree = -decimal.Decimal(latitude) / factor
+    else: # Positive == North
+        degree = decimal.Decimal(latitude) / factor
+    # Return a value quantized to six decimal digits
+    return degree.quantize(decimal.Decimal('1E-6'))
+
+def intlongitude(value, nbits, tofloat=False):
+    # Calculates longitude from the integer value holding nbits bits,
+    # in the same way as calclongitude does for a binary string. If
+    # tofloat is set, a float rounded to six decimals is returned
+    if nbits == 18:
+        factor = 600 # 10 * 60
+        power = 17
+    elif nbits == 25:
+        factor = 60000 # 1000 * 60
+        power = 24
+    elif nbits == 28:
+        factor = 600000 # 10000 * 60
+        power = 27
+    else:
+        # Better to return None than a wrong value
+        return None
+    # Split in the signed bit and the rest
+    sign = (value >> power) & 1
+    longitude = value & ((1 << power) - 1)
+    # See if the longitude are undefined (long=181)
+    if longitude == 181*factor:
+        return None # N/A
+    # Else, calculate the longitude
+    if tofloat:
+        if sign: # Negative == West
+            return -round(float((1 << power) - longitude) / factor, 6)
+        return round(float(longitude) / factor, 6)
+    if sign: # Negative == West
+        longitude = (1 << power) - longitude
+        degree = -decimal.Decimal(longitude) / factor
+    else: # Positive == East
+        degree = decimal.Decimal(longitude) / factor
+    # Return a value quantized to six decimal digits
+    return degree.quantize(decimal.Decimal('1E-6'))
 
+def introt(value):
+    # Calculates rate of turn in degrees/minute from the 8 bits value
+    # (ROTais from -127 to +127 where 128=N/A)
+    sign = value >> 7
+    rateofturn = value & 127
+    if rateofturn > 126:
+        return None # N/A
+    elif sign and rateofturn > 1:
+        # Turning left
+        rateofturn = 128 - rateofturn
+        # Convert between ROTais and ROTind
+        rateofturn = -int(math.pow((rateofturn/4.733), 2))
+        if rateofturn < -720:
+            rateofturn = -720 # Full
+    else:
+        # Turning right
+        # Convert between ROTais and ROTind
+        rateofturn = int(math.pow((rateofturn/4.733), 2))
+        if rateofturn > 720:
+            rateofturn = 720 # Full
+    return rateofturn
+
+def inteta(value):
+    # Converts the 20 bits value to an estimated time of arrival in
+    # format month-day-hour-minute: MMDDHHMM
+    return (str(value >> 16).zfill(2) +
+            str((value >> 11) & 31).zfill(2) +
+            str((value >> 6) & 31).zfill(2) +
+            str(value & 63).zfill(2))
+
+def intdatetime(value):
+    # Converts the 40 bits value (year, month, day, hour, minute and
+    # second) to a datetime, or None if it is not a valid time
+    try:
+        return datetime.datetime(value >> 26, (value >> 22) & 15,
+                                 (value >> 17) & 31, (value >> 12) & 31,
+                                 (value >> 6) & 63, value & 63)
+    except ValueError:
+        return None # N/A
+
+def intdayhourminute(value):
+    # Converts the 16 bits value (day, hour and minute) to a datetime
+    # in UTC. We use computer time as a baseline for year and month
+    try:
+        station_time = datetime.datetime.utcnow()
+        return station_time.replace(day=value >> 11, hour=(value >> 6) & 31,
+                                    minute=value & 63, second=0,
+                                    microsecond=0)
+    except ValueError:
+        return None # N/A
+
+def intbinaryparser(bits, nbits, start, end):
+    # Decodes the binary payload in bit positions start to end of the
+    # integer bits with the decoder for its application ID (the DAC
+    # and FI in the 16 bits before start)
+    decoder = binarydecoder(bitfield(bits,nbits,start-16,start-6),
+                            bitfield(bits,nbits,start-6,start))
+    if decoder is None:
+        return None
+    end = min(end, nbits)
+    if end <= start:
+        return decoder(0, 0)
+    return decoder(bitfield(bits,nbits,start,end), end - start)
+
+
+def intrawbinary(bits, nbits, start, end):
+    # Returns the binary payload in bit positions start to end of the
+    # integer bits as a tuple (integer, number of bits), if there is no
+    # decoder for its application ID. Else None. The payload is not
+    # converted to a binary string (like binaryparser takes) here, as
+    # it is seldom used; inttobin(value, count, 0, count) does that
+    if (bitfield(bits,nbits,start-16,start-6),
+        bitfield(bits,nbits,start-6,start)) in binary_decoders:
+        return None
+    end = min(end, nbits)
+    if end <= start:
+        return 0, 0
+    return bitfield(bits,nbits,start,end), end - start
+
+# The number of binary messages seen for each application ID (DAC, FI)
+binary_counts = {}
+
+def binarydecoder(dac, fi):
+    # Returns the decoder for binary messages with application ID dac
+    # and fi, or None if there is none, and counts the message in
+    # binary_counts
+    key = (dac, fi)
+    binary_counts[key] = binary_counts.get(key, 0) + 1
+    return binary_decoders.get(key)
+
+def registerbinarydecoder(dac, fi, decoder):
+    # Registers decoder for binary messages with application ID dac and
+    # fi, for all numeric backends. The decoder is called with the
+    # binary payload as an integer and its number of bits, like the
+    # ones generated from binary_schema, and should return a
+    # dictionary. A decoder of None removes the registered decoder
+    for aivdm_decoders, lazy_messages, binary_decoders in decoder_sets.values():
+        if decoder is None:
+            binary_decoders.pop((dac, fi), None)
+        else:
+            binary_decoders[(dac, fi)] = decoder
+
+def mmsiranges(text):
+    # Converts a comma separated list of MMSI numbers and ranges of MMSI
+    # numbers (first-last) to a list of (first, last) tuples
+    ranges = []
+    for item in text.replace(' ', '').split(','):
+        if not item:
+            continue
+        first, sep, last = item.partition('-')
+        if not last:
+            last = first
+        ranges.append((int(first), int(last)))
+    return ranges
+
+class MessageFilter(object):
+    # An ingress filter deciding whether a sentence should be decoded
+    # at all, only looking at the message type and the MMSI number. For
+    # AIVDM sentences those are taken from the first seven payload
+    # symbols, so that a rejected sentence is never decoded
+    #   message_types      -- the message types to let through, as
+    #                         strings like in telegramparser ('1', 'S02')
+    #                         or None for all types
+    #   mmsi_allow         -- if not empty, a list of (first, last) MMSI
+    #                         ranges to let through
+    #   mmsi_deny          -- a list of (first, last) MMSI ranges to drop
+    #   drop_base_stations -- drop base station reports (message 4) and
+    #                         everything sent from a base station MMSI
+    #                         (00MIDXXXX)
+    def __init__(self, message_types=None, mmsi_allow=(), mmsi_deny=(),
+                 drop_base_stations=False):
+        if message_types is None:
+            self.message_types = None
+        else:
+            # AIVDM message types are compared as integers
+            self.message_types = set()
+            for message in message_types:
+                if message.isdigit():
+                    self.message_types.add(int(message))
+                else:
+                    self.message_types.add(message)
+        self.mmsi_allow = list(mmsi_allow)
+        self.mmsi_deny = list(mmsi_deny)
+        self.drop_base_stations = drop_base_stations
+
+    def accept(self, sentence):
+        # Returns False if sentence should be dropped. Sentences that
+        # cannot be judged (own position, broken sentences) are accepted
+        if sentence.startswith('!AIVDM'):
+            payload = sentence.split(',', 6)[5:6]
+            if not payload:
+                return True
+            return self.acceptpayload(payload[0])
+        elif sentence.startswith('$PAIS'):
+            telegram = sentence.split(',', 3)
+            try:
+                message = 'S' + telegram[1]
+                mmsi = int(telegram[2], 16)
+            except (IndexError, ValueError):
+                return True
+        else:
+            return True
+        return self.acceptmessage(message, mmsi)
+
+    def acceptpayload(self, payload):
+        # Returns False if the AIVDM payload should be dropped
+        if len(payload) < 7:
+            return True
+        try:
+            message = sixbit_values[payload[0]]
+            # The bits 6-42 of the payload, with the MMSI in bits 8-38
+            header = 0
+            for symbol in payload[1:7]:
+                header = (header << 6) | sixbit_values[symbol]
+        except KeyError:
+            return True
+        return self.acceptmessage(message, (header >> 4) & 0x3FFFFFFF)
+
+    def acceptmessage(self, message, mmsi):
+        # Returns False if the message type and MMSI should be dropped
+        if self.message_types is not None and message not in self.message_types:
+            return False
+        if self.drop_base_stations and (message == 4 or mmsi < 10000000):
+            return False
+        for first, last in self.mmsi_deny:
+            if first <= mmsi <= last:
+                return False
+        if self.mmsi_allow:
+            for first, last in self.mmsi_allow:
+                if first <= mmsi <= last:
+                    return True
+            return False
+        return True
+
+
+class Reassembler(object):
+    # Joins multi-sentence AIVDM messages. The fragments are kept per
+    # source, radio channel and sequential message id, so that
+    # messages sent interleaved are joined as well. Each fragment is
+    # checked once, and the joined payload is returned without
+    # creating a new sentence
+    #   maxsize -- the largest number of incomplete messages kept, the
+    #              oldest is dropped when a new one would exceed it
+    #   timeout -- seconds after which an incomplete message is dropped
+    def __init__(self, maxsize=1000, timeout=60):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        # Incomplete messages in the order they were started, as
+        # (source, channel, seq id): [start time, number of sentences,
+        # list of payloads]
+        self.fragments = collections.OrderedDict()
+        # The number of incomplete messages dropped
+        self.evicted = 0
+
+    def add(self, source, sentence, now=None, checked=False):
+        # Adds an AIVDM sentence from source. Returns the tuple
+        # (payload, fill bits) when a message is complete, None when
+        # more sentences are needed and False if the sentence is broken.
+        # If checked is set, the checksum has already been checked
+        telegram = sentence.split(',')
+        if len(telegram) < 7 or not (checked or checksum(sentence)):
+            return False
+        try:
+            total = int(telegram[1])
+            number = int(telegram[2])
+            fillbits = int(telegram[6].split('*')[0])
+        except ValueError:
+            return False
+        payload = telegram[5]
+        if total == 1:
+            return payload, fillbits
+        if now is None:
+            now = time.time()
+        key = (source, telegram[4], telegram[3])
+        fragments = self.fragments
+        if number == 1:
+            # Drop incomplete messages that are too old or too many
+            threshold = now - self.timeout
+            while fragments:
+                oldest = next(fragments.itervalues())
+                if oldest[0] >= threshold and len(fragments) < self.maxsize:
+                    break
+                fragments.popitem(last=False)
+                self.evicted += 1
+            if key in fragments:
+                # An unfinished message with the same id is replaced
+                del fragments[key]
+                self.evicted += 1
+            fragments[key] = [now, total, [payload]]
+            return None
+        entry = fragments.get(key)
+        # The sentences must come in order
+        if entry is None or entry[1] != total or len(entry[2]) != number - 1:
+            if entry is not None:
+                del fragments[key]
+                self.evicted += 1
+            return None
+        entry[2].append(payload)
+        if number < total:
+            return None
+        del fragments[key]
+        return ''.join(entry[2]), fillbits
+
+
+class DuplicateFilter(object):
+    # Remembers the AIVDM payloads seen during the last window seconds,
+    # so that copies of a message received from several overlapping
+    # inputs are only decoded once. A value, like if the message was
+    # decoded, is kept with each payload
+    #   window  -- seconds during which a payload counts as duplicate
+    #   maxsize -- the largest number of payloads kept, the oldest is
+    #              forgotten when a new one would exceed it
+    def __init__(self, window=2.0, maxsize=10000):
+        self.window = window
+        self.maxsize = maxsize
+        # Payloads in the order they were first seen, with value
+        # [time, value]
+        self.seen = collections.OrderedDict()
+        # The number of duplicates found
+        self.duplicates = 0
+
+    def get(self, payload, now=None):
+        # Returns the value kept for payload if it was seen within the
+        # window, else None
+        if now is None:
+            now = time.time()
+        seen = self.seen
+        # Forget payloads older than the window
+        threshold = now - self.window
+        while seen and next(seen.itervalues())[0] < threshold:
+            seen.popitem(last=False)
+        entry = seen.get(payload)
+        if entry is None:
+            return None
+        self.duplicates += 1
+        return entry[1]
+
+    def add(self, payload, value, now=None):
+        # Remembers payload with value, which must not be None, as get
+        # returns None for payloads not seen
+        if value is None:
+            raise ValueError("None cannot be kept as the value of a payload")
+        if now is None:
+            now = time.time()
+        seen = self.seen
+        if len(seen) >= self.maxsize:
+            seen.popitem(last=False)
+        seen[payload] = [now, value]
+
+
+def summarize(message):
+    # Returns what a Subscription needs to know about a decoded
+    # message, as (message type, MMSI, latitude, longitude). The type
+    # is an integer for AIVDM messages, like in MessageFilter, and the
+    # position is None if the message has none
+    messagetype = message.get('message')
+    if messagetype and messagetype.isdigit():
+        messagetype = int(messagetype)
+    latitude = message.get('latitude')
+    longitude = message.get('longitude')
+    if latitude is None or longitude is None:
+        return messagetype, message['mmsi'], None, None
+    return messagetype, message['mmsi'], float(latitude), float(longitude)
+
+class Subscription(object):
+    # The messages a client of the network server wants, judged from
+    # the summaries of the decoded messages (see summarize)
+    #   positions     -- a dict of the last known (latitude, longitude)
+    #                    by MMSI, kept by the owner, for messages
+    #                    without a position of their own
+    #   bbox          -- (south, west, north, east) in decimal degrees,
+    #                    or None for everywhere. West may be larger
+    #                    than east for an area across 180 degrees
+    #   message_types -- the message types, like in MessageFilter
+    #   mmsi          -- a list of (first, last) MMSI ranges, or empty
+    #                    for all
+    #   interval      -- the least number of seconds between two
+    #                    positions of the same MMSI
+    def __init__(self, positions, bbox=None, message_types=None, mmsi=(),
+                 interval=0):
+        self.positions = positions
+        self.bbox = bbox
+        self.filter = MessageFilter(message_types, mmsi)
+        self.interval = interval
+        # The time the last position of each MMSI was accepted
+        self.sent = {}
+
+    def accept(self, summary, now):
+        # Returns True if the message with summary should be sent
+        messagetype, mmsi, latitude, longitude = summary
+        if not self.filter.acceptmessage(messagetype, mmsi):
+            return False
+        if self.bbox is not None:
+            if latitude is None:
+                position = self.positions.get(mmsi)
+                if position is None:
+                    return False
+                latitude, longitude = position
+            south, west, north, east = self.bbox
+            if not south <= latitude <= north:
+                return False
+            if west <= east:
+                if not west <= longitude <= east:
+                    return False
+            elif east < longitude < west:
+                return False
+        if self.interval and summary[2] is not None:
+            if now - self.sent.get(mmsi, 0) < self.interval:
+                return False
+            self.sent[mmsi] = now
+        return True
+
+def parsesubscription(line, positions):
+    # Parses a subscription sent by a network client, like
+    #   SUBSCRIBE bbox=57.5,11.5,58.0,12.0 types=1,2,3,5 mmsi=265000000-265999999 interval=10
+    # where each part after SUBSCRIBE may be left out. Returns a
+    # Subscription using positions, or None for everything. Raises
+    # ValueError if the line is not a valid subscription
+    words = line.split()
+    if not words or words[0].upper() != 'SUBSCRIBE':
+        raise ValueError("not a subscription: %r" % line[:80])
+    options = {}
+    for word in words[1:]:
+        name, sep, value = word.partition('=')
+        name = name.lower()
+        if not sep or name not in ('bbox', 'types', 'mmsi', 'interval'):
+            raise ValueError("unknown subscription option %r" % word[:80])
+        options[name] = value
+    if not options:
+        return None
+    bbox = None
+    if 'bbox' in options:
+        bbox = [float(value) for value in options['bbox'].split(',')]
+        if len(bbox) != 4:
+            raise ValueError("bbox is not south,west,north,east")
+    message_types = None
+    if 'types' in options:
+        message_types = [message.strip().upper() for message in options['types'].split(',') if message.strip()]
+    return Subscription(positions, bbox, message_types,
+                        mmsiranges(options.get('mmsi', '')),
+                        float(options.get('interval', 0)))
+
+
+def itersentences(input, blocksize=65536, maxline=4096):
+    # Yields the lines with a valid checksum in input, without line
+    # breaks. Input is either a file object, which is read in blocks of
+    # blocksize bytes and checked with checksumranges, or an iterable of
+    # lines. Lines longer than maxline are dropped. The lines may have
+    # a tag block or a timestamp, see splittimestamp
+    for lines in iterblocks(input, blocksize, maxline):
+        for line in lines:
+            yield line
+
+def iterblocks(input, blocksize=65536, maxline=4096):
+    # Yields the lines with a valid checksum in input like
+    # itersentences, as a list for each block read from input (for an
+    # iterable of lines, a list of one line for each line)
+    if not hasattr(input, 'read'):
+        for line in input:
+            line = line.strip()
+            if checksum(line[max(sentenceindex(line), 0):]):
+                yield [line]
+        return
+    rest = ''
+    # True while the rest of a too long line is skipped
+    discarding = False
+    while True:
+        block = input.read(blocksize)
+        if not block:
+            break
+        if discarding:
+            linebreak = block.find('\n')
+            if linebreak == -1:
+                continue
+            block = block[linebreak + 1:]
+            discarding = False
+        buffer = rest + block
+        yield [buffer[start:end] for start, end in checksumranges(buffer)]
+        # Keep the incomplete last line for the next block
+        rest = buffer[buffer.rfind('\n') + 1:]
+        if len(rest) > maxline:
+            rest = ''
+            discarding = True
+    # The last line may lack a line break
+    if rest:
+        rest += '\n'
+        yield [rest[start:end] for start, end in checksumranges(rest)]
+
+def iter_messages(input, lazy=False, message_filter=None, source='File'):
+    # Decodes the sentences in input, a file object or an iterable of
+    # lines, and yields the decoded messages one at a time, like
+    # CommHubThread in main.py does but without threads. Multi-sentence
+    # AIVDM messages are joined, and sentences that are broken, that
+    # cannot be decoded or that message_filter (a MessageFilter) drops
+    # are skipped. Only one block of input and the incomplete
+    # multi-sentence messages are kept in memory. Source is used to
+    # tell the fragments of different inputs apart. The messages get
+    # the time from the tag block or timestamp of their line, or else
+    # the time their block was read
+    reassembler = Reassembler()
+    for lines in iterblocks(input):
+        received = datetime.datetime.now()
+        for line in lines:
+            sentence, timestamp = splittimestamp(line)
+            if timestamp is None:
+                timestamp = received
+            try:
+                if sentence.startswith('!AIVDM'):
+                    message = reassembler.add(source, sentence, checked=True)
+                    if not message:
+                        continue
+                    if message_filter and not message_filter.acceptpayload(message[0]):
+                        continue
+                    decoded = payloadparser(message[0], lazy, timestamp)
+                else:
+                    if message_filter and not message_filter.accept(sentence):
+                        continue
+                    decoded = telegramparser(sentence, lazy, timestamp)
+            except (ValueError, KeyError, IndexError):
+                # A sentence with a valid checksum but broken contents
+                continue
+            if decoded is not None:
+                yield decoded
 
 
 class TestDecode(unittest.TestCase):
@@ -1050,6 +2053,422 @@ class TestDecode(unittest.TestCase):
         joined = jointelegrams("""!AIVDM,2,1,2,A,53u1V`01gnR5<DTn221>qB0thtJ222222222220l0pJ644b?e=kSlTRk,0*0E\n!AIVDM,2,2,2,A,l2CQp8888888880,2*22""")
         self.assertEqual(joined, correct)
 
+    def testchecksum(self):
+        for data in ['', 'A', 'AIVDM,1,1,,A,13uTAH002nJRLAHEwTi674rh04:8,0',
+                     'x' * 200, ''.join(map(chr, range(256))) * 5]:
+            self.assertEqual(xorbytes(data), reduce(lambda a, b: a ^ ord(b), data, 0))
+        self.assertTrue(checksum('!AIVDM,1,1,,A,13uTAH002nJRLAHEwTi674rh04:8,0*2B'))
+        self.assertFalse(checksum('!AIVDM,1,1,,A,13uTAH002nJRLAHEwTi674rh04:8,0*2C'))
+        buffer = ('!AIVDM,1,1,,A,13uTAH002nJRLAHEwTi674rh04:8,0*2B\r\n'
+                  '!AIVDM,1,1,,A,13uTAH002nJRLAHEwTi674rh04:8,0*2C\n'
+                  'garbage\n'
+                  '$PAIS,06,0FD2B9F2,00,BROADCAST TEXT,0*7c\n'
+                  '!AIVDM,1,1,,B,K3u?et`0KiT>N6?D,0*1D')
+        self.assertEqual([buffer[start:end] for start, end in checksumranges(buffer)],
+                         ['!AIVDM,1,1,,A,13uTAH002nJRLAHEwTi674rh04:8,0*2B',
+                          '$PAIS,06,0FD2B9F2,00,BROADCAST TEXT,0*7c'])
+        self.assertEqual(checksumranges(''), [])
+
+    def testreassembler(self):
+        reassembler = Reassembler(maxsize=2, timeout=10)
+        first = ['!AIVDM,2,1,3,B,55?MbV02;H;s<HtKR20EHE:0@T4@Dn2222222216L961O5Gf0NSQEp6ClRp8,0*1D',
+                 '!AIVDM,2,2,3,B,88888888880,2*24']
+        second = ['!AIVDM,2,1,4,B,55?MbV02;H;s<HtKR20EHE:0@T4@Dn2222222216L961O5Gf0NSQEp6ClRp8,0*1A',
+                  '!AIVDM,2,2,4,B,88888888880,2*23']
+        joined = ('55?MbV02;H;s<HtKR20EHE:0@T4@Dn2222222216L961O5Gf0NSQEp6ClRp8'
+                  '88888888880')
+        # Interleaved messages are joined
+        self.assertEqual(reassembler.add('a', first[0], 0), None)
+        self.assertEqual(reassembler.add('a', second[0], 0), None)
+        self.assertEqual(reassembler.add('a', first[1], 0), (joined, 2))
+        self.assertEqual(reassembler.add('a', second[1], 0), (joined, 2))
+        # Fragments from other sources are not mixed up
+        self.assertEqual(reassembler.add('a', first[0], 0), None)
+        self.assertEqual(reassembler.add('b', first[1], 0), None)
+        self.assertEqual(reassembler.add('a', first[1], 0), (joined, 2))
+        # Old fragments are dropped
+        self.assertEqual(reassembler.add('a', first[0], 0), None)
+        self.assertEqual(reassembler.add('a', second[0], 20), None)
+        self.assertEqual(reassembler.add('a', first[1], 20), None)
+        self.assertEqual(reassembler.evicted, 1)
+        # Single sentences and broken sentences
+        self.assertEqual(reassembler.add('a', '!AIVDM,1,1,,B,K3u?et`0KiT>N6?D,0*1D'),
+                         ('K3u?et`0KiT>N6?D', 0))
+        self.assertEqual(reassembler.add('a', '!AIVDM,1,1,,B,K3u?et`0KiT>N6?D,0*1E'), False)
+        self.assertEqual(payloadparser(joined)['name'],
+                         telegramparser(jointelegrams('\n'.join(first)))['name'])
+
+    def testduplicatefilter(self):
+        duplicates = DuplicateFilter(window=2, maxsize=2)
+        self.assertEqual(duplicates.get('13uTAH00', 0), None)
+        duplicates.add('13uTAH00', True, 0)
+        self.assertEqual(duplicates.get('13uTAH00', 1), True)
+        self.assertEqual(duplicates.get('13uTAH01', 1), None)
+        duplicates.add('13uTAH01', False, 1)
+        self.assertEqual(duplicates.get('13uTAH01', 2), False)
+        self.assertEqual(duplicates.duplicates, 2)
+        # Payloads older than the window are forgotten
+        self.assertEqual(duplicates.get('13uTAH00', 2.5), None)
+        # And the oldest when too many are kept
+        duplicates.add('13uTAH02', True, 2.5)
+        duplicates.add('13uTAH03', True, 2.5)
+        self.assertEqual(duplicates.get('13uTAH01', 2.5), None)
+        self.assertEqual(len(duplicates.seen), 2)
+        self.assertRaises(ValueError, duplicates.add, '13uTAH04', None, 2.5)
+        # Binary messages of unknown applications are not decoded (but
+        # have 'decoded' None), and their copies are found as well
+        payload = '83uTAH0j2gwwwwwwwh'
+        message = payloadparser(payload)
+        self.assertEqual((message['dac'], message['fi'], message['decoded']), (200, 10, None))
+        duplicates.add(payload, bool(message.get('decoded', True)), 3)
+        self.assertEqual(duplicates.get(payload, 3), False)
+
+    def teststaticcache(self):
+        sentence = '!AIVDM,1,1,,A,H42O55lti4hhhilD3nink0000000,0*4A'
+        static_cache.clear()
+        hits = static_cache.hits
+        first = telegramparser(sentence)
+        second = telegramparser(sentence)
+        self.assertEqual(static_cache.hits, hits + 1)
+        self.assertFalse(first is second)
+        del first['time'], second['time'] # Delete the time keys
+        self.assertEqual(first, second)
+        # The cached message is not changed by the receiver
+        second['source'] = 'test'
+        self.assertFalse('source' in telegramparser(sentence))
+        # Only the least recently used messages are kept
+        cache = DecodeCache(maxsize=2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.put('c', 3)
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def testbinaryregistry(self):
+        # Message 8 with the application ID DAC 235, FI 10
+        sentence = '!AIVDM,1,1,,A,83u?etPrjUaJFP,0*56'
+        decoded = telegramparser(sentence)
+        self.assertEqual((decoded['dac'], decoded['fi']), (235, 10))
+        self.assertEqual(decoded['decoded'], None)
+        self.assertEqual(decoded['data'], (0x5A5A5A0, 28))
+        self.assertEqual(inttobin(decoded['data'][0], 28, 0, 28), '0101101001011010010110100000')
+        count = binary_counts[(235, 10)]
+        try:
+            registerbinarydecoder(235, 10, lambda bits, nbits: {'nbits': nbits})
+            registered = telegramparser(sentence)
+        finally:
+            registerbinarydecoder(235, 10, None)
+        self.assertEqual(binary_counts[(235, 10)], count + 1)
+        # The raw payload is only kept for unknown applications
+        self.assertEqual(registered['decoded'], {'nbits': 28})
+        self.assertEqual(registered['data'], None)
+        self.assertEqual(binaryparser(235, 10, inttobin(decoded['data'][0], 28, 0, 28)), None)
+
+    def testitermessages(self):
+        lines = ['!AIVDM,2,1,3,B,55?MbV02;H;s<HtKR20EHE:0@T4@Dn2222222216L961O5Gf0NSQEp6ClRp8,0*1D\r\n',
+                 '!AIVDM,1,1,,A,13uTAH002nJRLAHEwTi674rh04:8,0*2B\r\n',
+                 '!AIVDM,1,1,,A,13uTAH002nJRLAHEwTi674rh04:8,0*2C\r\n',
+                 'garbage\r\n',
+                 '!AIVDM,2,2,3,B,88888888880,2*24\r\n',
+                 '$PAIS,0E,0FD2B9F2,WILSON LEITH@@@@,9HII5@@,008BA06D,0*00']
+        correct = [('1', 265884000), ('5', 351759000), ('S0E', 265468402)]
+        # Read from a file object, in blocks that split the lines
+        fileobj = StringIO.StringIO(''.join(lines))
+        messages = []
+        for message in iter_messages(fileobj, lazy=True):
+            messages.append((message['message'], message['mmsi']))
+        self.assertEqual(messages, correct)
+        # Read from a list of lines
+        messages = []
+        for message in iter_messages(lines):
+            messages.append((message['message'], message['mmsi']))
+        self.assertEqual(messages, correct)
+        sentences = list(itersentences(StringIO.StringIO(''.join(lines)), blocksize=7))
+        self.assertEqual(sentences, [line.strip() for line in lines if checksum(line)])
+        # All of a too long line is dropped, also the end of it
+        fileobj = StringIO.StringIO('x' * 1000 + lines[1] + lines[1])
+        sentences = list(itersentences(fileobj, blocksize=100, maxline=200))
+        self.assertEqual(sentences, [lines[1].strip()])
+
+    def testtimestamps(self):
+        sentence = '!AIVDM,1,1,,A,13uTAH002nJRLAHEwTi674rh04:8,0*2B'
+        received = datetime.datetime.fromtimestamp(1241544035)
+        lines = ['\\s:r003669945,c:1241544035*79\\' + sentence,
+                 '\\s:r003669945,c:1241544035000*49\\' + sentence,
+                 '1241544035 ' + sentence,
+                 received.isoformat(' ') + ';' + sentence,
+                 sentence + ',b003669977,1241544035']
+        for line in lines:
+            self.assertEqual(splittimestamp(line), (sentence, received))
+        self.assertEqual(splittimestamp('2009-05-05T17:20:35.25Z ' + sentence),
+                         (sentence, datetime.datetime.fromtimestamp(1241544035.25)))
+        # A broken tag block gives no time
+        self.assertEqual(splittimestamp('\\s:r003669945,c:1241544035*78\\' + sentence),
+                         (sentence, None))
+        self.assertEqual(splittimestamp(sentence + '\r\n'), (sentence + '\r\n', None))
+        self.assertEqual(splittimestamp('garbage'), ('garbage', None))
+        # Lines with tag blocks are checked and decoded with their time
+        buffer = '\n'.join(lines) + '\n'
+        self.assertEqual([buffer[start:end] for start, end in checksumranges(buffer)], lines)
+        messages = list(iter_messages(lines))
+        self.assertEqual([message['time'] for message in messages], [received] * 5)
+        messages = list(iter_messages(StringIO.StringIO(buffer)))
+        self.assertEqual([message['time'] for message in messages], [received] * 5)
+        self.assertEqual(telegramparser(sentence, timestamp=received)['time'], received)
+
+    def testmessageclock(self):
+        clock = MessageClock()
+        self.assertEqual(clock.time(1241544035.0), datetime.datetime.fromtimestamp(1241544035))
+        # An archive from hours ago, replayed ten times faster than
+        # real time
+        started = datetime.datetime.now() - datetime.timedelta(hours=5)
+        for second in range(60):
+            clock.update(started + datetime.timedelta(seconds=10 * second), 1000.0 + second)
+        # Older messages do not move the clock back
+        clock.update(started, 1060.0)
+        now = clock.time(1060.0)
+        self.assertEqual(now, started + datetime.timedelta(seconds=591))
+        # An object last seen a minute before in the archive is not
+        # older than a few minutes, even though it is hours old
+        seen = started + datetime.timedelta(seconds=530)
+        self.assertFalse(seen < now - datetime.timedelta(minutes=3))
+        self.assertTrue(seen < now - datetime.timedelta(seconds=30))
+        # When no more messages come, the clock follows the wall clock
+        self.assertEqual(clock.time(1660.0), started + datetime.timedelta(seconds=1191))
+
+    def testsentencetype(self):
+        self.assertEqual(sentencetype('!AIVDM,1,1,,A,13uTAH002nJRLAHEwTi674rh04:8,0*2B'), '1')
+        self.assertEqual(sentencetype('\\s:r003669945,c:1241544035*79\\!AIVDM,1,1,,B,H3uTAH4T4<D4<T4h0000000000,2*1A\r\n'), '24')
+        self.assertEqual(sentencetype('$PAIS,02,0CC17C68,*7E'), 'S02')
+        # The second sentence of a message has no message type
+        self.assertEqual(sentencetype('!AIVDM,2,2,3,A,88888888880,2*25'), None)
+        self.assertEqual(sentencetype('$GPGGA,123519,4807.038,N'), None)
+        self.assertEqual(sentencetype('garbage'), None)
+
+    def testsixtoint(self):
+        payload = "53fATb02;`2oTPTWF21LTi<tr0hDU@R2222222169`;676p`0=iCA1C`888888888888880"
+        bindata = sixtobin(payload)
+        bits, nbits = sixtoint(payload)
+        self.assertEqual(nbits, len(bindata))
+        self.assertEqual(bitfield(bits, nbits, 8, 38), int(bindata[8:38], 2))
+        self.assertEqual(inttobin(bits, nbits, 88, 1048), bindata[88:1048])
+        self.assertEqual(inttoascii(bits, nbits, 112, 232), bintoascii(bindata[112:232]))
+        self.assertEqual(inttoascii(bits, nbits, 302, 1008), bintoascii(bindata[302:1008]))
+        # Symbols outside the character table end the payload
+        self.assertEqual(sixtoint('13u!TAH'), sixtoint('13u'))
+        # Fields beyond a short payload are cut like slices of a
+        # binary string
+        self.assertEqual(bitfield(bits, nbits, 420, 430), int(bindata[420:430], 2))
+        self.assertEqual(bitfield(bits, nbits, 430, 440), 0)
+
+    def testtruncatedpayload(self):
+        # A type 1 payload of 132 bits instead of 168
+        payload = '13uTAH002nJRLAHEwTi674'
+        for lazy in (False, True):
+            message = payloadparser(payload, lazy)
+            self.assertEqual(message['mmsi'], 265884000)
+            self.assertEqual(message['cog'], decimal.Decimal('156.4'))
+            self.assertEqual(message['latitude'], decimal.Decimal('38.436167'))
+            # Only the first 4 bits of the heading are there
+            self.assertEqual(message['heading'], 4)
+            # A position with bits missing is N/A, not a made-up value
+            message = payloadparser(payload[:18], lazy)
+            self.assertEqual(message['longitude'], decimal.Decimal('-76.362167'))
+            self.assertEqual(message['latitude'], None)
+        try:
+            setnumericbackend('float')
+            message = payloadparser(payload[:18])
+        finally:
+            setnumericbackend('decimal')
+        self.assertEqual(message['longitude'], -76.362167)
+        self.assertEqual(message['latitude'], None)
+
+    def testintposition(self):
+        for binary in ('0' + tobin(91*600000, 26), '1' + tobin(12345678, 26),
+                       tobin(6000000, 27), tobin(1000000, 24)):
+            self.assertEqual(intlatitude(int(binary, 2), len(binary)), calclatitude(binary))
+        for binary in ('0' + tobin(181*600000, 27), '1' + tobin(45812345, 27),
+                       tobin(7099343, 28), tobin(123456, 25)):
+            self.assertEqual(intlongitude(int(binary, 2), len(binary)), calclongitude(binary))
+
+    def testschemadecoders(self):
+        # Every entry in the schemas has a generated decoder
+        self.assertEqual(set(aivdm_decoders), set(aivdm_schema))
+        self.assertEqual(set(binary_decoders), set(binary_schema))
+        correct = {'posacc': 1,
+                   'navstatus': 0,
+                   'mmsi': 265547250,
+                   'longitude': decimal.Decimal("11.85"),
+                   'latitude': decimal.Decimal("57.7"),
+                   'sog': 12,
+                   'cog': 245,
+                   'message': '27'}
+        decoded = telegramparser('!AIVDM,1,1,,B,K3u?et`0KiT>N6?D,0*1D')
+        del decoded['time'] # Delete the time key
+        self.assertEqual(decoded, correct)
+        correct = {'aid_type': 14,
+                   'name': 'LANGE JAN',
+                   'posacc': 1,
+                   'mmsi': 992651100,
+                   'longitude': decimal.Decimal("-5.25"),
+                   'latitude': decimal.Decimal("56.1"),
+                   'length': 10,
+                   'width': 6,
+                   'message': '21'}
+        decoded = telegramparser('!AIVDM,1,1,,B,E>jbWG760W3Rh50W00000000000Okvu@@3><050`HHv000,4*4A')
+        del decoded['time'] # Delete the time key
+        self.assertEqual(decoded, correct)
+        # Fields beyond the end of a short payload of the new message
+        # types are N/A
+        for lazy in (False, True):
+            decoded = payloadparser('K3u?et`0KiT>', lazy)
+            self.assertEqual(decoded['longitude'], decimal.Decimal('11.85'))
+            self.assertEqual(decoded['latitude'], None)
+            self.assertEqual(decoded['sog'], None)
+            self.assertEqual(decoded['cog'], None)
+            decoded = payloadparser('E>jbWG760W3Rh50W00000000000Okvu@@3', lazy)
+            self.assertEqual(decoded['name'], 'LANGE JAN')
+            self.assertEqual(decoded['longitude'], decimal.Decimal('-5.25'))
+            self.assertEqual(decoded['latitude'], None)
+            self.assertEqual(decoded['length'], None)
+            self.assertEqual(decoded['width'], None)
+        # Fields beyond the end of a short binary payload are N/A
+        decoded = binaryparser(1, 11, tobin(0, 24) + tobin(0, 25) + tobin(0, 16) + tobin(10, 7))
+        self.assertEqual(decoded['average_wind_speed'], 10)
+        self.assertEqual(decoded['wind_gust'], None)
+
+    def testfloatbackend(self):
+        # The float backend gives the same values at six decimals
+        sentences = ['!AIVDM,1,1,,A,13uTAH002nJRLAHEwTi674rh04:8,0*2B',
+                     '!AIVDM,1,1,,B,K3u?et`0KiT>N6?D,0*1D',
+                     '!AIVDM,1,1,,B,E>jbWG760W3Rh50W00000000000Okvu@@3><050`HHv000,4*4A',
+                     '$PAIS,02,0FD2B9F2,8A,1,20FE4A0,06C4E90,08B,0FC,028,00,1,0,0*6F',
+                     '$PAIS,0F,0FD2B9F2,46,37,061C781C,EMDEN@@@,0,11170800,0*58',
+                     '$GPRMC,123519,A,4807.0382,N,01131.0009,W,022.4,084.4,230394,003.1,W*73']
+        decimals = [telegramparser(sentence) for sentence in sentences]
+        try:
+            setnumericbackend('float')
+            floats = [telegramparser(sentence) for sentence in sentences]
+            lazy = telegramparser(sentences[0], lazy=True)
+        finally:
+            setnumericbackend('decimal')
+        for correct, decoded in zip(decimals, floats):
+            self.assertEqual(sorted(correct), sorted(decoded))
+            for key, value in correct.items():
+                if isinstance(value, decimal.Decimal):
+                    self.assertTrue(isinstance(decoded[key], float))
+                    self.assertEqual('%.6f' % value, '%.6f' % decoded[key])
+        self.assertEqual(lazy['latitude'], floats[0]['latitude'])
+
+    def testlazymessage(self):
+        sentences = ['!AIVDM,1,1,,A,13uTAH002nJRLAHEwTi674rh04:8,0*2B',
+                     '!AIVDM,1,1,,A,53fATb02;`2oTPTWF21LTi<tr0hDU@R2222222169`;676p`0=iCA1C`888888888888880,2*51',
+                     '!AIVDM,1,1,,A,H42O55lti4hhhilD3nink0000000,0*4A',
+                     '!AIVDM,1,1,,A,802R5Ph0BkBTT0EjR36nS2D>ROoJ7wwE=hH0bl0jlGwwwhpIT11;B@V5GP0,2*30']
+        for sentence in sentences:
+            decoded = telegramparser(sentence)
+            lazy = telegramparser(sentence, lazy=True)
+            self.assertTrue(isinstance(lazy, LazyMessage))
+            lazy['time'] = decoded['time']
+            if 'decoded' in decoded:
+                del decoded['decoded']['station_time']
+                del lazy['decoded']['station_time']
+            self.assertEqual(lazy.copy(), decoded)
+        lazy = telegramparser(sentences[0], lazy=True)
+        # Fields are only decoded when they are used
+        self.assertFalse(hasattr(lazy, 'sog'))
+        self.assertEqual(lazy['sog'], decimal.Decimal("18.2"))
+        self.assertTrue(hasattr(lazy, 'sog'))
+        self.assertTrue('latitude' in lazy)
+        self.assertFalse('name' in lazy)
+        self.assertEqual(lazy.get('name', 'N/A'), 'N/A')
+        self.assertFalse('source' in lazy)
+        lazy['source'] = 'File'
+        self.assertEqual(lazy['source'], 'File')
+        self.assertEqual(dict(lazy.iteritems())['source'], 'File')
+        self.assertRaises(KeyError, lambda: lazy['name'])
+
+    def testmessagefilter(self):
+        position = '!AIVDM,1,1,,A,13uTAH002nJRLAHEwTi674rh04:8,0*2B'
+        static = '!AIVDM,1,1,,A,53fATb02;`2oTPTWF21LTi<tr0hDU@R2222222169`;676p`0=iCA1C`888888888888880,2*51'
+        base = '!AIVDM,1,1,,A,402R5PiuUF=>?wiFP1dm<H100000,0*51'
+        pais = '$PAIS,0D,06A1DBFF,213EBE0,FC73CC0,02A,60C,12F,0*0F'
+        own = '$GPRMC,123519,A,4807.038,N,01131.000,E,022.4,084.4,230394,003.1,W*6A'
+        self.assertTrue(MessageFilter().accept(position))
+        message_filter = MessageFilter(message_types=['1', '2', '3', '5', 'S02'])
+        self.assertEqual([message_filter.accept(s) for s in (position, static, base, pais, own)],
+                         [True, True, False, False, True])
+        message_filter = MessageFilter(drop_base_stations=True)
+        self.assertEqual([message_filter.accept(s) for s in (position, static, base)],
+                         [True, True, False])
+        # MMSI 265884000 and 249849000
+        message_filter = MessageFilter(mmsi_allow=mmsiranges('265000000-265999999, 249849000'))
+        self.assertEqual([message_filter.accept(s) for s in (position, static, pais)],
+                         [True, True, False])
+        message_filter = MessageFilter(mmsi_deny=mmsiranges('249849000'))
+        self.assertEqual([message_filter.accept(s) for s in (position, static, pais)],
+                         [True, False, True])
+
+    def testsubscription(self):
+        positions = {}
+        self.assertEqual(parsesubscription('SUBSCRIBE', positions), None)
+        self.assertRaises(ValueError, parsesubscription, 'HELLO', positions)
+        self.assertRaises(ValueError, parsesubscription, 'SUBSCRIBE area=1', positions)
+        self.assertRaises(ValueError, parsesubscription, 'SUBSCRIBE bbox=1,2,3', positions)
+        position = summarize({'message': '1', 'mmsi': 265884000,
+                              'latitude': decimal.Decimal('57.6'),
+                              'longitude': decimal.Decimal('11.8')})
+        self.assertEqual(position, (1, 265884000, 57.6, 11.8))
+        static = summarize({'message': '5', 'mmsi': 265884000})
+        other = summarize({'message': 'S02', 'mmsi': 249849000,
+                           'latitude': 40.0, 'longitude': 11.8})
+        subscription = parsesubscription('subscribe types=1,5,s02 bbox=57.5,11.5,58.0,12.0', positions)
+        self.assertEqual([subscription.accept(s, 100.0) for s in (position, static, other)],
+                         [True, False, False])
+        # Messages without a position use the last known one
+        positions[265884000] = (57.6, 11.8)
+        self.assertTrue(subscription.accept(static, 100.0))
+        self.assertTrue(parsesubscription('SUBSCRIBE types=S02', positions).accept(other, 100.0))
+        # Areas across 180 degrees
+        subscription = parsesubscription('SUBSCRIBE bbox=-60,170,-50,-170', positions)
+        self.assertTrue(subscription.accept((1, 1, -55.0, 179.0), 100.0))
+        self.assertTrue(subscription.accept((1, 1, -55.0, -175.0), 100.0))
+        self.assertFalse(subscription.accept((1, 1, -55.0, 0.0), 100.0))
+        # Positions of an MMSI are only sent every interval seconds
+        subscription = parsesubscription('SUBSCRIBE mmsi=265000000-265999999 interval=10', positions)
+        self.assertEqual([subscription.accept(position, now) for now in (100.0, 105.0, 110.0)],
+                         [True, False, True])
+        self.assertTrue(subscription.accept(static, 111.0))
+        self.assertFalse(subscription.accept(other, 111.0))
+
+    def testpositionbatchparser(self):
+        sentences = ['!AIVDM,1,1,,A,13uTAH002nJRLAHEwTi674rh04:8,0*2B',
+                     '!AIVDM,1,1,,A,13u?etPRR;Pn:dDPwUM1Ti@R0000,0*11',
+                     '!AIVDM,1,1,,B,33KMWfgP?w<tSF0l4Q@>4?wp0000,0*7B',
+                     '!AIVDM,1,1,,A,B52K>;h00Fc>jpUlNV@icwpUl000,0*21',
+                     '!AIVDM,1,1,,A,C5N3SRP0EnJGEBT>NhTDwwo062PaLELTBJ:V00000000S0D:R220,0*51']
+        payloads = [s.split(',')[5] for s in sentences]
+        # Other message types and broken payloads are left out
+        decoded = positionbatchparser(payloads[:2] + ['402R5PiuUF=>?wiFP1dm<H100000', '13uTAH00', '13u!TAH002nJRLAHEwTi674rh04:8'] + payloads[2:])
+        self.assertEqual(len(decoded), len(sentences))
+        for row, sentence in zip(decoded, sentences):
+            correct = telegramparser(sentence)
+            self.assertEqual(row['mmsi'], correct['mmsi'])
+            self.assertEqual(str(row['msgtype']), correct['message'])
+            self.assertEqual(row['posacc'], correct['posacc'])
+            for key, field in (('lat', 'latitude'), ('lon', 'longitude'), ('sog', 'sog'),
+                               ('cog', 'cog'), ('rot', 'rot')):
+                if correct.get(field) is None:
+                    self.assertTrue(numpy.isnan(row[key]))
+                else:
+                    self.assertAlmostEqual(row[key], float(correct[field]), 6)
+            for key in ('heading', 'navstatus'):
+                if correct.get(key) is None:
+                    self.assertEqual(row[key], -1)
+                else:
+                    self.assertEqual(row[key], correct[key])
+
 
 if __name__ == '__main__':
     unittest.main()
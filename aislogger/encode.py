@@ -0,0 +1,266 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# encode.py (part of "AIS Logger")
+# AIVDM sentence encoder
+#
+# The inverse of decode: makes AIVDM sentences from messages in the
+# same form as decode.telegramparser returns them, with the bit layout
+# in decode.aivdm_schema. Used by simulator.py to make test traffic
+#
+# Copyright (c) 2006-2009 Erik I.J. Olsson <olcai@users.sourceforge.net>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import math
+import unittest
+
+import decode
+
+# The number of bits in each message the encoder supports, keyed like
+# decode.aivdm_schema. Bits that are not in the schema are set to 0
+message_bits = {1: 168, 2: 168, 3: 168, (5, 0): 424, 18: 168,
+                (24, 0): 160, (24, 1): 168}
+
+# The largest number of payload symbols in one sentence, longer
+# messages are split in several sentences
+max_payload = 60
+
+# The 6-bit symbol for each value 0-63 (the inverse of the table in
+# decode.sixtobin)
+six_symbols = ''.join([chr(value + 48) for value in range(40)] +
+                      [chr(value + 56) for value in range(40, 64)])
+
+# The units of latitude and longitude fields in each width, as in
+# decode.intlatitude and decode.intlongitude
+position_factors = {17: 600, 18: 600, 24: 60000, 25: 60000,
+                    27: 600000, 28: 600000}
+
+# The fields of each message and how far their bits are shifted, made
+# by messagelayout when first used
+layouts = {}
+
+def bintosix(binstring):
+    # Converts binstring, a string of '0' and '1', to coded 6-bit
+    # symbols, the inverse of decode.sixtobin. The last symbol is
+    # padded with 0 bits
+    binstring = binstring + '0' * (-len(binstring) % 6)
+    return ''.join([six_symbols[int(binstring[i:i+6], 2)]
+                    for i in range(0, len(binstring), 6)])
+
+def asciitobin(text, nbits):
+    # Converts text to a binary string of nbits bits, the inverse of
+    # decode.bintoascii. Text is padded with @ (0)
+    return decode.tobin(asciitoint(text, nbits // 6), nbits)
+
+def asciitoint(text, count):
+    # Converts the first count characters of text to an integer of
+    # count 6-bit characters, padded with @. Lower case letters are
+    # converted to upper case, and characters without a 6-bit code to
+    # spaces
+    value = 0
+    for char in text.upper()[:count].ljust(count, '@'):
+        symbol = ord(char)
+        if 64 <= symbol < 96:
+            symbol = symbol - 64
+        elif not 32 <= symbol < 64:
+            symbol = 32
+        value = value << 6 | symbol
+    return value
+
+def inttosix(bits, nbits):
+    # Converts the integer bits holding nbits bits to coded 6-bit
+    # symbols. Returns the symbols and the number of fill bits added
+    # to the last symbol
+    fillbits = -nbits % 6
+    bits = bits << fillbits
+    count = (nbits + fillbits) // 6
+    symbols = [six_symbols[(bits >> shift) & 63]
+               for shift in range(count * 6 - 6, -1, -6)]
+    return ''.join(symbols), fillbits
+
+def navalue(field):
+    # Returns the raw value of field that is decoded as None, from the
+    # N/A test in the schema
+    name, offset, width, kind, scale, na = field
+    if kind == 'latitude':
+        return 91 * position_factors[width]
+    elif kind == 'longitude':
+        return 181 * position_factors[width]
+    elif kind == 'rot':
+        # As decode.introt takes it
+        return 127
+    elif na and na.startswith('=='):
+        return int(na[2:])
+    # For fields N/A above a value, the largest value
+    return (1 << width) - 1
+
+def fieldvalue(field, value):
+    # Returns the raw unsigned value of field for value, the inverse of
+    # decode.fieldsource. None is encoded as N/A
+    name, offset, width, kind, scale, na = field
+    if value is None:
+        if not na and kind not in ('latitude', 'longitude', 'rot'):
+            return 0
+        return navalue(field)
+    if kind == 'uint':
+        if scale:
+            raw = int(round(value * scale))
+        else:
+            raw = int(value)
+        # Keep values that are too large valid, below the N/A value
+        if na and na.startswith('>'):
+            raw = min(raw, int(na[1:]))
+        return max(raw, 0) & ((1 << width) - 1)
+    elif kind in ('text', 'content'):
+        return asciitoint(value, width // 6)
+    elif kind in ('latitude', 'longitude'):
+        raw = int(round(value * position_factors[width]))
+        return raw & ((1 << width) - 1)
+    elif kind == 'rot':
+        # Convert between ROTind and ROTais, as in decode.introt
+        rateofturn = min(int(round(4.733 * math.sqrt(abs(value)))), 126)
+        if value < 0 and rateofturn > 1:
+            return 256 - rateofturn
+        return rateofturn
+    elif kind == 'dimension':
+        # Split in the two parts of the antenna position, with the
+        # antenna in the middle
+        half = width // 2
+        largest = (1 << half) - 1
+        first = min(int(value) // 2, largest)
+        second = min(int(value) - first, largest)
+        return first << half | second
+    elif kind == 'eta':
+        # MMDDHHMM
+        return (int(value[0:2]) << 16 | int(value[2:4]) << 11 |
+                int(value[4:6]) << 6 | int(value[6:8]))
+    raise ValueError("Cannot encode %s fields" % kind)
+
+def messagelayout(key, nbits):
+    # Returns the fields of the message keyed key in aivdm_schema with
+    # nbits bits, as a list of (field, shift)
+    layout = layouts.get(key)
+    if layout is None:
+        layout = [(field, nbits - field[1] - field[2])
+                  for field in decode.aivdm_header + decode.aivdm_schema[key]]
+        layouts[key] = layout
+    return layout
+
+def encodepayload(message, messagetype=None, part=None):
+    # Encodes message, a dict with the fields of a message of
+    # messagetype (or message['message'] if None), to an AIVDM
+    # payload. Returns the payload and the number of fill bits.
+    # Message 24 is encoded as part A if part is None and message has
+    # a name, otherwise as part B. Missing fields are encoded as N/A
+    if messagetype is None:
+        messagetype = message['message']
+    number = int(messagetype)
+    key = number
+    if number in decode.partitioned_types:
+        if part is None:
+            part = int(number == 24 and 'name' not in message)
+        key = (number, part)
+    try:
+        nbits = message_bits[key]
+    except KeyError:
+        raise ValueError("Cannot encode message %s" % messagetype)
+    bits = number << (nbits - 6)
+    if isinstance(key, tuple):
+        bits |= key[1] << (nbits - 40)
+    for field, shift in messagelayout(key, nbits):
+        bits |= fieldvalue(field, message.get(field[0])) << shift
+    return inttosix(bits, nbits)
+
+def makesentence(total, number, seqid, channel, payload, fillbits):
+    # Returns an AIVDM sentence, without line break, with its checksum
+    sentence = '!AIVDM,%d,%d,%s,%s,%s,%d*' % (total, number, seqid,
+                                            channel, payload, fillbits)
+    return sentence + '%02X' % decode.makechecksum(sentence)
+
+def encodesentences(message, channel='A', seqid=0, messagetype=None,
+                    part=None):
+    # Encodes message like encodepayload, and returns a list of the
+    # AIVDM sentences for it. Messages that do not fit in one sentence
+    # are split, with the sequential message id seqid
+    payload, fillbits = encodepayload(message, messagetype, part)
+    if len(payload) <= max_payload:
+        return [makesentence(1, 1, '', channel, payload, fillbits)]
+    parts = [payload[i:i+max_payload]
+             for i in range(0, len(payload), max_payload)]
+    sentences = []
+    for number, symbols in enumerate(parts):
+        if number == len(parts) - 1:
+            bits = fillbits
+        else:
+            bits = 0
+        sentences.append(makesentence(len(parts), number + 1, seqid,
+                                      channel, symbols, bits))
+    return sentences
+
+
+class TestEncode(unittest.TestCase):
+    def testprimitives(self):
+        payload = '13u?etPRR;Pn:dDPwUM1Ti@R0000'
+        self.assertEqual(bintosix(decode.sixtobin(payload)), payload)
+        bits, nbits = decode.sixtoint(payload)
+        self.assertEqual(inttosix(bits, nbits), (payload, 0))
+        self.assertEqual(inttosix(1, 8), ('0@', 4))
+        self.assertEqual(decode.bintoascii(asciitobin('WILSON leith', 120)),
+                         'WILSON LEITH@@@@@@@@')
+
+    def testroundtrip(self):
+        decode.setnumericbackend('float')
+        try:
+            messages = [
+                {'message': '1', 'mmsi': 265884000, 'navstatus': 0,
+                 'rot': -5, 'sog': 18.2, 'posacc': 1,
+                 'longitude': 11.808833, 'latitude': -57.672833,
+                 'cog': 156.4, 'heading': 157},
+                {'message': '3', 'mmsi': 265884001, 'navstatus': None,
+                 'rot': None, 'sog': None, 'posacc': 0,
+                 'longitude': None, 'latitude': None,
+                 'cog': None, 'heading': None},
+                {'message': '5', 'mmsi': 249849000, 'imo': 9386326,
+                 'callsign': '9HII5', 'name': 'WILSON LEITH', 'type': 70,
+                 'length': 100, 'width': 14, 'eta': '11170800',
+                 'draught': 5.5, 'destination': 'EMDEN'},
+                {'message': '18', 'mmsi': 219000001, 'sog': 6.1,
+                 'posacc': 0, 'longitude': -4.5, 'latitude': 50.25,
+                 'cog': 270.0, 'heading': None},
+                {'message': '24', 'mmsi': 219000001, 'name': 'SEA BREEZE'},
+                {'message': '24', 'mmsi': 219000001, 'type': 37,
+                 'vendor': 'SIMRAD', 'callsign': 'OU1234', 'length': 12,
+                 'width': 4}]
+            for message in messages:
+                sentences = encodesentences(message, seqid=3)
+                for sentence in sentences:
+                    self.assertTrue(decode.checksum(sentence))
+                decoded = decode.telegramparser(decode.jointelegrams('\n'.join(sentences)))
+                for key, value in message.items():
+                    self.assertEqual(decoded[key], value, key)
+            # Message 5 does not fit in one sentence
+            self.assertEqual(len(encodesentences(messages[2])), 2)
+        finally:
+            decode.setnumericbackend('decimal')
+        self.assertRaises(ValueError, encodepayload, {'message': '4'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -30,7 +30,7 @@ version = 'VERSION_TAG'
 import sys, os, glob, optparse, logging
 import time, datetime
 import threading, Queue, collections
-import socket, SocketServer
+import socket, errno
 import pickle, codecs, csv, string
 import hashlib
 import decimal
@@ -52,6 +52,9 @@ from external.configobj import ConfigObj
 
 # Import own modules
 import decode
+import simulator
+import metrics
+import netio
 from util import *
 
 
@@ -66,6 +69,194 @@ def package_home(gdict):
         return filename
     return os.path.dirname(filename)
 
+def getbatch(queue, size, seconds):
+    # Waits for the next item in queue, and returns a list of it and
+    # the items after it that are already in the queue, at most size
+    # items, taken during at most seconds seconds
+    batch = [queue.get()]
+    end = time.time() + seconds
+    while len(batch) < size:
+        try:
+            batch.append(queue.get_nowait())
+        except Queue.Empty:
+            break
+        # Only look at the clock now and then
+        if not len(batch) & 63 and time.time() > end:
+            break
+    return batch
+
+def itemtype(item):
+    # Returns the message type of an item in one of the queues between
+    # the threads, or None if it has none. Items are raw lines,
+    # (line, summary) tuples, [source, line, time] lists or decoded
+    # messages
+    if isinstance(item, basestring):
+        return decode.sentencetype(item)
+    elif isinstance(item, tuple):
+        return decode.sentencetype(item[0])
+    elif isinstance(item, list):
+        return decode.sentencetype(item[1])
+    elif hasattr(item, 'get'):
+        return item.get('message')
+    return None
+
+class OverloadQueue(Queue.Queue):
+    # A bounded queue that counts the items put in it and the items
+    # dropped when it is full. Which item is dropped depends on the
+    # overload policy:
+    #   drop_oldest -- the oldest item in the queue
+    #   drop_newest -- the new item
+    #   block       -- the new item, after waiting at most timeout
+    #                  seconds for room in the queue
+    #   shed        -- the oldest item with a message type in
+    #                  shed_types, the new item if it has one of those
+    #                  types, or else the oldest item
+    policies = ('drop_oldest', 'drop_newest', 'block', 'shed')
+
+    def __init__(self, maxsize):
+        Queue.Queue.__init__(self, maxsize)
+        # The queued entries the shed policy may drop, oldest first,
+        # and the number of entries dropped by it that are still in
+        # the queue (they are skipped when taken out)
+        self.sheddable = collections.deque()
+        self.shed = 0
+        self.policy = 'drop_oldest'
+        self.timeout = 1.0
+        self.shed_types = frozenset()
+        # The number of items put in the queue, dropped, and the
+        # largest number of items there has been in the queue
+        self.enqueued = 0
+        self.dropped = 0
+        self.highwater = 0
+        # The time items have waited in the queue
+        self.wait = metrics.Histogram()
+
+    def setpolicy(self, policy, timeout=1.0, shed_types=()):
+        # Should be set before anything is put in the queue
+        if policy not in self.policies:
+            raise ValueError("Unknown overload policy %s" % policy)
+        self.policy = policy
+        self.timeout = timeout
+        self.shed_types = frozenset(shed_types)
+
+    def offer(self, item):
+        # Puts item in the queue without waiting (except with the
+        # block policy), and drops an item if the queue is full
+        self.not_full.acquire()
+        try:
+            if self.policy == 'block' and self._qsize() >= self.maxsize:
+                end = time.time() + self.timeout
+                while self._qsize() >= self.maxsize:
+                    remaining = end - time.time()
+                    if remaining <= 0:
+                        break
+                    self.not_full.wait(remaining)
+            sheddable = (self.policy == 'shed' and
+                         itemtype(item) in self.shed_types)
+            if self._qsize() >= self.maxsize:
+                self.dropped += 1
+                if not self.makeroom(sheddable):
+                    return
+            self.add(item, sheddable)
+        finally:
+            self.not_full.release()
+
+    def force(self, item):
+        # Puts item in the queue even if it is full, without the
+        # policy and without counting it, for control items that must
+        # not be dropped (like 'stop')
+        self.not_full.acquire()
+        try:
+            self.add(item, None)
+        finally:
+            self.not_full.release()
+
+    def add(self, item, sheddable):
+        # Called with the lock held. Sheddable is None for control
+        # items, which are not counted
+        self._put(item, sheddable)
+        self.unfinished_tasks += 1
+        if sheddable is not None:
+            self.enqueued += 1
+            if self._qsize() > self.highwater:
+                self.highwater = self._qsize()
+        self.not_empty.notify()
+
+    def makeroom(self, sheddable):
+        # Drops an item in the full queue for a new item, according to
+        # the policy. Returns False if the new item should be dropped
+        if self.policy == 'shed' and self.shed_types:
+            if sheddable:
+                return False
+            if self.sheddable:
+                # Mark the entry as dropped, it is skipped when it
+                # reaches the front of the queue
+                entry = self.sheddable.popleft()
+                entry[0] = None
+                self.shed += 1
+                self.unfinished_tasks -= 1
+                if self.shed > self.maxsize:
+                    self.queue = collections.deque(
+                        [e for e in self.queue if e[0] is not None])
+                    self.shed = 0
+                return True
+        elif self.policy != 'drop_oldest':
+            return False
+        # Control items are kept at the front of the queue
+        controls = []
+        entry = self.popentry()
+        while entry[2] is None:
+            controls.append(entry)
+            if not self._qsize():
+                entry = None
+                break
+            entry = self.popentry()
+        self.queue.extendleft(reversed(controls))
+        if entry is None:
+            return False
+        self.unfinished_tasks -= 1
+        return True
+
+    def _qsize(self, len=len):
+        return len(self.queue) - self.shed
+
+    def _put(self, item, sheddable=False):
+        # Items are kept with the time they were put in the queue, as
+        # [time, item, sheddable]. The time is None if it was dropped,
+        # and sheddable is None for control items
+        entry = [time.time(), item, sheddable]
+        self.queue.append(entry)
+        if sheddable:
+            self.sheddable.append(entry)
+
+    def popentry(self):
+        # Takes the oldest entry not dropped out of the queue
+        entry = self.queue.popleft()
+        while entry[0] is None:
+            self.shed -= 1
+            entry = self.queue.popleft()
+        if entry[2]:
+            self.sheddable.popleft()
+        return entry
+
+    def _get(self):
+        queued, item, sheddable = self.popentry()
+        if sheddable is not None:
+            self.wait.add(time.time() - queued)
+        return item
+
+    def stats(self):
+        # Returns the counters, the current state of the queue and a
+        # summary of the wait times
+        self.mutex.acquire()
+        try:
+            return {'policy': self.policy, 'size': self._qsize(),
+                    'maxsize': self.maxsize, 'enqueued': self.enqueued,
+                    'dropped': self.dropped, 'highwater': self.highwater,
+                    'wait': self.wait.summary()}
+        finally:
+            self.mutex.release()
+
 
 
 ### Fetch command line arguments
@@ -77,6 +268,10 @@ cmdlineparser = optparse.OptionParser()
 # Add an option for supplying a different config file than the default one
 cmdlineparser.add_option("-c", "--config", dest="configfile", help="Specify a config file other than the default")
 cmdlineparser.add_option("-n", "--nogui", action="store_true", dest="nogui", default=False, help="Run without GUI, i.e. as a server and logger")
+# Options for load testing with simulated traffic
+cmdlineparser.add_option("-s", "--simulate", type="int", dest="simulate", default=0, help="Add simulated traffic from this many vessels, for load testing")
+cmdlineparser.add_option("--stats", type="int", dest="stats", default=0, help="Without GUI, print the pipeline statistics every this many seconds (0 for only at exit)")
+cmdlineparser.add_option("--simulate-speed", type="float", dest="simulate_speed", default=1.0, help="Run the simulated traffic this many times faster than real time (0 for as fast as possible)")
 # Parse the arguments
 (cmdlineoptions, cmdlineargs) = cmdlineparser.parse_args()
 if cmdlineoptions.configfile:
@@ -161,7 +356,8 @@ defaultconfig = {'common': {'listmakegreytime': 600,
                               'rtscts': False,
                               'xonxoff': False,
                               'send_to_serial_server': False,
-                              'send_to_network_server': False},
+                              'send_to_network_server': False,
+                              'send_to_udp': False},
                  'serial_server': {'server_on': False,
                                    'port': '',
                                    'baudrate': '38400',
@@ -170,10 +366,38 @@ defaultconfig = {'common': {'listmakegreytime': 600,
                  'network': {'server_on': False,
                              'server_address': 'localhost',
                              'server_port': '23000',
+                             'server_max_lag': 1048576,
                              'clients_on': "",
                              'client_addresses': "",
                              'clients_to_serial': "",
-                             'clients_to_server': ""},
+                             'clients_to_server': "",
+                             'client_backoff': 1.0,
+                             'client_max_backoff': 300.0,
+                             'client_connect_timeout': 30.0,
+                             'client_stall_rate': 10.0,
+                             'client_stall_time': 60.0,
+                             'udp_inputs': "",
+                             'udp_outputs': "",
+                             'clients_to_udp': "",
+                             'udp_interface': '0.0.0.0',
+                             'udp_receive_buffer': 4194304,
+                             'udp_ttl': 1,
+                             'udp_datagram_size': 1472},
+                 'decoding': {'lazy_decoding': False,
+                              'numeric_backend': 'decimal',
+                              'duplicate_window': 0},
+                 'queues': {'comm_hub': 'drop_oldest',
+                            'main': 'drop_oldest',
+                            'main_outgoing': 'drop_oldest',
+                            'network_server': 'drop_oldest',
+                            'serial_server': 'drop_oldest',
+                            'udp_output': 'drop_oldest',
+                            'block_timeout': 1.0,
+                            'shed_message_types': '4, 8, 20, 24'},
+                 'filter': {'message_types': '',
+                            'mmsi_allow': '',
+                            'mmsi_deny': '',
+                            'drop_base_stations': False},
                  'map': {'object_color': 'Yellow',
                          'old_object_color': 'Grey',
                          'selected_object_color': 'Pink',
@@ -198,6 +422,9 @@ config.comments['position'] = ['', 'Set manual position (overrides decoded own p
 config.comments['serial_a'] = ['', 'Settings for input from serial device A']
 config.comments['serial_server'] = ['', 'Settings for sending data through a serial port']
 config.comments['network'] = ['', 'Settings for sending/receiving data through a network connection']
+config.comments['decoding'] = ['', 'Settings for the message decoder']
+config.comments['queues'] = ['', 'What to drop when the queues between the threads are full']
+config.comments['filter'] = ['', 'Filter for incoming messages, applied before decoding', 'Add a subsection like [[serial_a]] or [[host:port]] to use other settings for a source']
 config.comments['map'] = ['', 'Map settings']
 config['common'].comments['listmakegreytime'] = ['Number of s between last update and greying out an item']
 config['common'].comments['deleteitemtime'] = ['Number of s between last update and removing an item from memory']
@@ -229,10 +456,38 @@ config['position'].comments['use_position_from'] = ['Define the source to get GP
 config['network'].comments['server_on'] = ['Enable network server']
 config['network'].comments['server_address'] = ['Server hostname or IP (server side)']
 config['network'].comments['server_port'] = ['Server port (server side)']
+config['network'].comments['server_max_lag'] = ['Number of bytes a network client may be behind before it is disconnected']
 config['network'].comments['clients_on'] = ['List of server:port to enable reading from']
 config['network'].comments['client_addresses'] = ['List of server:port to connect and use data from']
 config['network'].comments['clients_to_serial'] = ['List of server:port to send data to serial out']
 config['network'].comments['clients_to_server'] = ['List of server:port to send data to network server']
+config['network'].comments['client_backoff'] = ['Number of s to wait before connecting again to a network server after a failure, doubled for each failure in a row']
+config['network'].comments['client_max_backoff'] = ['Largest number of s to wait before connecting again to a network server']
+config['network'].comments['client_connect_timeout'] = ['Number of s before connecting to a network server times out']
+config['network'].comments['client_stall_rate'] = ['Number of bytes/s below which the data from a network server has stalled']
+config['network'].comments['client_stall_time'] = ['Number of s a network server may stall before connecting to it again']
+config['network'].comments['udp_inputs'] = ['List of address:port to receive UDP data on, a multicast group address joins the group']
+config['network'].comments['udp_outputs'] = ['List of address:port to send data to in UDP datagrams, unicast or multicast']
+config['network'].comments['clients_to_udp'] = ['List of server:port and udp:address:port to send data to the UDP outputs']
+config['network'].comments['udp_interface'] = ['IP address of the interface to join multicast groups and send multicast on (0.0.0.0 means any)']
+config['network'].comments['udp_receive_buffer'] = ['Size in bytes of the receive buffer of each UDP input']
+config['network'].comments['udp_ttl'] = ['Time to live of sent multicast datagrams (1 keeps them on the local network)']
+config['network'].comments['udp_datagram_size'] = ['Largest number of bytes of lines packed in each sent UDP datagram']
+config['decoding'].comments['lazy_decoding'] = ['Enable decoding of message fields only when they are used']
+config['decoding'].comments['numeric_backend'] = ['Number type for decoded positions, speeds and courses: decimal or float']
+config['decoding'].comments['duplicate_window'] = ['Seconds during which the same AIVDM message from another input is dropped (0 means off)']
+config['queues'].comments['comm_hub'] = ['Overload policy of the queue of incoming data: drop_oldest, drop_newest, block or shed']
+config['queues'].comments['main'] = ['Overload policy of the queue of decoded messages']
+config['queues'].comments['main_outgoing'] = ['Overload policy of the queue of updates to the GUI']
+config['queues'].comments['network_server'] = ['Overload policy of the queue of data to the network server']
+config['queues'].comments['serial_server'] = ['Overload policy of the queue of data to the serial server']
+config['queues'].comments['udp_output'] = ['Overload policy of the queue of data to the UDP outputs']
+config['queues'].comments['block_timeout'] = ['Number of s the block policy waits for room in a queue before dropping the new data']
+config['queues'].comments['shed_message_types'] = ['List of message types the shed policy drops first']
+config['filter'].comments['message_types'] = ['List of message types to decode, like 1, 2, 3, 5, S02 (empty means all)']
+config['filter'].comments['mmsi_allow'] = ['List of MMSI numbers or ranges (first-last) to decode (empty means all)']
+config['filter'].comments['mmsi_deny'] = ['List of MMSI numbers or ranges (first-last) not to decode']
+config['filter'].comments['drop_base_stations'] = ['Enable dropping of base station messages before decoding']
 config['map'].comments['object_color'] = ['Color of map objects']
 config['map'].comments['old_object_color'] = ['Color of old (grey-outed) map objects']
 config['map'].comments['selected_object_color'] = ['Color of a selected map object']
@@ -409,6 +664,7 @@ class MainWindow(wx.Frame):
 
     def GetMessages(self, event):
         # Get messages from main thread
+        started = time.time()
         messages = main_thread.ReturnOutgoing()
         # See what to do with them
         for message in messages:
@@ -491,6 +747,8 @@ class MainWindow(wx.Frame):
         # Update the map if shown
         if self.map.IsShown():
             self.map.Canvas.Draw()
+        if messages:
+            main_thread.outgoing_stage.add(started, time.time(), len(messages))
         # See if we should fetch statistics data from CommHubThread
         # Also add data in grey_dict and nbr of items
         if self.stats_dlg:
@@ -624,17 +882,21 @@ class MainWindow(wx.Frame):
         # Step through each row in the file
         name = 'File'
         lastupdate_line = 0
+        # Lines without a time of their own get the time they were
+        # read, taken once for each 100 rows
+        received = datetime.datetime.now()
         for linenumber, line in enumerate(f):
 
             # If indata contains raw data, pass it along
-            if line[0] == '!' or line[0] == '$':
+            if decode.sentenceindex(line) != -1:
                 # Put it in CommHubThread's queue
-                comm_hub_thread.put([name,line])
+                comm_hub_thread.put([name,line,received])
 
             # Update the progress dialog for each 100 rows
             if lastupdate_line + 100 < linenumber:
                 progress.Update(linenumber)
                 lastupdate_line = linenumber
+                received = datetime.datetime.now()
 
         # Close file
         f.close()
@@ -977,7 +1239,7 @@ class MapFrame(wx.Frame):
         if sog is None or sog == 'N/A':
             sog = 0
         else:
-            sog = int(sog * decimal.Decimal('1.5'))
+            sog = int(sog * 3 / 2)
         # See what type of transponder we have
         transponder_type = data['transponder_type']
         if transponder_type and transponder_type == 'base':
@@ -1791,11 +2053,15 @@ class StatsWindow(wx.Dialog):
         self.input_panel = wx.Panel(self, -1)
         self.input_panel.SetMinSize((450,-1))
         uptime_panel = wx.Panel(self, -1)
+        cache_panel = wx.Panel(self, -1)
+        queue_panel = wx.Panel(self, -1)
         # Create static boxes
         box_objects = wx.StaticBox(objects_panel,-1,_(" Objects "))
         box_horizon = wx.StaticBox(horizon_panel,-1,_(" Radio Horizon (calculated) "))
         box_input = wx.StaticBox(self.input_panel,-1,_(" Inputs "))
         box_uptime = wx.StaticBox(uptime_panel,-1,_(" Uptime "))
+        box_cache = wx.StaticBox(cache_panel,-1,_(" Static Data Cache "))
+        box_queue = wx.StaticBox(queue_panel,-1,_(" Pipeline "))
 
         # Object panels, texts and sizers
         obj_panel_left = wx.Panel(objects_panel)
@@ -1852,6 +2118,48 @@ class StatsWindow(wx.Dialog):
         up_sizer.Add(up_panel_right, wx.EXPAND)
         uptime_panel.SetSizer(up_sizer)
 
+        # Static data cache panels, texts and sizers
+        cache_panel_left = wx.Panel(cache_panel)
+        cache_panel_right = wx.Panel(cache_panel)
+        wx.StaticText(cache_panel_left,-1,_("Hits:"),pos=(-1,0))
+        wx.StaticText(cache_panel_left,-1,_("Misses:"),pos=(-1,20))
+        self.text_cache_hits = wx.StaticText(cache_panel_right,-1,'',pos=(-1,0))
+        self.text_cache_misses = wx.StaticText(cache_panel_right,-1,'',pos=(-1,20))
+        cache_sizer = wx.StaticBoxSizer(box_cache, wx.HORIZONTAL)
+        cache_sizer.AddSpacer(5)
+        cache_sizer.Add(cache_panel_left)
+        cache_sizer.AddSpacer(10)
+        cache_sizer.Add(cache_panel_right, wx.EXPAND)
+        cache_panel.SetSizer(cache_sizer)
+
+        # Pipeline panels, texts and sizers, one line for each stage
+        # and each queue
+        queue_panel_left = wx.Panel(queue_panel)
+        queue_panel_right = wx.Panel(queue_panel)
+        self.text_stages = {}
+        for i, name in enumerate(stages.iterkeys()):
+            wx.StaticText(queue_panel_left,-1,_("Stage")+" "+name+":",pos=(-1,i*20))
+            self.text_stages[name] = wx.StaticText(queue_panel_right,-1,'',pos=(-1,i*20))
+        self.text_queues = {}
+        for i, name in enumerate(queues.iterkeys()):
+            wx.StaticText(queue_panel_left,-1,_("Queue")+" "+name+":",pos=(-1,(len(stages)+i)*20))
+            self.text_queues[name] = wx.StaticText(queue_panel_right,-1,'',pos=(-1,(len(stages)+i)*20))
+        self.text_feeds = {}
+        for i, name in enumerate(sorted(network_client_thread.feeds.iterkeys())):
+            wx.StaticText(queue_panel_left,-1,_("Feed")+" "+name+":",pos=(-1,(len(stages)+len(queues)+i)*20))
+            self.text_feeds[name] = wx.StaticText(queue_panel_right,-1,'',pos=(-1,(len(stages)+len(queues)+i)*20))
+        self.text_clients = None
+        if config['network'].as_bool('server_on'):
+            position = (len(stages)+len(queues)+len(self.text_feeds))*20
+            wx.StaticText(queue_panel_left,-1,_("Network clients:"),pos=(-1,position))
+            self.text_clients = wx.StaticText(queue_panel_right,-1,'',pos=(-1,position))
+        queue_sizer = wx.StaticBoxSizer(box_queue, wx.HORIZONTAL)
+        queue_sizer.AddSpacer(5)
+        queue_sizer.Add(queue_panel_left)
+        queue_sizer.AddSpacer(10)
+        queue_sizer.Add(queue_panel_right, wx.EXPAND)
+        queue_panel.SetSizer(queue_sizer)
+
         # Buttons & events
         closebutton = wx.Button(self,1,_("&Close"),pos=(490,438))
         self.Bind(wx.EVT_BUTTON, self.OnClose, id=1)
@@ -1867,12 +2175,16 @@ class StatsWindow(wx.Dialog):
         sizer2.Add(objects_panel, 0)
         sizer2.AddSpacer(5)
         sizer2.Add(uptime_panel, 0, wx.EXPAND)
+        sizer2.AddSpacer(5)
+        sizer2.Add(cache_panel, 0, wx.EXPAND)
         sizer1.Add(sizer2)
         sizer1.AddSpacer(5)
         sizer1.Add(horizon_panel, 0, wx.EXPAND)
         self.mainsizer.Add(sizer1)
         self.mainsizer.AddSpacer(5)
         self.mainsizer.Add(self.input_panel, 0, wx.EXPAND)
+        self.mainsizer.AddSpacer(5)
+        self.mainsizer.Add(queue_panel, 0, wx.EXPAND)
         self.mainsizer.AddSpacer((0,10))
         sizer_button.Add(closebutton, 0)
         self.mainsizer.Add(sizer_button, flag=wx.ALIGN_RIGHT)
@@ -1894,14 +2206,16 @@ class StatsWindow(wx.Dialog):
         wx.StaticText(panel_left,-1,_("Received:"),pos=(-1,0))
         wx.StaticText(panel_left,-1,_("Parsed:"),pos=(-1,20))
         wx.StaticText(panel_left,-1,_("Parsed rate:"),pos=(-1,40))
+        wx.StaticText(panel_left,-1,_("Filtered:"),pos=(-1,60))
         received = wx.StaticText(panel_right,-1,'',pos=(-1,0))
         parsed = wx.StaticText(panel_right,-1,'',pos=(-1,20))
         rate = wx.StaticText(panel_right,-1,'',pos=(-1,40))
+        filtered = wx.StaticText(panel_right,-1,'',pos=(-1,60))
         sizer.AddSpacer(5)
         sizer.Add(panel_left, 0)
         sizer.AddSpacer(10)
         sizer.Add(panel_right, 1, wx.EXPAND)
-        return {'sizer': sizer, 'received': received, 'parsed': parsed, 'rate': rate}
+        return {'sizer': sizer, 'received': received, 'parsed': parsed, 'rate': rate, 'filtered': filtered}
 
     def Update(self, input_stats, grey_dict, nbr_tot_items):
         # Update data in the window
@@ -1920,6 +2234,21 @@ class StatsWindow(wx.Dialog):
         up_since = start_time.isoformat()[:19]
         self.text_uptime_delta.SetLabel(str(uptime).split('.')[0])
         self.text_uptime_since.SetLabel(str(up_since.replace('T', " "+_("at")+" ")))
+        # Static data cache text
+        self.text_cache_hits.SetLabel(str(decode.static_cache.hits)+_(" msgs"))
+        self.text_cache_misses.SetLabel(str(decode.static_cache.misses)+_(" msgs"))
+        # Pipeline text, with times in milliseconds
+        current = get_metrics()
+        for name, stats in current['stages'].iteritems():
+            processing = stats['processing']
+            self.text_stages[name].SetLabel(_("%(rate).1f msgs/sec, processing %(p50).3f ms median, %(p99).3f ms 99%%") % {'rate': stats['rate'], 'p50': processing['p50'] * 1000, 'p99': processing['p99'] * 1000})
+        for name, stats in current['queues'].iteritems():
+            self.text_queues[name].SetLabel(_("%(enqueued)d enqueued, %(dropped)d dropped, high-water %(highwater)d of %(maxsize)d (%(policy)s), wait %(wait).1f ms 99%%") % dict(stats, wait=stats['wait']['p99'] * 1000))
+        for name, stats in current['feeds'].iteritems():
+            if name in self.text_feeds:
+                self.text_feeds[name].SetLabel(_("%(state)s, connected %(connected)s (%(uptime)s in total), %(rate).1f bytes/sec") % dict(stats, connected=str(datetime.timedelta(seconds=int(stats['connected']))), uptime=str(datetime.timedelta(seconds=int(stats['uptime'])))))
+        if self.text_clients:
+            self.text_clients.SetLabel(_("%(clients)d connected (%(subscribed)d subscribed), largest lag %(lag)d bytes") % {'clients': len(current['clients']), 'subscribed': len([client for client in current['clients'] if client['subscribed']]), 'lag': max([0] + [client['lag'] for client in current['clients']])})
         # Iterate over items in the statistics dict
         for (name, data) in input_stats.iteritems():
             if name in self.input_boxes:
@@ -1931,6 +2260,8 @@ class StatsWindow(wx.Dialog):
                     box['parsed'].SetLabel(str(data['parsed'])+_(" msgs"))
                     rate = self.CalcParseRate(name, data['parsed'])
                     box['rate'].SetLabel(str(rate)+_(" msgs/sec"))
+                if 'filtered' in data:
+                    box['filtered'].SetLabel(str(data['filtered'])+_(" msgs"))
             else:
                 # New input name, redraw input panel
                 self.input_boxes[name] = self.MakeInputStatBox(self.input_panel, " " + name + " ")
@@ -3469,8 +3800,14 @@ class RawDataWindow(wx.Dialog):
 class PositionConversion(object):
     # Makes position conversions from position in a DD format
     # to human-readable strings in DD, DM or DMS format
-    # Input must be of type decimal.Decimal
+    # Input must be of type decimal.Decimal or float
     def __init__(self, lat, long):
+        # Floats are converted to decimals with six decimal digits,
+        # like the ones from the decimal numeric backend
+        if isinstance(lat, float):
+            lat = decimal.Decimal('%.6f' % lat)
+        if isinstance(long, float):
+            long = decimal.Decimal('%.6f' % long)
         self.latitude = lat
         self.longitude = long
 
@@ -3549,19 +3886,18 @@ class GUI(wx.App):
 class SerialThread:
     queue = Queue.Queue()
     # Define a queue for inserting data to send
-    comqueue = Queue.Queue(500)
+    comqueue = OverloadQueue(500)
 
     def reader(self, name, s):
         # Set empty queueitem
         queueitem = ''
         # Start loop
         while True:
-            # See if we shall stop
+            # See if we shall stop, the reading below waits for data
             try:
                 queueitem = self.queue.get_nowait()
-            # If no data in queue, sleep (prevents 100% CPU drain)
             except Queue.Empty:
-                time.sleep(0.001)
+                pass
             if queueitem == 'stop':
                 s.close()
                 break
@@ -3578,13 +3914,11 @@ class SerialThread:
                 time.sleep(1)
                 continue
 
-            # If data contains raw data, pass it along
-            try:
-                if data[0] == '!' or data[0] == '$':
-                    # Put it in CommHubThread's queue
-                    comm_hub_thread.put([name,data])
-            except IndexError:
-                pass
+            # If data contains raw data, pass it along with the time
+            # it was read
+            if decode.sentenceindex(data) != -1:
+                # Put it in CommHubThread's queue
+                comm_hub_thread.put([name,data,datetime.datetime.now()])
 
 
     def server(self):
@@ -3602,29 +3936,22 @@ class SerialThread:
         else:
             # Server is not on, exit thread
             return False
-        # Set empty queueitem
-        queueitem = ''
         # Start loop
         while True:
-            # See if we shall stop
-            try:
-                queueitem = self.queue.get_nowait()
-            # If no data in queue, sleep (prevents 100% CPU drain)
-            except Queue.Empty:
-                time.sleep(0.1)
-            if queueitem == 'stop':
+            # Wait for data to send, and then take all data in the
+            # queue. Stop when told to (stop puts 'stop' in the queue)
+            lines = [self.comqueue.get()]
+            while True:
+                try:
+                    lines.append(self.comqueue.get_nowait())
+                except Queue.Empty:
+                    break
+            if 'stop' in lines:
                 serial_server.flushOutput()
                 serial_server.close()
                 break
-            # Do we have carrier?
+            # Do we have carrier? If not, the data is dropped
             if serial_server.getCD():
-                lines = []
-                # Try to get data from queue
-                while True:
-                    try:
-                        lines.append(self.comqueue.get_nowait())
-                    except Queue.Empty:
-                        break
                 # Write to port
                 try:
                     serial_server.write(''.join(lines))
@@ -3639,11 +3966,7 @@ class SerialThread:
         self.queue.put(item)
 
     def put_send(self, item):
-        try:
-            self.comqueue.put_nowait(item)
-        except Queue.Full:
-            self.comqueue.get_nowait()
-            self.comqueue.put_nowait(item)
+        self.comqueue.offer(item)
 
     def start(self):
         try:
@@ -3705,90 +4028,71 @@ class SerialThread:
             except Queue.Empty:
                 for i in range(0,100):
                     self.put('stop')
-                    self.put_send('stop')
+                    self.comqueue.force('stop')
 
 
 class NetworkServerThread:
     # Define a queue for inserting data to send
-    comqueue = Queue.Queue(500)
-
-    class NetworkClientHandler(SocketServer.BaseRequestHandler):
-        def handle(self):
-            message = ''
-            # Define an instance collection
-            self.indata = collections.deque()
-            # Notify the NetworkFeeder that we have liftoff...
-            NetworkServerThread().put(('started', self))
-            while True:
-                try:
-                    # Try to pop message from the collection
-                    message = self.indata.popleft()
-                except IndexError:
-                    # If no data in collection, sleep (prevents 100% CPU drain)
-                    time.sleep(0.05)
-                    continue
-                except: pass
-                # If someone tells us to stop, stop.
-                if message == 'stop': break
-                # If message length is > 1, send message to socket
-                if len(message) > 1:
-                    try:
-                        self.request.send(str(message))
-                    except:
-                        break
-            # Stop, please.
-            NetworkServerThread().put(('stopped', self))
-            self.indata.clear()
-            self.request.close()
-
+    comqueue = OverloadQueue(500)
+    # Wakes the server thread when data is put in the queue
+    waker = netio.Waker()
+    # The server, while it runs
+    broadcast = None
 
     def server(self):
-        # Spawn network servers as clients request connection
+        # Serve all clients from this thread: data from the queue is
+        # added to the ring buffer of the server, and sent to each
+        # client as fast as it takes it (see netio.BroadcastServer).
+        # Clients may send a subscription to only get some of the
+        # messages (see decode.parsesubscription)
         server_address = config['network']['server_address']
         server_port = config['network'].as_int('server_port')
+        # The last known position of each MMSI, for subscriptions to
+        # an area
+        positions = {}
+        poller = netio.Poller()
+        poller.register(self.waker)
         try:
-            server = SocketServer.ThreadingTCPServer((server_address, server_port), self.NetworkClientHandler)
-            server.serve_forever()
+            server = netio.BroadcastServer((server_address, server_port), poller,
+                                           config['network'].as_int('server_max_lag'),
+                                           lambda line: decode.parsesubscription(line, positions))
         except:
             logging.error("Could not start the network server on address %(address)s and port %(port)s" %{'address': server_address, 'port': server_port}, exc_info=True)
-
-    def feeder(self):
-        # This function tracks each server thread and feeds them
-        # with data from the queue
-        queueitem = ''
-        servers = []
+            return
+        self.broadcast = server
         while True:
-            try:
-                queueitem = self.comqueue.get_nowait()
-                # If a server started, add to servers
-                if queueitem[0] == 'started':
-                    servers.append(queueitem[1])
-                # If a server stopped, remove from servers
-                elif queueitem[0] == 'stopped':
-                    servers.remove(queueitem[1])
-                # If someone wants to stop us, send stop to servers
-                elif queueitem == 'stop':
-                    for server in servers:
-                        for i in range(0,100):
-                            server.indata.append('stop')
-                    break
-            # If no data in queue, sleep (prevents 100% CPU drain)
-            except Queue.Empty:
-                time.sleep(0.05)
-                continue
-            # If something in queue, but not in form of a list, pass
-            except IndexError: pass
+            for (item, events) in poller.poll():
+                if item is not self.waker:
+                    server.ready(item, events)
+                    continue
+                # Take all data in the queue, and send it at once
+                self.waker.clear()
+                items = []
+                while True:
+                    try:
+                        items.append(self.comqueue.get_nowait())
+                    except Queue.Empty:
+                        break
+                if 'stop' in items:
+                    self.broadcast = None
+                    server.close()
+                    return
+                if items:
+                    for line, summary in items:
+                        if summary is not None and summary[2] is not None:
+                            positions[summary[1]] = summary[2:]
+                    server.send(''.join([line for line, summary in items]), items=items)
 
-            # If queueitem length is > 1, send message to socket
-            if len(queueitem) > 1:
-                for server in servers:
-                    server.indata.append(queueitem)
+    def ReturnStats(self):
+        # Returns the address, time connected, bytes sent, lag and
+        # subscription state of each client
+        server = self.broadcast
+        if server is None:
+            return []
+        return server.stats()
 
     def start(self):
         try:
-            feeder = threading.Thread(target=self.feeder, name='NetworkFeeder')
-            feeder.setDaemon(1)
-            feeder.start()
             server = threading.Thread(target=self.server, name='NetworkServer')
             server.setDaemon(1)
             server.start()
@@ -3802,19 +4106,91 @@ class NetworkServerThread:
             while True:
                 self.comqueue.get_nowait()
         except Queue.Empty:
-            for i in range(0,100):
-                self.put('stop')
+            self.comqueue.force('stop')
+            self.waker.wake()
 
     def put(self, item):
+        # Items are (line, summary), where summary is the summary of
+        # the decoded message of the line (see decode.summarize) or
+        # None
+        self.comqueue.offer(item)
+        # The server takes all data in the queue when woken, and the
+        # waker only wakes it once until then
+        self.waker.wake()
+
+
+class UdpOutputThread:
+    # Define a queue for inserting data to send
+    comqueue = OverloadQueue(500)
+    # The outputs, while they run
+    output = None
+
+    def sender(self):
+        # Send the data in the queue to all UDP outputs, packing the
+        # lines waiting in as few datagrams as possible
+        addresses = []
+        for c in config['network']['udp_outputs'].replace(' ', '').split(','):
+            if not c:
+                continue
+            params = c.split(':')
+            try:
+                addresses.append((params[0], int(params[1])))
+            except (IndexError, ValueError):
+                logging.error("The UDP output %(address)s is not in the form address:port" %{'address': c})
+        if not addresses:
+            return
+        output = netio.UdpOutput(addresses,
+                                 config['network']['udp_interface'],
+                                 config['network'].as_int('udp_ttl'),
+                                 config['network'].as_int('udp_datagram_size'))
+        self.output = output
+        while True:
+            lines = [self.comqueue.get()]
+            while True:
+                try:
+                    lines.append(self.comqueue.get_nowait())
+                except Queue.Empty:
+                    break
+            if 'stop' in lines:
+                self.output = None
+                output.close()
+                return
+            output.send(''.join(lines))
+
+    def ReturnStats(self):
+        # Returns the datagrams and bytes sent, and the failed sends
+        output = self.output
+        if output is None:
+            return None
+        return output.stats()
+
+    def start(self):
+        try:
+            sender = threading.Thread(target=self.sender, name='UdpOutput')
+            sender.setDaemon(1)
+            sender.start()
+            return True
+        except:
+            return False
+
+    def stop(self):
+        # Get everything in queue and send stop string
         try:
-            self.comqueue.put_nowait(item)
-        except Queue.Full:
-            self.comqueue.get_nowait()
-            self.comqueue.put_nowait(item)
+            while True:
+                self.comqueue.get_nowait()
+        except Queue.Empty:
+            self.comqueue.force('stop')
+
+    def put(self, item):
+        self.comqueue.offer(item)
 
 
 class NetworkClientThread:
     queue = Queue.Queue()
+    # Wakes the client thread when something is put in the queue
+    waker = netio.Waker()
+    # The connections to network servers, by server:port
+    feeds = {}
 
     def client(self):
         # Set empty queueitem
@@ -3822,76 +4198,93 @@ class NetworkClientThread:
         # Get config data and set empty dicts
         connection_params = config['network']['client_addresses'].replace(' ', '').split(',')
         connection_enabled = config['network']['clients_on'].replace(' ', '').split(',')
+        udp_inputs = [c for c in config['network']['udp_inputs'].replace(' ', '').split(',') if c]
         connection_list = []
-        connections = {}
-        remainder = {}
-        # If one of the config lists is empty, return
-        if connection_params == [''] or connection_enabled == ['']:
-            return
         # Build list of connections to use
-        for enabled in connection_enabled:
-            connection_list.extend([c for c in connection_params if enabled == c])
-        # Open all connections
+        if connection_params != [''] and connection_enabled != ['']:
+            for enabled in connection_enabled:
+                connection_list.extend([c for c in connection_params if enabled == c])
+        # If there is nothing to read from, return
+        if not connection_list and not udp_inputs:
+            return
+
+        # Wait for data on all connections at once, and for the waker
+        # when we should stop. Each connection is a feed that connects
+        # again when it fails (see netio.Feed)
+        poller = netio.Poller()
+        poller.register(self.waker)
         for c in connection_list:
             # Split and put address in params[0] and port in params[1]
             params = c.split(':')
-            # Connect
-            connections[c] = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            # A connection has 30 seconds before it times out
-            connections[c].settimeout(30)
             try:
-                connections[c].connect((params[0], int(params[1])))
-                # Ok we succeded... Go to non-blocking mode
-                connections[c].setblocking(False)
-            except socket.timeout:
-                # Oops, we timed out... Close and continue
-                connections[c].close()
-                del connections[c]
-                logging.error("The connection to the network server on address %(address)s and port %(port)s timed out." %{'address': params[0], 'port': params[1]}, exc_info=True)
+                address = (params[0], int(params[1]))
+            except (IndexError, ValueError):
+                logging.error("The address %(address)s of a network server is not in the form server:port" %{'address': c})
                 continue
+            self.feeds[c] = netio.Feed(c, address, poller,
+                                       config['network'].as_float('client_backoff'),
+                                       config['network'].as_float('client_max_backoff'),
+                                       config['network'].as_float('client_connect_timeout'),
+                                       config['network'].as_float('client_stall_rate'),
+                                       config['network'].as_float('client_stall_time'))
+        # UDP inputs are read in the same way, named udp:address:port
+        for c in udp_inputs:
+            params = c.split(':')
+            try:
+                address = (params[0], int(params[1]))
+            except (IndexError, ValueError):
+                logging.error("The UDP input %(address)s is not in the form address:port" %{'address': c})
+                continue
+            try:
+                self.feeds['udp:' + c] = netio.UdpInput('udp:' + c, address, poller,
+                                                        config['network'].as_int('udp_receive_buffer'),
+                                                        config['network']['udp_interface'])
             except socket.error:
-                logging.error("Cannot open a connection to the network server on address %(address)s and port %(port)s." %{'address': params[0], 'port': params[1]}, exc_info=True)
+                logging.error("Could not receive UDP data on %(address)s" %{'address': c}, exc_info=True)
 
         while True:
-            try:
-                queueitem = self.queue.get_nowait()
-            except: pass
-            if queueitem == 'stop':
-                try:
-                    for con in connections.itervalues():
-                        con.close()
-                except: pass
-                break
+            # Connect, time out and check the feeds that are due, and
+            # wait until the next one is due
+            now = time.time()
+            for feed in self.feeds.itervalues():
+                feed.check(now)
+            if self.feeds:
+                timeout = min([feed.timeout(now) for feed in self.feeds.itervalues()])
+            else:
+                timeout = None
 
-            # Now iterate over the connetions
-            for (name, con) in connections.iteritems():
-                try:
-                    # Try to read data from socket
-                    data = str(con.recv(2048)).splitlines(True)
-                except:
-                    # Prevent CPU drain if nothing to do
-                    time.sleep(0.05)
+            for (feed, events) in poller.poll(timeout):
+                if feed is self.waker:
+                    self.waker.clear()
+                    try:
+                        queueitem = self.queue.get_nowait()
+                    except Queue.Empty:
+                        pass
+                    if queueitem == 'stop':
+                        for feed in self.feeds.itervalues():
+                            feed.close()
+                        return
                     continue
 
-                # See if we have data left since last read
-                # If so, concat it with the first new data
-                if name in remainder:
-                    data[0] = remainder.pop(name) + data[0]
-
-                # See if the last data has a line break in it
-                # If not, pop it for use at next read
-                listlength = len(data)
-                if listlength > 0 and not data[listlength-1].endswith('\n'):
-                    remainder[name] = data.pop(listlength-1)
-
-                for indata in data:
+                lines = feed.ready(time.time(), events)
+                # The time the data was read, for lines without a
+                # time of their own
+                received = datetime.datetime.now()
+                for indata in lines:
                     # If indata contains raw data, pass it along
-                    if indata[0] == '!' or indata[0] == '$':
+                    if decode.sentenceindex(indata) != -1:
                         # Put it in CommHubThread's queue
-                        comm_hub_thread.put([name,indata])
+                        comm_hub_thread.put([feed.name,indata,received])
+
+    def ReturnStats(self):
+        # Returns the state, uptime and throughput of each feed and
+        # UDP input
+        now = time.time()
+        return dict([(name, feed.stats(now)) for name, feed in self.feeds.items()])
 
     def put(self, item):
         self.queue.put(item)
+        self.waker.wake()
 
     def start(self):
         try:
@@ -3912,17 +4305,34 @@ class NetworkClientThread:
 
 
 class CommHubThread:
-    incoming_queue = Queue.Queue(10000)
+    incoming_queue = OverloadQueue(10000)
     raw_queue = Queue.Queue(500)
     stats = {}
+    # The processing of incoming data, and the decoding of it
+    stage = metrics.Stage()
+    decode_stage = metrics.Stage()
+    # The largest number of items (and seconds) taken from the queue
+    # at a time
+    batch_size = 500
+    batch_time = 0.05
 
     def runner(self):
         # The routing matrix consists of a dict with key 'input'
         # and value 'output list'
         routing_matrix = self.CreateRoutingMatrix()
-        # The message parts dict has 'input' as key and
-        # and a list of previous messages as value
-        message_parts = {}
+        # The filters consists of a dict with key 'input' and value
+        # decode.MessageFilter, and a filter for all other inputs
+        filters, default_filter = self.CreateFilters()
+        # The reassembler joins multi-sentence AIVDM messages for
+        # each input, channel and sequential message id
+        reassembler = decode.Reassembler()
+        # Copies of an AIVDM message within the duplicate window are
+        # not decoded again, see if it is used
+        duplicate_window = config['decoding'].as_float('duplicate_window')
+        if duplicate_window > 0:
+            duplicate_filter = decode.DuplicateFilter(duplicate_window)
+        else:
+            duplicate_filter = None
         # Empty incoming queue
         incoming_item = ''
         # Set the source to take position data from
@@ -3932,112 +4342,175 @@ class CommHubThread:
                 position_source = 'Serial port ' + position_source[7:] + ' (' + config[position_source]['port'] + ')'
             except KeyError:
                 logging.error("The serial port source used for GPS data (%(source)s) has no port associated with it" %{'source': position_source}, exc_info=True)
+        # See if message fields should be decoded only when used
+        lazy_decoding = config['decoding'].as_bool('lazy_decoding')
+        # Lines routed to the network server, as [line, summary of the
+        # decoded message, batch number] lists. They are sent at the end
+        # of each batch, when they have got the summary for the
+        # subscriptions of the clients (see decode.summarize). Sentences
+        # of a message that is not complete wait for the rest of it, by
+        # source, channel and seq id, and have the batch number set
+        network_lines = []
+        network_fragments = {}
+        batch_number = 0
         while True:
-            # Let's try to get some data in the queue
-            try:
-                incoming_item = self.incoming_queue.get_nowait()
-            except:
-                # Prevent CPU drain if nothing to do
-                time.sleep(0.05)
-                continue
-            if incoming_item == 'stop':
-                break
-            # Set some variables
-            source = incoming_item[0]
-            data = incoming_item[1]
-
-            # See if we got source in stats dict
-            if not source in self.stats:
-                self.stats[source] = {}
-                self.stats[source]['received'] = 0
-                self.stats[source]['parsed'] = 0
-
-            # See if we should route the data
-            outputs = routing_matrix.get(source,[])
-            # Route the raw data
-            for output in outputs:
-                if output == 'serial':
-                    serial_thread.put_send(data)
-                elif output == 'network':
-                    network_server_thread.put(data)
-
-            # Check if message is split on several lines
-            lineinfo = data.split(',')
-            if lineinfo[0] == '!AIVDM':
-                try:
-                    nbr_of_lines = int(lineinfo[1])
-                except: continue
-                try:
-                    line_nbr = int(lineinfo[2])
-                    line_seq_id = int(lineinfo[3])
-                except: pass
-                # If message is split, check that they belong together
-                if nbr_of_lines > 1:
-                    # Get previous parts if they exist
-                    parts = message_parts.get(source)
-                    if parts:
-                        seq_id = parts[0]
-                        total_data = parts[1]
-                    else:
-                        seq_id = 10
-                        total_data = ''
-                    # If first message, set seq_id to the sequential message ID
-                    if line_nbr == 1:
-                        total_data = ''
-                        seq_id = line_seq_id
-                    # If not first message, check that the seq ID matches seq_id
-                    # If not true, reset variables and continue
-                    elif line_seq_id != seq_id:
-                        message_parts[source] = [10, '']
+            # Wait for items in the queue, and take all that are there
+            # as a batch
+            batch = getbatch(self.incoming_queue, self.batch_size, self.batch_time)
+            started = time.time()
+            decoding = 0.0
+            batch_number += 1
+            for incoming_item in batch:
+                if incoming_item == 'stop':
+                    return
+                # Set some variables
+                source = incoming_item[0]
+                data = incoming_item[1]
+                received = incoming_item[2]
+
+                # See if we got source in stats dict
+                if not source in self.stats:
+                    self.stats[source] = {}
+                    self.stats[source]['received'] = 0
+                    self.stats[source]['parsed'] = 0
+                    self.stats[source]['filtered'] = 0
+
+                # See if we should route the data
+                outputs = routing_matrix.get(source,[])
+                # Route the raw data
+                routed = []
+                for output in outputs:
+                    if output == 'serial':
+                        serial_thread.put_send(data)
+                    elif output == 'network':
+                        routed = [[data, None, None]]
+                        network_lines.extend(routed)
+                    elif output == 'udp':
+                        udp_output_thread.put(data)
+
+                # Take the time from the tag block or the timestamp the
+                # receiver put on the sentence, or else use the time the
+                # data was read
+                data, timestamp = decode.splittimestamp(data)
+                if timestamp is None:
+                    timestamp = received
+
+                # Check and join AIVDM sentences, and get the payload of
+                # complete messages
+                payload = None
+                if data.startswith('!AIVDM'):
+                    message = reassembler.add(source, data)
+                    if message is None:
+                        # Wait for the rest of the message
+                        if routed:
+                            telegram = data.split(',', 5)
+                            key = (source, telegram[4], telegram[3])
+                            if telegram[2] == '1':
+                                network_fragments[key] = []
+                            routed[0][2] = batch_number
+                            network_fragments.setdefault(key, []).extend(routed)
                         continue
-                    # Add data to variable total_data
-                    total_data += data
-                    # If the final message has been received, join messages and decode
-                    if len(total_data.splitlines()) == nbr_of_lines:
-                        data = decode.jointelegrams(total_data)
-                        message_parts[source] = [10, '']
+                    elif message:
+                        payload = message[0]
+                        if routed:
+                            telegram = data.split(',', 5)
+                            if telegram[1] != '1':
+                                routed = network_fragments.pop((source, telegram[4], telegram[3]), []) + routed
+                                for line in routed:
+                                    line[2] = None
+
+                # See if the filter for the source lets the data through
+                message_filter = filters.get(source, default_filter)
+                if message_filter:
+                    if payload is None:
+                        accepted = message_filter.accept(data)
                     else:
-                        message_parts[source] = [seq_id, total_data]
+                        accepted = message_filter.acceptpayload(payload)
+                    if not accepted:
+                        self.stats[source]['received'] += 1
+                        self.stats[source]['filtered'] += 1
                         continue
 
-            # Set the telegramparser result in dict parser and queue it
-            try:
-                # Add one to stats dict
-                self.stats[source]['received'] += 1
-                # Parse data
-                #print(data)
-                parser = dict(decode.telegramparser(data))
-                # Set source in parser
-                parser['source'] = source
-                # See if we should send it, and if so: do it!
-                if 'mmsi' in parser:
-                    # Send data to main thread
-                    main_thread.put(parser)
-                    # Add to stats dict if we have decoded message
-                    # (see if 'decoded' is True)
-                    if parser.get('decoded',True):
-                        self.stats[source]['parsed'] += 1
-                # See if we have a position and if we should use it
-                elif 'ownlatitude' in parser and 'ownlongitude' in parser:
-                    #print('Found Ownship Info: ' + position_source)
-                    if position_source.lower() == 'any' or position_source == source:
+                # Drop copies of a message already received, but count
+                # them in the stats for the source like the first one
+                if payload is not None and duplicate_filter:
+                    parsed = duplicate_filter.get(payload)
+                    if parsed is not None:
+                        self.stats[source]['received'] += 1
+                        if parsed:
+                            self.stats[source]['parsed'] += 1
+                        continue
+
+                # Set the telegramparser result in dict parser and queue it
+                try:
+                    # Add one to stats dict
+                    self.stats[source]['received'] += 1
+                    # Parse data
+                    #print(data)
+                    decode_started = time.time()
+                    if payload is None:
+                        parser = decode.telegramparser(data, lazy_decoding, timestamp)
+                    else:
+                        parser = decode.payloadparser(payload, lazy_decoding, timestamp)
+                    decode_finished = time.time()
+                    self.decode_stage.add(decode_started, decode_finished)
+                    decoding += decode_finished - decode_started
+                    # Set source in parser
+                    parser['source'] = source
+                    # See if we should send it, and if so: do it!
+                    if 'mmsi' in parser:
+                        # Let the network server know what the lines
+                        # of the message hold
+                        if routed:
+                            summary = decode.summarize(parser)
+                            for line in routed:
+                                line[1] = summary
                         # Send data to main thread
                         main_thread.put(parser)
-                        # Add to stats dict
-                        self.stats[source]['parsed'] += 1
-
-                # Send raw data to the Raw Window queue
-                raw_mmsi = parser.get('mmsi','N/A')
-                raw_message = parser.get('message','N/A')
-                # Append source, message number, mmsi and data to rawdata
-                raw = [source, raw_message, raw_mmsi, data]
-                # Add the raw line to the raw queue
-                try:
-                    self.raw_queue.put_nowait(raw)
-                except Queue.Full:
-                    self.raw_queue.get_nowait()
-                    self.raw_queue.put_nowait(raw)
-            except: continue
+                        # Add to stats dict if we have decoded message
+                        # (see if 'decoded' is True)
+                        parsed = bool(parser.get('decoded',True))
+                        if parsed:
+                            self.stats[source]['parsed'] += 1
+                        # Remember the message to find copies of it
+                        if payload is not None and duplicate_filter:
+                            duplicate_filter.add(payload, parsed)
+                    # See if we have a position and if we should use it
+                    elif 'ownlatitude' in parser and 'ownlongitude' in parser:
+                        #print('Found Ownship Info: ' + position_source)
+                        if position_source.lower() == 'any' or position_source == source:
+                            # Send data to main thread
+                            main_thread.put(parser)
+                            # Add to stats dict
+                            self.stats[source]['parsed'] += 1
+
+                    # Send raw data to the Raw Window queue
+                    raw_mmsi = parser.get('mmsi','N/A')
+                    raw_message = parser.get('message','N/A')
+                    # Append source, message number, mmsi and data to rawdata
+                    raw = [source, raw_message, raw_mmsi, data]
+                    # Add the raw line to the raw queue
+                    try:
+                        self.raw_queue.put_nowait(raw)
+                    except Queue.Full:
+                        self.raw_queue.get_nowait()
+                        self.raw_queue.put_nowait(raw)
+                except: continue
+            # Send the lines routed to the network server, up to the
+            # first sentence of a message that is still waiting for the
+            # rest of it from this batch. Sentences of messages not
+            # completed in the next batch are sent without a summary
+            if network_lines:
+                count = len(network_lines)
+                for index, line in enumerate(network_lines):
+                    if line[2] == batch_number:
+                        count = index
+                        break
+                for line in network_lines[:count]:
+                    network_server_thread.put((line[0], line[1]))
+                del network_lines[:count]
+            # The decoding is counted in its own stage
+            self.stage.add(started, time.time() - decoding, len(batch))
 
     def CreateRoutingMatrix(self):
         # Creates a routing matrix dict from the set config options
@@ -4048,6 +4521,7 @@ class CommHubThread:
         # Get network config options
         clients_to_serial = config['network']['clients_to_serial'].replace(' ', '').split(',')
         clients_to_server = config['network']['clients_to_server'].replace(' ', '').split(',')
+        clients_to_udp = config['network']['clients_to_udp'].replace(' ', '').split(',')
 
         # Add to matrix
         for network_source in clients_to_serial:
@@ -4060,6 +4534,11 @@ class CommHubThread:
                 send_list = matrix.get(network_source,[])
                 send_list.append('network')
                 matrix[network_source] = send_list
+        for network_source in clients_to_udp:
+            if network_source:
+                send_list = matrix.get(network_source,[])
+                send_list.append('udp')
+                matrix[network_source] = send_list
 
         # Get serial config options
         conf_ports = [ port for port in config.iterkeys()
@@ -4086,9 +4565,72 @@ class CommHubThread:
                         send_list.append('network')
                         matrix[portname] = send_list
                 except: pass
+                # Add to UDP output send list
+                try:
+                    if config[port].as_bool('send_to_udp'):
+                        send_list = matrix.get(portname,[])
+                        send_list.append('udp')
+                        matrix[portname] = send_list
+                except: pass
 
         return matrix
 
+    def CreateFilters(self):
+        # Creates a dict of filters for each input and a default
+        # filter from the set config options. Inputs without any
+        # filter options set get None
+
+        def listoption(section, option):
+            # Return a list option as a string without spaces (the
+            # config file may hold it as a string or as a list)
+            value = section.get(option, '')
+            if isinstance(value, (list, tuple)):
+                value = ','.join(value)
+            return value.replace(' ', '')
+
+        def makefilter(section):
+            # Create a filter from a config section
+            message_types = listoption(section, 'message_types')
+            mmsi_allow = listoption(section, 'mmsi_allow')
+            mmsi_deny = listoption(section, 'mmsi_deny')
+            try:
+                drop_base_stations = section.as_bool('drop_base_stations')
+            except: drop_base_stations = False
+            if not (message_types or mmsi_allow or mmsi_deny or drop_base_stations):
+                return None
+            if message_types:
+                message_types = message_types.upper().split(',')
+            else:
+                message_types = None
+            try:
+                return decode.MessageFilter(message_types,
+                                            decode.mmsiranges(mmsi_allow),
+                                            decode.mmsiranges(mmsi_deny),
+                                            drop_base_stations)
+            except ValueError:
+                logging.error("Could not read the message filter settings", exc_info=True)
+                return None
+
+        # The top level options are used for all inputs
+        default_filter = makefilter(config['filter'])
+
+        # Subsections are named after the input, the config section
+        # of a serial port (like serial_a) or 'file'
+        filters = {}
+        for name in config['filter'].sections:
+            section = config['filter'][name].copy()
+            # Options not in the subsection are taken from the top level
+            for option in config['filter'].scalars:
+                section.setdefault(option, config['filter'][option])
+            section = ConfigObj(section)
+            if name.find('serial') != -1 and name in config and 'port' in config[name]:
+                name = 'Serial port ' + name[7:] + ' (' + config[name]['port'] + ')'
+            elif name.lower() == 'file':
+                name = 'File'
+            filters[name] = makefilter(section)
+
+        return filters, default_filter
+
     def ReturnStats(self):
         return self.stats
 
@@ -4103,11 +4645,7 @@ class CommHubThread:
         return temp
             
     def put(self, item):
-        try:
-            self.incoming_queue.put_nowait(item)
-        except Queue.Full:
-            self.incoming_queue.get_nowait()
-            self.incoming_queue.put_nowait(item)
+        self.incoming_queue.offer(item)
 
     def start(self):
         try:
@@ -4124,14 +4662,32 @@ class CommHubThread:
             while True:
                 self.incoming_queue.get_nowait()
         except Queue.Empty:
-            self.put('stop')
+            self.incoming_queue.force('stop')
 
 
 class MainThread:
     # Create an incoming and an outgoing queue
     # Set a limit on how large the outgoing queue can get
-    queue = Queue.Queue(1000)
-    outgoing = Queue.Queue(1000)
+    queue = OverloadQueue(1000)
+    outgoing = OverloadQueue(1000)
+    # Set while the main loop runs, and the item put in the queue
+    # when there is no data, see Ticker
+    running = threading.Event()
+    tick = {'tick': True}
+    # The largest number of items (and seconds) taken from the queue
+    # at a time
+    batch_size = 500
+    batch_time = 0.05
+    # The processing of decoded messages, and of the outgoing messages
+    # by the GUI
+    stage = metrics.Stage()
+    outgoing_stage = metrics.Stage()
+    # The transponder type set by each message type that updates the
+    # object database, other messages are not used
+    transponder_types = {'1': 'A', '2': 'A', '3': 'A', '5': 'A',
+                         'S02': 'A', 'S0E': 'A', 'S0F': 'A',
+                         '4': 'base',
+                         '18': 'B', '19': 'B', '24': 'B'}
 
     def __init__(self):
         # Set an empty incoming dict
@@ -4144,13 +4700,18 @@ class MainThread:
         self.ownposition = {}
         self.ownmmsi = 1
 
+        # The current time in the time of the messages, which objects
+        # are greyed out, removed and logged by, so that replayed data
+        # with tag block or receiver times is handled like live data
+        self.clock = decode.MessageClock()
+
         # Define a dict to store remarks/alerts in
         self.remarkdict = {}
 
         # See if we should set a fixed manual position
         if config['position'].as_bool('override_on'):
-            ownlatitude = decimal.Decimal(config['position']['latitude'])
-            ownlongitude = decimal.Decimal(config['position']['longitude'])
+            ownlatitude = decode.tonumber(config['position']['latitude'])
+            ownlongitude = decode.tonumber(config['position']['longitude'])
             try:
                 owngeoref = georef(ownlatitude,ownlongitude)
             except:
@@ -4196,27 +4757,14 @@ class MainThread:
 
         # Check if report needs special treatment
         if 'message' in self.incoming_packet:
-            message = self.incoming_packet['message']
-            # If message type 1, 2 or 3 (Mobile Position Report) or
-            # message type 5 (Static and Voyage Related Data):
-            if message == '1' or message == '2' or message == '3' or message == '5':
-                update_dict['transponder_type'] = 'A'
-            # If message type S02 (Standard Position), S0E (Identification)
-            # or S0F (Vessel Data):
-            elif message == 'S02' or message == 'S0E' or message == 'S0F':
-                update_dict['transponder_type'] = 'A'
-            # If message type 4 (Base Station Report):
-            elif message == '4':
-                update_dict['transponder_type'] = 'base'
-            # If message type 18, 19 or 24 (Class B messages):
-            elif message == '18' or message == '19' or message == '24':
-                update_dict['transponder_type'] = 'B'
-            # Abort insertion if message type 9 (Special Position
-            # Report), or type S0D and S11 (aviation reports)
-            elif message == '9' or message == 'S0D' or message == 'S11':
-                return None
+            # Set the transponder type (A, B or base) from the message
+            # type, and abort insertion for other messages, like
+            # message type 9 (Special Position Report), or type S0D
+            # and S11 (aviation reports)
             # FIXME: Should we just throw the rest of these messages?
-            else:
+            try:
+                update_dict['transponder_type'] = self.transponder_types[self.incoming_packet['message']]
+            except KeyError:
                 return None
 
         # If not currently in DB, add the mmsi number, creation time and MID code
@@ -4283,8 +4831,12 @@ class MainThread:
         if 'ownlatitude' in self.ownposition and 'ownlongitude' in self.ownposition and 'latitude' in self.incoming_packet and 'longitude' in self.incoming_packet:
             try:
                 dist = VincentyDistance((self.ownposition['ownlatitude'],self.ownposition['ownlongitude']), (self.incoming_packet['latitude'],self.incoming_packet['longitude'])).all
-                update_dict['distance'] = decimal.Decimal(str(dist['km'])).quantize(decimal.Decimal('0.1'))
-                update_dict['bearing'] = decimal.Decimal(str(dist['bearing'])).quantize(decimal.Decimal('0.1'))
+                if decode.numeric_backend == 'float':
+                    update_dict['distance'] = round(dist['km'], 1)
+                    update_dict['bearing'] = round(dist['bearing'], 1)
+                else:
+                    update_dict['distance'] = decimal.Decimal(str(dist['km'])).quantize(decimal.Decimal('0.1'))
+                    update_dict['bearing'] = decimal.Decimal(str(dist['bearing'])).quantize(decimal.Decimal('0.1'))
             except: pass
 
         # Filter destination field for numbers
@@ -4306,6 +4858,52 @@ class MainThread:
         # Return the updated object and the iddb entry
         return self.db_main[main_record['__id__']].copy(), iddb.copy(), new
 
+    def DbUpdateBatch(self, packets):
+        # Updates the DB with the packets in a batch. The packets for
+        # the same object are merged in the order they came, so that
+        # each object is updated once. The version of the object is
+        # still increased once for each packet, and the update is new
+        # if the object reaches showafterupdates versions with it, as
+        # when the packets are applied one at a time. Returns a list of
+        # the updates as DbUpdate returns them
+        merged = collections.OrderedDict()
+        counts = {}
+        for packet in packets:
+            # Leave out the messages that DbUpdate does not use, so
+            # that they are not merged with the others
+            if 'message' in packet and packet['message'] not in self.transponder_types:
+                continue
+            if packet['mmsi'] in merged:
+                merged[packet['mmsi']].update(packet.iteritems())
+                counts[packet['mmsi']] += 1
+            else:
+                merged[packet['mmsi']] = dict(packet.iteritems())
+                counts[packet['mmsi']] = 1
+        showafterupdates = config['common'].as_int('showafterupdates')
+        updates = []
+        for mmsi, packet in merged.iteritems():
+            update = self.DbUpdate(packet)
+            if not update:
+                continue
+            object_info, iddb, new = update
+            count = counts[mmsi]
+            if count > 1:
+                self.db_main[object_info['__id__']]['__version__'] += count - 1
+                object_info['__version__'] += count - 1
+            if object_info['__version__'] - count < showafterupdates <= object_info['__version__']:
+                new = True
+            updates.append((object_info, iddb, new))
+        return updates
+
+    def ApplyPackets(self, packets):
+        # Updates the DB with the packets taken so far and sends the
+        # updated objects, and empties packets
+        if packets:
+            self.clock.update(max([packet['time'] for packet in packets]), time.time())
+        for update in self.DbUpdateBatch(packets):
+            self.UpdateMsg(*update)
+        del packets[:]
+
     def UpdateMsg(self, object_info, iddb, new=False, query=False):
         # See if we not should send message
         transponder_type = object_info.get('transponder_type',None)
@@ -4397,8 +4995,9 @@ class MainThread:
         # 'old' messages
 
         # Calculate datetime objects to compare with
-        old_limit = datetime.datetime.now()-datetime.timedelta(seconds=config['common'].as_int('listmakegreytime'))
-        remove_limit = datetime.datetime.now()-datetime.timedelta(seconds=config['common'].as_int('deleteitemtime'))
+        now = self.clock.time(time.time())
+        old_limit = now-datetime.timedelta(seconds=config['common'].as_int('listmakegreytime'))
+        remove_limit = now-datetime.timedelta(seconds=config['common'].as_int('deleteitemtime'))
 
         # Compare objects in db against old_limit and remove_limit
         old_objects = [ r for r in self.db_main
@@ -4418,11 +5017,7 @@ class MainThread:
 
     def SendMsg(self, message):
         # Puts message in queue for consumers to get
-        try:
-            self.outgoing.put_nowait(message)
-        except Queue.Full:
-            self.outgoing.get_nowait()
-            self.outgoing.put_nowait(message)
+        self.outgoing.offer(message)
 
     def ReturnOutgoing(self):
         # Return all messages in the outgoing queue
@@ -4434,88 +5029,45 @@ class MainThread:
             return templist
 
     def Main(self):
-        # Set some timers
-        lastchecktime = time.time()
-        lastlogtime = time.time()
+        # Set some timers. Old objects are checked for and logged by
+        # the time of the messages (see self.clock)
+        lastchecktime = self.clock.time(time.time())
+        lastlogtime = lastchecktime
         lastiddblogtime = time.time()
         incoming = {}
         # See if we should send a own position before looping
         if self.ownposition:
             self.SendMsg({'own_position': self.ownposition})
         while True:
-            # Try to get the next item in queue
-            try:
-                incoming = self.queue.get_nowait()
-            except:
-                # Prevent CPU drain if nothing to do
-                time.sleep(0.05)
-                incoming = {}
-            if incoming == 'stop': break
-
-            # Check if incoming contains a MMSI number
-            if 'mmsi' in incoming and incoming['mmsi'] > 1:
-                update = self.DbUpdate(incoming)
-                if update:
-                    self.UpdateMsg(*update)
-            # If incoming got own position data, use it
-            elif 'ownlatitude' in incoming and 'ownlongitude' in incoming: #and not config['position'].as_bool('override_on'):
-                ownlatitude = incoming['ownlatitude']
-                ownlongitude = incoming['ownlongitude']
-                owntime = incoming['time']
-                ownsog = incoming['ownsog']
-                owncog = incoming['owncog']
-                try:
-                    owngeoref = georef(ownlatitude,ownlongitude)
-                except:
-                    owngeoref = None
-                self.ownposition.update({'ownlatitude': ownlatitude, 'ownlongitude': ownlongitude, 'owngeoref': owngeoref, 'ownsog': ownsog, 'owncog': owncog, 'owntime': owntime})
-                # Send a position update
-                self.SendMsg({'own_position': self.ownposition})
-            # If incoming has special attributes
-            elif 'query' in incoming and incoming['query'] > 0:
-                # Fetch the current data in DB for MMSI
-                query = self.db_main._mmsi[incoming['query']]
-                # Return a dictionary of query
-                if len(query) == 0:
-                    query = {}
-                elif len(query) > 0:
-                    query = query[0]
-                # Fetch current data in IDDB
-                iddb = self.db_iddb._mmsi[incoming['query']]
-                # Return a dictionary of iddb
-                if len(iddb) == 0:
-                    iddb = {}
-                elif len(iddb) > 0:
-                    iddb = iddb[0]
-                # Send the message
-                self.UpdateMsg(query, iddb, query=True)
-            # If the remark/alert dict is asked for
-            elif 'remarkdict_query' in incoming:
-                # Send a copy of the remark/alert dict
-                self.SendMsg({'remarkdict': self.remarkdict.copy()})
-            # If the IDDB is asked for
-            elif 'iddb_query' in incoming:
-                iddb = [ r for r in self.db_iddb ]
-                # Send a copy of the remark/alert dict
-                self.SendMsg({'iddb': iddb})
-            # If we should update our remark/alert dict
-            elif 'update_remarkdict' in incoming:
-                self.remarkdict = incoming['update_remarkdict']
-            # If we should pass on an error to the GUI
-            elif 'error' in incoming:
-                self.SendMsg(incoming)
+            # Wait for items in queue, and take all that are there as a
+            # batch. The ticker puts a tick in the queue when there is
+            # no data, so that the timers below are still checked
+            batch = getbatch(self.queue, self.batch_size, self.batch_time)
+            if 'stop' in batch: break
+            started = time.time()
+            # The object data is applied for the whole batch at once
+            packets = []
+            count = 0
+            for incoming in batch:
+                if incoming is not self.tick:
+                    self.HandleIncoming(incoming, packets)
+                    count += 1
+            self.ApplyPackets(packets)
+            if count:
+                self.stage.add(started, time.time(), count)
 
             # Remove or mark objects as old if last update time is above threshold
-            if lastchecktime + 10 < time.time():
+            now = self.clock.time(time.time())
+            if lastchecktime + datetime.timedelta(seconds=10) < now:
                 self.CheckDBForOld()
-                lastchecktime = time.time()
+                lastchecktime = now
 
             # Initiate logging to disk of log time is above threshold
             if config['logging'].as_bool('logging_on'):
                 if config['logging'].as_int('logtime') == 0: pass
-                elif lastlogtime + config['logging'].as_int('logtime') < time.time():
+                elif lastlogtime + datetime.timedelta(seconds=config['logging'].as_int('logtime')) < now:
                     self.dblog()
-                    lastlogtime = time.time()
+                    lastlogtime = now
 
             # Initiate iddb logging if current time is > (lastlogtime + logtime)
             if config['iddb_logging'].as_bool('logging_on'):
@@ -4524,6 +5076,66 @@ class MainThread:
                     self.iddblog()
                     lastiddblogtime = time.time()
 
+    def HandleIncoming(self, incoming, packets):
+        # Handles an item from the queue. Packets with object data are
+        # appended to packets, to be applied with ApplyPackets. Other
+        # items are handled after the packets before them are applied,
+        # so that queries see the data that came before them
+
+        # Check if incoming contains a MMSI number
+        if 'mmsi' in incoming and incoming['mmsi'] > 1:
+            packets.append(incoming)
+            return
+        if packets:
+            self.ApplyPackets(packets)
+        # If incoming got own position data, use it
+        if 'ownlatitude' in incoming and 'ownlongitude' in incoming: #and not config['position'].as_bool('override_on'):
+            ownlatitude = incoming['ownlatitude']
+            ownlongitude = incoming['ownlongitude']
+            owntime = incoming['time']
+            ownsog = incoming['ownsog']
+            owncog = incoming['owncog']
+            try:
+                owngeoref = georef(ownlatitude,ownlongitude)
+            except:
+                owngeoref = None
+            self.ownposition.update({'ownlatitude': ownlatitude, 'ownlongitude': ownlongitude, 'owngeoref': owngeoref, 'ownsog': ownsog, 'owncog': owncog, 'owntime': owntime})
+            # Send a position update
+            self.SendMsg({'own_position': self.ownposition})
+        # If incoming has special attributes
+        elif 'query' in incoming and incoming['query'] > 0:
+            # Fetch the current data in DB for MMSI
+            query = self.db_main._mmsi[incoming['query']]
+            # Return a dictionary of query
+            if len(query) == 0:
+                query = {}
+            elif len(query) > 0:
+                query = query[0]
+            # Fetch current data in IDDB
+            iddb = self.db_iddb._mmsi[incoming['query']]
+            # Return a dictionary of iddb
+            if len(iddb) == 0:
+                iddb = {}
+            elif len(iddb) > 0:
+                iddb = iddb[0]
+            # Send the message
+            self.UpdateMsg(query, iddb, query=True)
+        # If the remark/alert dict is asked for
+        elif 'remarkdict_query' in incoming:
+            # Send a copy of the remark/alert dict
+            self.SendMsg({'remarkdict': self.remarkdict.copy()})
+        # If the IDDB is asked for
+        elif 'iddb_query' in incoming:
+            iddb = [ r for r in self.db_iddb ]
+            # Send a copy of the remark/alert dict
+            self.SendMsg({'iddb': iddb})
+        # If we should update our remark/alert dict
+        elif 'update_remarkdict' in incoming:
+            self.remarkdict = incoming['update_remarkdict']
+        # If we should pass on an error to the GUI
+        elif 'error' in incoming:
+            self.SendMsg(incoming)
+
     def dblog(self):
         # Make a query for the metadata, but return only rows where IMO
         # has a value, and make a MD5 hash out of the data
@@ -4557,7 +5169,7 @@ class MainThread:
         # Query the memory DB
         positionquery = []
         # Calculate the oldest time we allow an object to have
-        threshold = datetime.datetime.now() - datetime.timedelta(seconds=config['logging'].as_int('logtime'))
+        threshold = self.clock.time(time.time()) - datetime.timedelta(seconds=config['logging'].as_int('logtime'))
         # Iterate over all objects in db_main
         for r in self.db_main:
             # If base station, see if we should log it
@@ -4676,28 +5288,38 @@ class MainThread:
                 logging.warning("Reading from remark file failed", exc_info=True)
 
     def put(self, item):
-        try:
-            self.queue.put_nowait(item)
-        except Queue.Full:
-            self.queue.get_nowait()
-            self.queue.put_nowait(item)
+        self.queue.offer(item)
+
+    def Ticker(self):
+        # Puts a tick in the queue every second while it is empty,
+        # until the main loop has stopped. Ticks are control items, so
+        # they are not counted or dropped
+        while self.running.isSet():
+            time.sleep(1)
+            if self.queue.empty():
+                self.queue.force(self.tick)
 
     def start(self):
         try:
+            self.running.set()
             r = threading.Thread(target=self.Main)
             r.setDaemon(1)
             r.start()
+            t = threading.Thread(target=self.Ticker)
+            t.setDaemon(1)
+            t.start()
             return True
         except:
             return False
 
     def stop(self):
         # Get everything in queue and send stop string
+        self.running.clear()
         try:
             while True:
                 self.queue.get_nowait()
         except Queue.Empty:
-            self.put('stop')
+            self.queue.force('stop')
 
 
 # Initialize thread classes
@@ -4706,6 +5328,7 @@ comm_hub_thread = CommHubThread()
 serial_thread = SerialThread()
 network_server_thread = NetworkServerThread()
 network_client_thread = NetworkClientThread()
+udp_output_thread = UdpOutputThread()
 
 # Set up loggers and logging handling
 logger = logging.getLogger()
@@ -4745,6 +5368,104 @@ if config['logging'].as_bool('logexceptions'):
 else:
     sys.stderr = open(os.devnull)
 
+# The bounded queues between the threads, by the names used in the
+# config and in the statistics
+queues = collections.OrderedDict([
+    ('comm_hub', CommHubThread.incoming_queue),
+    ('main', MainThread.queue),
+    ('main_outgoing', MainThread.outgoing),
+    ('network_server', NetworkServerThread.comqueue),
+    ('serial_server', SerialThread.comqueue),
+    ('udp_output', UdpOutputThread.comqueue)])
+
+# The stages of the pipeline, in the order data passes them
+stages = collections.OrderedDict([
+    ('comm_hub', CommHubThread.stage),
+    ('decode', CommHubThread.decode_stage),
+    ('main', MainThread.stage),
+    ('outgoing', MainThread.outgoing_stage)])
+
+def get_metrics():
+    # Returns the metrics of the pipeline as a dict with
+    #   time   -- the time of the metrics, from time.time()
+    #   inputs -- the received, parsed and filtered counts of each
+    #             input, as in CommHubThread.stats
+    #   stages -- for each stage, the number of items, the rate per
+    #             second, the time the last item was taken in and a
+    #             summary of the processing times (see metrics.Stage)
+    #   queues -- for each queue, the policy, counters, size and a
+    #             summary of the wait times (see OverloadQueue.stats)
+    #   feeds  -- for each network server read from, the state, time
+    #             connected and throughput (see netio.Feed.stats)
+    #   clients -- for each client of the network server, the address,
+    #             time connected, bytes sent, lag in bytes and if it
+    #             has a subscription (see netio.BroadcastServer.stats)
+    #   udp    -- the number of UDP outputs, the datagrams and bytes
+    #             sent to them and the failed sends, or None if they
+    #             are not used (see netio.UdpOutput.stats)
+    # Times are in seconds
+    now = time.time()
+    inputs = dict([(name, data.copy()) for name, data in comm_hub_thread.ReturnStats().items()])
+    return {'time': now, 'inputs': inputs,
+            'feeds': network_client_thread.ReturnStats(),
+            'clients': network_server_thread.ReturnStats(),
+            'udp': udp_output_thread.ReturnStats(),
+            'stages': collections.OrderedDict([(name, stage.summary(now)) for name, stage in stages.iteritems()]),
+            'queues': collections.OrderedDict([(name, queue.stats()) for name, queue in queues.iteritems()])}
+
+def printmetrics():
+    # Prints the metrics as tables, with times in milliseconds
+    current = get_metrics()
+    print "%-16s %10s %10s %10s %10s %10s %10s" % ('Stage', 'Count', 'Rate', 'Median', '99%', 'Max', 'Last in')
+    for name, stats in current['stages'].iteritems():
+        processing = stats['processing']
+        if stats['ingress'] is None:
+            ingress = '-'
+        else:
+            ingress = '%.1f s' % (current['time'] - stats['ingress'])
+        print "%-16s %10d %10.1f %10.3f %10.3f %10.3f %10s" % (name, stats['count'], stats['rate'], processing['p50'] * 1000, processing['p99'] * 1000, processing['max'] * 1000, ingress)
+    print "%-16s %-12s %10s %10s %10s %10s %10s %10s" % ('Queue', 'Policy', 'Enqueued', 'Dropped', 'High-water', 'Size', 'Wait', 'Wait 99%')
+    for name, stats in current['queues'].iteritems():
+        print "%-16s %-12s %10d %10d %10s %10s %10.3f %10.3f" % (name, stats['policy'], stats['enqueued'], stats['dropped'], '%d/%d' % (stats['highwater'], stats['maxsize']), stats['size'], stats['wait']['p50'] * 1000, stats['wait']['p99'] * 1000)
+    if current['feeds']:
+        print "%-24s %-12s %10s %10s %10s %10s %10s" % ('Feed', 'State', 'Connected', 'Uptime', 'Reconnects', 'Lines', 'Bytes/s')
+        for name, stats in sorted(current['feeds'].items()):
+            print "%-24s %-12s %10d %10d %10d %10d %10.1f" % (name, stats['state'], stats['connected'], stats['uptime'], max(stats['connections'] - 1, 0), stats['lines'], stats['rate'])
+    if current['clients']:
+        print "%-24s %10s %12s %10s %10s %10s" % ('Client', 'Connected', 'Sent', 'Lag', 'Max lag', 'Subscribed')
+        for stats in current['clients']:
+            print "%-24s %10d %12d %10d %10d %10s" % (stats['address'], stats['connected'], stats['sent'], stats['lag'], stats['maxlag'], stats['subscribed'] and 'yes' or 'no')
+    if current['udp']:
+        print "%-24s %10s %12s %10s" % ('UDP output', 'Datagrams', 'Bytes', 'Errors')
+        print "%-24s %10d %12d %10d" % ('%d addresses' % current['udp']['addresses'], current['udp']['datagrams'], current['udp']['bytes'], current['udp']['errors'])
+
+def metricsprinter(interval):
+    # Prints the metrics every interval seconds, while the main loop
+    # runs
+    while main_thread.running.isSet():
+        time.sleep(interval)
+        print
+        printmetrics()
+
+# Set the overload policy of the queues
+shed_types = config['queues'].get('shed_message_types', '')
+if not isinstance(shed_types, (list, tuple)):
+    shed_types = shed_types.split(',')
+shed_types = [message.strip().upper() for message in shed_types if message.strip()]
+for name, queue in queues.iteritems():
+    try:
+        queue.setpolicy(config['queues'][name],
+                        config['queues'].as_float('block_timeout'),
+                        shed_types)
+    except ValueError:
+        logging.error("Could not set the overload policy of the %s queue, using drop_oldest" % name, exc_info=True)
+
+# Set the number type of decoded values
+try:
+    decode.setnumericbackend(config['decoding']['numeric_backend'])
+except KeyError:
+    logging.error("Unknown numeric backend %s, using decimal" % config['decoding']['numeric_backend'])
+
 # Start threads
 main_thread.start()
 comm_hub_thread.start()
@@ -4752,6 +5473,15 @@ serial_thread.start()
 if config['network'].as_bool('server_on'):
     network_server_thread.start()
 network_client_thread.start()
+if config['network']['udp_outputs'].strip():
+    udp_output_thread.start()
+# Put simulated traffic in the queue of CommHubThread, as if it came
+# from an input named Simulator
+if cmdlineoptions.simulate:
+    traffic = simulator.TrafficSimulator(cmdlineoptions.simulate)
+    simulator_thread = threading.Thread(target=simulator.inject, args=(traffic, comm_hub_thread.put, 'Simulator', cmdlineoptions.simulate_speed))
+    simulator_thread.setDaemon(1)
+    simulator_thread.start()
 
 # Start the GUI
 # Wait some time before initiating, to let the threads settle
@@ -4761,9 +5491,15 @@ if cmdlineoptions.nogui:
     # Say hello
     print "\nAIS Logger running without GUI."
     print "Press any key to terminate program...\n"
+    # Print the pipeline statistics now and then
+    if cmdlineoptions.stats > 0:
+        stats_thread = threading.Thread(target=metricsprinter, args=(cmdlineoptions.stats,))
+        stats_thread.setDaemon(1)
+        stats_thread.start()
     # Wait for key press
     raw_input()
     print "Terminating program..."
+    printmetrics()
 else:
     # Start GUI
     app = GUI(0)
@@ -4777,6 +5513,7 @@ comm_hub_thread.stop()
 serial_thread.stop()
 network_server_thread.stop()
 network_client_thread.stop()
+udp_output_thread.stop()
 main_thread.stop()
 
 # Set exit time
@@ -0,0 +1,177 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# metrics.py (part of "AIS Logger")
+# Latency and throughput measurements of the data pipeline
+#
+# Each stage of the pipeline (the queues between the threads and the
+# work done by the threads) records what passes through it here, so
+# that the stage that is saturated first can be found
+#
+# Copyright (c) 2006-2009 Erik I.J. Olsson <olcai@users.sourceforge.net>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import math
+import time
+import unittest
+
+
+class Histogram(object):
+    # Counts times (in seconds) in buckets that are each twice as wide
+    # as the one before. Bucket 0 holds times up to first, bucket i
+    # times up to first * 2**i, and the last bucket everything longer
+    first = 1e-5
+    size = 24
+
+    def __init__(self):
+        self.buckets = [0] * (self.size + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value, count=1):
+        # Adds count times of value seconds
+        index = math.frexp(value / self.first)[1]
+        if index < 0:
+            index = 0
+        elif index > self.size:
+            index = self.size
+        self.buckets[index] += count
+        self.count += count
+        self.total += value * count
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, fraction):
+        # Returns the time that fraction (0-1) of the times are below,
+        # as the upper bound of its bucket
+        if not self.count:
+            return 0.0
+        target = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= target and count:
+                break
+        if index < self.size:
+            return min(self.first * 2 ** index, self.max)
+        return self.max
+
+    def summary(self):
+        # Returns the count and the mean, median, 90 and 99 percentile
+        # and largest times
+        if self.count:
+            mean = self.total / self.count
+        else:
+            mean = 0.0
+        return {'count': self.count, 'mean': mean,
+                'p50': self.percentile(0.5), 'p90': self.percentile(0.9),
+                'p99': self.percentile(0.99), 'max': self.max}
+
+
+class Stage(object):
+    # Records the items processed by a stage of the pipeline: the
+    # number of items, the time the last one was taken in, the
+    # processing time of each item and the rate over the last window
+    # seconds. A stage should only be recorded to from one thread
+    def __init__(self, window=10):
+        self.count = 0
+        self.ingress = None
+        self.processing = Histogram()
+        self.window = window
+        # The number of items in each of the last window seconds, by
+        # the second modulo window, up to and including second
+        self.counts = [0] * window
+        self.second = 0
+
+    def add(self, started, finished, count=1):
+        # Records count items taken in at started (from time.time())
+        # and done at finished, sharing the processing time evenly
+        self.count += count
+        self.ingress = started
+        self.processing.add((finished - started) / count, count)
+        second = int(finished)
+        if second != self.second:
+            # Clear the seconds since the last item
+            for cleared in range(max(self.second + 1, second - self.window + 1), second + 1):
+                self.counts[cleared % self.window] = 0
+            self.second = second
+        self.counts[second % self.window] += count
+
+    def rate(self, now=None):
+        # Returns the number of items per second during the last
+        # window full seconds before now
+        if now is None:
+            now = time.time()
+        now = int(now)
+        seconds = range(max(now - self.window, self.second - self.window + 1),
+                        min(now, self.second + 1))
+        return sum([self.counts[second % self.window] for second in seconds]) / float(self.window)
+
+    def summary(self, now=None):
+        # Returns the count, rate, ingress time and a summary of the
+        # processing times
+        return {'count': self.count, 'rate': self.rate(now),
+                'ingress': self.ingress,
+                'processing': self.processing.summary()}
+
+
+class TestMetrics(unittest.TestCase):
+    def testhistogram(self):
+        histogram = Histogram()
+        self.assertEqual(histogram.summary()['p50'], 0.0)
+        for value in [0.000001] * 50 + [0.001] * 49 + [2.0]:
+            histogram.add(value)
+        histogram.add(0.001, 100)
+        summary = histogram.summary()
+        self.assertEqual(summary['count'], 200)
+        self.assertEqual(summary['max'], 2.0)
+        # Times are rounded up to the bucket bounds (powers of two of
+        # 10 microseconds)
+        self.assertEqual(summary['p50'], 0.00128)
+        self.assertEqual(summary['p99'], 0.00128)
+        self.assertEqual(histogram.percentile(0.1), 0.00001)
+        self.assertEqual(histogram.percentile(1.0), 2.0)
+        # Times too long for the buckets go in the last one
+        histogram.add(1000.0)
+        self.assertEqual(histogram.buckets[-1], 1)
+        self.assertEqual(histogram.percentile(1.0), 1000.0)
+
+    def teststage(self):
+        stage = Stage(window=10)
+        stage.add(99.5, 100.5, 10)
+        stage.add(101.0, 101.1, 20)
+        self.assertEqual(stage.count, 30)
+        self.assertEqual(stage.ingress, 101.0)
+        self.assertEqual(stage.processing.count, 30)
+        self.assertAlmostEqual(stage.processing.max, 0.1)
+        # The current second is not counted until it is over
+        self.assertEqual(stage.rate(101.5), 1.0)
+        self.assertEqual(stage.rate(102.0), 3.0)
+        self.assertEqual(stage.rate(111.0), 2.0)
+        self.assertEqual(stage.rate(200.0), 0.0)
+        # Seconds that have passed are cleared when new items come
+        stage.add(125.0, 125.0, 5)
+        self.assertEqual(stage.rate(126.0), 0.5)
+        self.assertEqual(stage.summary(126.0)['count'], 35)
+
+
+if __name__ == '__main__':
+    unittest.main()
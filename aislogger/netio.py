@@ -0,0 +1,1114 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# netio.py (part of "AIS Logger")
+# Socket helpers for the network threads
+#
+# Lets one thread wait for many sockets at once (with epoll on Linux
+# and select elsewhere), be woken from other threads, and split the
+# data read from stream sockets in lines without copying it around.
+# Feed keeps a connection to an upstream server up, and
+# BroadcastServer sends the same data (or the part each subscribed
+# to) to many clients. UdpInput and UdpOutput receive and send lines in
+# UDP datagrams, unicast or multicast
+#
+# Copyright (c) 2006-2009 Erik I.J. Olsson <olcai@users.sourceforge.net>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import errno
+import logging
+import os
+import random
+import select
+import socket
+import time
+import unittest
+
+# The events a socket can be registered for in a Poller
+READ = 1
+WRITE = 2
+
+class Poller(object):
+    # Waits for any of the registered sockets (or other objects with a
+    # fileno method) to be ready to read or write. Uses epoll where it
+    # is available and select elsewhere
+    def __init__(self):
+        self.objects = {}
+        if hasattr(select, 'epoll'):
+            self.epoll = select.epoll()
+        else:
+            self.epoll = None
+            self.readers = set()
+            self.writers = set()
+
+    def register(self, sock, events=READ):
+        fileno = sock.fileno()
+        self.objects[fileno] = sock
+        if self.epoll:
+            self.epoll.register(fileno, self.epollmask(events))
+        else:
+            self.selectsets(fileno, events)
+
+    def modify(self, sock, events):
+        # Changes the events sock is registered for
+        fileno = sock.fileno()
+        if self.epoll:
+            self.epoll.modify(fileno, self.epollmask(events))
+        else:
+            self.selectsets(fileno, events)
+
+    def unregister(self, sock):
+        # Unregisters sock, which must not be closed yet
+        fileno = sock.fileno()
+        if self.objects.pop(fileno, None) is None:
+            return
+        if self.epoll:
+            self.epoll.unregister(fileno)
+        else:
+            self.readers.discard(fileno)
+            self.writers.discard(fileno)
+
+    def poll(self, timeout=None):
+        # Waits at most timeout seconds (for ever if None) and returns
+        # a list of (object, events) for the objects that are ready.
+        # Errors and closed connections are returned as READ, so that
+        # they are found when reading
+        try:
+            if self.epoll:
+                if timeout is None:
+                    timeout = -1
+                ready = []
+                for fileno, mask in self.epoll.poll(timeout):
+                    events = 0
+                    if mask & (select.EPOLLIN | select.EPOLLERR | select.EPOLLHUP):
+                        events |= READ
+                    if mask & select.EPOLLOUT:
+                        events |= WRITE
+                    ready.append((fileno, events))
+            else:
+                readable, writable, failed = select.select(self.readers, self.writers, self.writers, timeout)
+                ready = {}
+                for fileno in readable:
+                    ready[fileno] = READ
+                for fileno in writable:
+                    ready[fileno] = ready.get(fileno, 0) | WRITE
+                # Failed connects are reported in the third list on
+                # Windows
+                for fileno in failed:
+                    ready[fileno] = ready.get(fileno, 0) | READ
+                ready = ready.items()
+        except (select.error, IOError), error:
+            if error.args[0] == errno.EINTR:
+                return []
+            raise
+        return [(self.objects[fileno], events) for fileno, events in ready
+                if fileno in self.objects]
+
+    def epollmask(self, events):
+        mask = 0
+        if events & READ:
+            mask |= select.EPOLLIN
+        if events & WRITE:
+            mask |= select.EPOLLOUT
+        return mask
+
+    def selectsets(self, fileno, events):
+        if events & READ:
+            self.readers.add(fileno)
+        else:
+            self.readers.discard(fileno)
+        if events & WRITE:
+            self.writers.add(fileno)
+        else:
+            self.writers.discard(fileno)
+
+
+def socketpair():
+    # Returns two connected sockets, with socket.socketpair where it
+    # exists and else over the loopback interface (on Windows)
+    if hasattr(socket, 'socketpair'):
+        return socket.socketpair()
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(1)
+    first = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    first.connect(listener.getsockname())
+    second = listener.accept()[0]
+    listener.close()
+    return first, second
+
+
+class Waker(object):
+    # Wakes a thread waiting in Poller.poll from another thread.
+    # Register the waker for READ, and call clear when it is ready,
+    # before taking the work it was woken for. Wakes before clear is
+    # called again only wake once, without writing to the socket
+    def __init__(self):
+        self.reader, self.writer = socketpair()
+        self.reader.setblocking(False)
+        self.writer.setblocking(False)
+        self.woken = False
+
+    def fileno(self):
+        return self.reader.fileno()
+
+    def wake(self):
+        if self.woken:
+            return
+        self.woken = True
+        try:
+            self.writer.send('x')
+        except socket.error:
+            # The waker is already full, so it will wake anyway
+            pass
+
+    def clear(self):
+        self.woken = False
+        try:
+            while self.reader.recv(1024):
+                pass
+        except socket.error:
+            pass
+
+    def close(self):
+        self.reader.close()
+        self.writer.close()
+
+
+class LineBuffer(object):
+    # A receive buffer for a stream socket. Data is read straight into
+    # a bytearray, and each complete line is copied out of it once.
+    # The buffer grows for long lines, up to maxline bytes without a
+    # line break, which are dropped with the rest of the line
+    #   size    -- the size of the buffer, and the most read at a time
+    #   maxline -- the longest line kept
+    def __init__(self, size=65536, maxline=1048576):
+        self.buffer = bytearray(size)
+        self.size = size
+        self.maxline = maxline
+        # The data not yet split in lines is buffer[start:end]
+        self.start = 0
+        self.end = 0
+        # True while the rest of a too long line is skipped
+        self.discarding = False
+
+    def recv(self, sock):
+        # Reads the data available in sock into the buffer. Returns
+        # the number of bytes read, 0 if the connection was closed.
+        # Errors are raised as socket.error
+        if self.start == self.end:
+            self.start = self.end = 0
+        elif len(self.buffer) - self.end < self.size // 4:
+            # Move the rest of the last line to the start, and make
+            # room for a longer line if needed
+            length = self.end - self.start
+            if length > self.maxline:
+                length = 0
+                self.discarding = True
+            self.buffer[:length] = self.buffer[self.end - length:self.end]
+            self.start = 0
+            self.end = length
+            if len(self.buffer) - self.end < self.size // 4:
+                self.buffer.extend(bytearray(len(self.buffer)))
+        count = sock.recv_into(memoryview(self.buffer)[self.end:])
+        self.end += count
+        return count
+
+    def lines(self):
+        # Returns a list of the complete lines in the buffer, with
+        # their line breaks, and removes them from the buffer
+        lines = []
+        buffer = self.buffer
+        start = self.start
+        end = self.end
+        if self.discarding:
+            linebreak = buffer.find('\n', start, end)
+            if linebreak == -1:
+                self.start = end
+                return lines
+            start = linebreak + 1
+            self.discarding = False
+        while True:
+            linebreak = buffer.find('\n', start, end)
+            if linebreak == -1:
+                break
+            lines.append(str(buffer[start:linebreak + 1]))
+            start = linebreak + 1
+        self.start = start
+        return lines
+
+
+class Feed(object):
+    # A connection to an upstream server that is kept up. It connects
+    # without blocking, and when the connection fails, is closed or
+    # stalls, it connects again after a delay that doubles for each
+    # failure in a row (up to maxbackoff), with random jitter so that
+    # feeds that failed together do not retry together. The states are
+    #   connecting  -- waiting for the connection to be made
+    #   streaming   -- connected and receiving data
+    #   stalled     -- connected, but receiving less than stallrate
+    #                  bytes/s, reconnects after stalltime seconds
+    #   backing_off -- waiting to connect again
+    # The feed is registered in poller while it has a socket, and the
+    # owner should call ready when poller returns it, and check at
+    # least when timeout says
+    ratewindow = 10
+
+    def __init__(self, name, address, poller, backoff=1.0, maxbackoff=300.0,
+                 connecttimeout=30.0, stallrate=10.0, stalltime=60.0):
+        self.name = name
+        self.address = address
+        self.poller = poller
+        self.backoff = backoff
+        self.maxbackoff = maxbackoff
+        self.connecttimeout = connecttimeout
+        self.stallrate = stallrate
+        self.stalltime = stalltime
+        self.sock = None
+        self.buffer = None
+        self.state = 'backing_off'
+        # The time of the next connection attempt, timeout or check of
+        # the rate, depending on the state
+        self.deadline = 0
+        # Failures in a row, and connections made
+        self.failures = 0
+        self.connections = 0
+        # When the connection was made (None when not connected), the
+        # time connected before it, and when it stalled
+        self.since = None
+        self.uptime = 0.0
+        self.stalled = None
+        # Bytes and lines received, bytes in the current rate window
+        # and the rate in the last one
+        self.bytes = 0
+        self.lines = 0
+        self.windowbytes = 0
+        self.rate = 0.0
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def connect(self, now):
+        # Starts connecting to the server
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setblocking(False)
+        self.state = 'connecting'
+        self.deadline = now + self.connecttimeout
+        try:
+            result = self.sock.connect_ex(self.address)
+        except socket.error, error:
+            result = error.args[0]
+        if result not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY):
+            self.sock.close()
+            self.sock = None
+            self.fail(now, "Cannot open a connection to the network server %s (%s)" % (self.name, os.strerror(result)))
+            return
+        self.poller.register(self, WRITE)
+
+    def ready(self, now, events):
+        # Handles the events from the poller. Returns a list of the
+        # lines received
+        if self.state == 'connecting':
+            result = self.sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+            if result:
+                self.fail(now, "Cannot open a connection to the network server %s (%s)" % (self.name, os.strerror(result)))
+            else:
+                self.state = 'streaming'
+                self.connections += 1
+                self.since = now
+                self.deadline = now + self.ratewindow
+                self.windowbytes = 0
+                self.buffer = LineBuffer()
+                self.poller.modify(self, READ)
+                if self.failures:
+                    logging.warning("Connected to the network server %s again" % self.name)
+            return []
+        try:
+            count = self.buffer.recv(self.sock)
+        except socket.error, error:
+            if error.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                return []
+            self.fail(now, "The connection to the network server %s failed (%s)" % (self.name, os.strerror(error.args[0])))
+            return []
+        if not count:
+            self.fail(now, "The network server %s closed the connection" % self.name)
+            return []
+        # The server works, so the next failure starts over from the
+        # shortest delay
+        self.failures = 0
+        self.bytes += count
+        self.windowbytes += count
+        lines = self.buffer.lines()
+        self.lines += len(lines)
+        return lines
+
+    def check(self, now):
+        # Connects, times out connecting and checks the rate when it
+        # is time
+        if now < self.deadline:
+            return
+        if self.state == 'backing_off':
+            self.connect(now)
+        elif self.state == 'connecting':
+            self.fail(now, "The connection to the network server %s timed out" % self.name)
+        else:
+            self.rate = self.windowbytes / float(now - self.deadline + self.ratewindow)
+            self.windowbytes = 0
+            self.deadline = now + self.ratewindow
+            if self.rate >= self.stallrate:
+                if self.state == 'stalled':
+                    logging.warning("The network server %s is sending data again" % self.name)
+                self.state = 'streaming'
+            elif self.state == 'streaming':
+                self.state = 'stalled'
+                self.stalled = now
+                logging.warning("The network server %s has stalled (%.1f bytes/s)" % (self.name, self.rate))
+            elif now - self.stalled >= self.stalltime:
+                self.fail(now, "The network server %s stalled for %d s" % (self.name, now - self.stalled))
+
+    def timeout(self, now):
+        # Returns the number of seconds until check should be called
+        return max(self.deadline - now, 0)
+
+    def fail(self, now, reason):
+        # Closes the connection and waits before connecting again. The
+        # first failure in a row is logged as an error, and the rest
+        # as warnings
+        if self.sock is not None:
+            self.poller.unregister(self)
+            self.sock.close()
+            self.sock = None
+        if self.since is not None:
+            self.uptime += now - self.since
+            self.since = None
+        self.buffer = None
+        self.rate = 0.0
+        self.failures += 1
+        delay = min(self.backoff * 2 ** (self.failures - 1), self.maxbackoff)
+        delay = delay * random.uniform(0.5, 1.0)
+        self.state = 'backing_off'
+        self.deadline = now + delay
+        message = "%s, connecting again in %.1f s" % (reason, delay)
+        if self.failures == 1:
+            logging.error(message)
+        else:
+            logging.warning(message)
+
+    def close(self):
+        if self.sock is not None:
+            self.poller.unregister(self)
+            self.sock.close()
+            self.sock = None
+
+    def stats(self, now=None):
+        # Returns the state, the time connected (now and in total), the
+        # connections made, the failures in a row, and the bytes and
+        # lines received and the rate in bytes/s
+        if now is None:
+            now = time.time()
+        rate = self.rate
+        if self.since is None:
+            connected = 0.0
+        else:
+            connected = now - self.since
+            # Until the first rate window is over, use the rate so far
+            if 1 <= connected < self.ratewindow:
+                rate = self.windowbytes / connected
+        return {'state': self.state, 'connected': connected,
+                'uptime': self.uptime + connected,
+                'connections': self.connections, 'failures': self.failures,
+                'bytes': self.bytes, 'lines': self.lines, 'rate': rate}
+
+
+class RingBuffer(object):
+    # The last size bytes of a stream of data. Positions in the stream
+    # count from its start, and head is the position after the last
+    # byte
+    def __init__(self, size):
+        self.buffer = bytearray(size)
+        self.size = size
+        self.head = 0
+
+    def append(self, data):
+        if len(data) > self.size:
+            self.head += len(data) - self.size
+            data = data[-self.size:]
+        start = self.head % self.size
+        first = min(len(data), self.size - start)
+        self.buffer[start:start + first] = data[:first]
+        if first < len(data):
+            self.buffer[:len(data) - first] = data[first:]
+        self.head += len(data)
+
+    def view(self, position):
+        # Returns a memoryview of the data from position, up to the head
+        # or the end of the buffer, whichever comes first. Position
+        # must be at most size bytes behind the head
+        start = position % self.size
+        end = min(start + self.head - position, self.size)
+        return memoryview(self.buffer)[start:end]
+
+
+class BroadcastClient(object):
+    # A client of a BroadcastServer, reading the stream from position,
+    # or from pending (from offset) if it has a buffer of its own
+    def __init__(self, sock, address, position, now):
+        self.sock = sock
+        self.address = address
+        self.position = position
+        self.since = now
+        self.sent = 0
+        self.maxlag = 0
+        self.writing = False
+        # The lines sent by the client, and its subscription
+        self.buffer = None
+        self.subscription = None
+        self.pending = None
+        self.offset = 0
+
+    def lag(self, head):
+        # Returns the number of bytes the client has not got yet
+        if self.pending is None:
+            return head - self.position
+        return len(self.pending) - self.offset
+
+    def fileno(self):
+        return self.sock.fileno()
+
+
+class BroadcastServer(object):
+    # A TCP server sending the same stream of data to all its clients,
+    # from one thread. The data is kept in a ring buffer, and each
+    # client has its own position in it, so data is never copied per
+    # client and each client gets as much as it can take in one send.
+    # A client more than maxlag bytes behind is disconnected. Clients
+    # are accepted and served when poller returns the server or them,
+    # and should be passed to ready.
+    # If subscribe is set, the lines starting with SUBSCRIBE a client
+    # sends are passed to it, and it returns the subscription of the
+    # client (or None for all data), or raises ValueError to disconnect
+    # the client. Other lines (like keepalives or echoed sentences) are
+    # ignored. A client
+    # with a subscription gets a buffer of its own, with only the items
+    # its subscription accepts (see send)
+    def __init__(self, address, poller, maxlag=1048576, subscribe=None):
+        self.poller = poller
+        self.maxlag = maxlag
+        self.subscribe = subscribe
+        self.ring = RingBuffer(2 * maxlag)
+        self.clients = []
+        self.evicted = 0
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            self.sock.bind(address)
+            self.sock.listen(socket.SOMAXCONN)
+        except socket.error:
+            self.sock.close()
+            raise
+        self.sock.setblocking(False)
+        self.poller.register(self)
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def send(self, data, now=None, items=None):
+        # Sends data to all clients. Clients with a subscription only
+        # get the parts of data in items, a list of (data, key), whose
+        # key is not None and accepted by subscription.accept(key, now).
+        # Clients that are too far behind are disconnected
+        if now is None:
+            now = time.time()
+        self.ring.append(data)
+        for client in self.clients[:]:
+            if client.pending is not None:
+                if client.subscription is None:
+                    client.pending += data
+                elif items:
+                    accept = client.subscription.accept
+                    client.pending += ''.join([part for part, key in items
+                                               if key is not None and accept(key, now)])
+            lag = client.lag(self.ring.head)
+            if lag > client.maxlag:
+                client.maxlag = lag
+            if lag > self.maxlag:
+                self.evicted += 1
+                self.disconnect(client, "Disconnected the network client %s:%d, which was %d bytes behind" % (client.address[0], client.address[1], lag), logging.WARNING)
+            else:
+                self.write(client)
+
+    def ready(self, item, events, now=None):
+        # Handles the events from the poller for the server or one of
+        # its clients
+        if now is None:
+            now = time.time()
+        if item is self:
+            self.accept(now)
+            return
+        if events & READ:
+            if item.buffer is None:
+                item.buffer = LineBuffer(size=4096, maxline=4096)
+            try:
+                count = item.buffer.recv(item.sock)
+            except socket.error, error:
+                if error.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                    count = None
+                else:
+                    count = 0
+            if count == 0:
+                self.disconnect(item, "The network client %s:%d disconnected" % item.address[:2], logging.DEBUG)
+                return
+            lines = item.buffer.lines()
+            if self.subscribe is not None:
+                for line in lines:
+                    if line.strip() and not self.subscribeclient(item, line.strip()):
+                        return
+        if events & WRITE:
+            self.write(item)
+
+    def subscribeclient(self, client, line):
+        # Sets the subscription of client from a line it sent, if it is
+        # a subscription. Returns False if the client was disconnected
+        if line.split()[0].upper() != 'SUBSCRIBE':
+            return True
+        try:
+            subscription = self.subscribe(line)
+        except ValueError, error:
+            self.disconnect(client, "Disconnected the network client %s:%d, which sent a bad subscription (%s)" % (client.address[0], client.address[1], error), logging.WARNING)
+            return False
+        client.subscription = subscription
+        if subscription is not None and client.pending is None:
+            # Move what the client has not got yet to a buffer of its
+            # own
+            client.pending = bytearray()
+            client.offset = 0
+            while client.position < self.ring.head:
+                view = self.ring.view(client.position)
+                client.pending += view.tobytes()
+                client.position += len(view)
+        return True
+
+    def accept(self, now):
+        # Accepts the clients waiting to connect
+        while True:
+            try:
+                sock, address = self.sock.accept()
+            except socket.error, error:
+                if error.args[0] not in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                    logging.warning("Could not accept a network client (%s)" % os.strerror(error.args[0]))
+                return
+            sock.setblocking(False)
+            client = BroadcastClient(sock, address, self.ring.head, now)
+            self.clients.append(client)
+            self.poller.register(client, READ)
+
+    def write(self, client):
+        # Sends what client has not got yet, as much as it takes, and
+        # waits for the socket to be writable if there is more
+        while client.lag(self.ring.head):
+            if client.pending is None:
+                data = self.ring.view(client.position)
+            else:
+                data = memoryview(client.pending)[client.offset:]
+            try:
+                count = client.sock.send(data)
+            except socket.error, error:
+                if error.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                    break
+                self.disconnect(client, "The connection to the network client %s:%d failed (%s)" % (client.address[0], client.address[1], os.strerror(error.args[0])), logging.DEBUG)
+                return
+            finally:
+                # The buffer cannot be resized while it is viewed
+                data = None
+            if client.pending is None:
+                client.position += count
+            else:
+                client.offset += count
+            client.sent += count
+        if client.pending is not None and client.offset:
+            if client.offset == len(client.pending):
+                if client.subscription is None:
+                    # Back to the ring buffer when all is sent
+                    client.pending = None
+                    client.position = self.ring.head
+                else:
+                    client.pending = bytearray()
+                client.offset = 0
+            elif client.offset > len(client.pending) // 2:
+                del client.pending[:client.offset]
+                client.offset = 0
+        writing = client.lag(self.ring.head) > 0
+        if writing != client.writing:
+            client.writing = writing
+            self.poller.modify(client, READ | (writing and WRITE))
+
+    def disconnect(self, client, reason, level):
+        logging.log(level, reason)
+        self.poller.unregister(client)
+        client.sock.close()
+        self.clients.remove(client)
+
+    def close(self):
+        for client in self.clients[:]:
+            self.poller.unregister(client)
+            client.sock.close()
+        self.clients = []
+        self.poller.unregister(self)
+        self.sock.close()
+
+    def stats(self, now=None):
+        # Returns a list of the address, time connected, bytes sent,
+        # bytes behind now and at most, and if it has a subscription,
+        # of each client
+        if now is None:
+            now = time.time()
+        return [{'address': '%s:%d' % client.address[:2],
+                 'connected': now - client.since, 'sent': client.sent,
+                 'lag': client.lag(self.ring.head),
+                 'maxlag': client.maxlag,
+                 'subscribed': client.subscription is not None}
+                for client in self.clients]
+
+
+def ismulticast(host):
+    # Returns True if host is an IPv4 multicast group (224.0.0.0 to
+    # 239.255.255.255)
+    try:
+        first = ord(socket.inet_aton(socket.gethostbyname(host))[0])
+    except socket.error:
+        return False
+    return 224 <= first <= 239
+
+
+class UdpInput(object):
+    # Receives lines in UDP datagrams on address. If the address is a
+    # multicast group, the group is joined on the interface with the
+    # address interface (any if 0.0.0.0). A datagram may hold several
+    # lines, and lines without a line break get one. The receive
+    # buffer of the socket is made rcvbuf bytes, if the system allows
+    # it, so that bursts are not dropped while the thread is busy.
+    # Like a Feed, it is registered in poller, the owner should call
+    # ready when poller returns it, and it has the same stats (it is
+    # always listening)
+    #   batch -- the most datagrams read each time ready is called, so
+    #            that other sockets in the poller get their turn
+    ratewindow = 10
+
+    def __init__(self, name, address, poller, rcvbuf=4194304,
+                 interface='0.0.0.0', batch=256):
+        self.name = name
+        self.address = address
+        self.poller = poller
+        self.batch = batch
+        self.buffer = bytearray(65536)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+            size = self.sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+            if size < rcvbuf:
+                logging.info("The receive buffer for UDP input %s is %d bytes, the system does not allow %d" % (name, size, rcvbuf))
+            if ismulticast(address[0]):
+                # Bind to any address, as binding to the group does
+                # not work on all systems
+                self.sock.bind(('', address[1]))
+                group = socket.inet_aton(socket.gethostbyname(address[0]))
+                self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP,
+                                     group + socket.inet_aton(interface))
+            else:
+                self.sock.bind(address)
+        except socket.error:
+            self.sock.close()
+            raise
+        self.sock.setblocking(False)
+        self.poller.register(self)
+        self.state = 'listening'
+        self.since = time.time()
+        self.deadline = self.since + self.ratewindow
+        self.datagrams = 0
+        self.bytes = 0
+        self.lines = 0
+        self.windowbytes = 0
+        self.rate = 0.0
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def ready(self, now, events):
+        # Reads the datagrams waiting, up to batch of them, and returns
+        # a list of the lines in them
+        lines = []
+        buffer = self.buffer
+        for i in xrange(self.batch):
+            try:
+                count = self.sock.recv_into(buffer)
+            except socket.error, error:
+                if error.args[0] not in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                    logging.debug("Could not receive from UDP input %s (%s)" % (self.name, os.strerror(error.args[0])))
+                break
+            self.datagrams += 1
+            self.bytes += count
+            self.windowbytes += count
+            start = 0
+            while start < count:
+                linebreak = buffer.find('\n', start, count)
+                if linebreak == -1:
+                    lines.append(str(buffer[start:count]) + '\r\n')
+                    break
+                lines.append(str(buffer[start:linebreak + 1]))
+                start = linebreak + 1
+        self.lines += len(lines)
+        return lines
+
+    def check(self, now):
+        # Updates the rate when it is time
+        if now < self.deadline:
+            return
+        self.rate = self.windowbytes / float(now - self.deadline + self.ratewindow)
+        self.windowbytes = 0
+        self.deadline = now + self.ratewindow
+
+    def timeout(self, now):
+        # Returns the number of seconds until check should be called
+        return max(self.deadline - now, 0)
+
+    def close(self):
+        if self.sock is not None:
+            self.poller.unregister(self)
+            self.sock.close()
+            self.sock = None
+
+    def stats(self, now=None):
+        # Returns the same as Feed.stats, and the datagrams received
+        if now is None:
+            now = time.time()
+        connected = now - self.since
+        rate = self.rate
+        if 1 <= connected < self.ratewindow:
+            rate = self.windowbytes / connected
+        return {'state': self.state, 'connected': connected,
+                'uptime': connected, 'connections': 1, 'failures': 0,
+                'datagrams': self.datagrams, 'bytes': self.bytes,
+                'lines': self.lines, 'rate': rate}
+
+
+class UdpOutput(object):
+    # Sends lines in UDP datagrams to each of addresses, packing as
+    # many whole lines as fit in size bytes in each datagram. Multicast
+    # datagrams are sent on the interface with the address interface,
+    # with the time to live ttl (1 keeps them on the local network)
+    def __init__(self, addresses, interface='0.0.0.0', ttl=1, size=1472):
+        self.addresses = addresses
+        self.size = size
+        self.datagrams = 0
+        self.bytes = 0
+        self.errors = 0
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, ttl)
+        if interface != '0.0.0.0':
+            self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF,
+                                 socket.inet_aton(interface))
+
+    def send(self, data):
+        # Sends data, a string of lines, splitting it only at line
+        # breaks. A line longer than size is sent alone
+        start = 0
+        while start < len(data):
+            end = start + self.size
+            if end < len(data):
+                linebreak = data.rfind('\n', start, end)
+                if linebreak == -1:
+                    linebreak = data.find('\n', end)
+                    if linebreak == -1:
+                        linebreak = len(data) - 1
+                end = linebreak + 1
+            datagram = buffer(data, start, end - start)
+            start = end
+            for address in self.addresses:
+                try:
+                    self.sock.sendto(datagram, address)
+                except socket.error, error:
+                    # Nobody listening on a unicast address, or the
+                    # network is down
+                    self.errors += 1
+                    logging.debug("Could not send to UDP output %s:%d (%s)" % (address[0], address[1], os.strerror(error.args[0])))
+                    continue
+                self.datagrams += 1
+                self.bytes += len(datagram)
+
+    def close(self):
+        self.sock.close()
+
+    def stats(self):
+        # Returns the number of addresses, datagrams and bytes sent,
+        # and the number of failed sends
+        return {'addresses': len(self.addresses),
+                'datagrams': self.datagrams, 'bytes': self.bytes,
+                'errors': self.errors}
+
+
+class TestNetio(unittest.TestCase):
+    def testlinebuffer(self):
+        first, second = socketpair()
+        try:
+            linebuffer = LineBuffer(size=100, maxline=200)
+            sentence = '!AIVDM,1,1,,A,13uTAH002nJRLAHEwTi674rh04:8,0*2B\r\n'
+            first.sendall(sentence + sentence[:20])
+            self.assertEqual(linebuffer.recv(second), len(sentence) + 20)
+            self.assertEqual(linebuffer.lines(), [sentence])
+            # The rest of the line is kept for the next read, and lines
+            # longer than the buffer make it grow
+            first.sendall(sentence[20:] + 'x' * 150 + '\n')
+            lines = []
+            while len(lines) < 2:
+                linebuffer.recv(second)
+                lines.extend(linebuffer.lines())
+            self.assertEqual(lines, [sentence, 'x' * 150 + '\n'])
+            self.assertTrue(len(linebuffer.buffer) > 100)
+            # Too long lines are dropped, all of them
+            first.sendall('y' * 1000 + '\n' + sentence)
+            lines = []
+            while not lines:
+                linebuffer.recv(second)
+                lines.extend(linebuffer.lines())
+            self.assertEqual(lines, [sentence])
+            first.close()
+            self.assertEqual(linebuffer.recv(second), 0)
+        finally:
+            first.close()
+            second.close()
+
+    def testpoller(self):
+        poller = Poller()
+        waker = Waker()
+        first, second = socketpair()
+        try:
+            poller.register(waker)
+            poller.register(second)
+            self.assertEqual(poller.poll(0), [])
+            waker.wake()
+            waker.wake()
+            self.assertEqual(poller.poll(1), [(waker, READ)])
+            waker.clear()
+            self.assertEqual(poller.poll(0), [])
+            # It wakes again after clear
+            waker.wake()
+            self.assertEqual(poller.poll(1), [(waker, READ)])
+            waker.clear()
+            self.assertEqual(poller.poll(0), [])
+            first.send('data')
+            self.assertEqual(poller.poll(1), [(second, READ)])
+            poller.modify(second, READ | WRITE)
+            self.assertEqual(poller.poll(1), [(second, READ | WRITE)])
+            poller.unregister(second)
+            self.assertEqual(poller.poll(0), [])
+        finally:
+            waker.close()
+            first.close()
+            second.close()
+
+    def testfeed(self):
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.bind(('127.0.0.1', 0))
+        listener.listen(1)
+        poller = Poller()
+        feed = Feed('test', listener.getsockname(), poller, stallrate=10.0,
+                    stalltime=20.0)
+        try:
+            # Connect at once, and start streaming when connected
+            feed.check(100.0)
+            self.assertEqual(feed.state, 'connecting')
+            self.assertEqual(feed.timeout(100.0), 30.0)
+            server = listener.accept()[0]
+            self.assertEqual(poller.poll(1), [(feed, WRITE)])
+            self.assertEqual(feed.ready(101.0, WRITE), [])
+            self.assertEqual(feed.state, 'streaming')
+            server.sendall('!AIVDM,1,1,,A,13uTAH002nJRLAHEwTi674rh04:8,0*2B\r\n' * 10)
+            lines = []
+            while len(lines) < 10:
+                poller.poll(1)
+                lines.extend(feed.ready(102.0, READ))
+            self.assertEqual(feed.stats(111.0)['bytes'], 490)
+            # The rate is checked every ten seconds, the feed stalls
+            # when it is too low and reconnects when it has stalled for
+            # stalltime seconds
+            feed.check(111.0)
+            self.assertEqual((feed.state, feed.rate), ('streaming', 49.0))
+            feed.check(121.0)
+            self.assertEqual(feed.state, 'stalled')
+            feed.check(131.0)
+            self.assertEqual(feed.state, 'stalled')
+            feed.check(141.0)
+            self.assertEqual(feed.state, 'backing_off')
+            self.assertEqual(feed.stats(141.0)['uptime'], 40.0)
+            self.assertTrue(141.5 <= feed.deadline <= 142.0)
+            server.close()
+            # The delay doubles for each failure in a row
+            feed.check(142.0)
+            self.assertEqual(feed.state, 'connecting')
+            feed.check(172.0)
+            self.assertEqual(feed.state, 'backing_off')
+            self.assertTrue(173.0 <= feed.deadline <= 174.0)
+            self.assertEqual(feed.stats()['failures'], 2)
+            self.assertEqual(poller.poll(0), [])
+        finally:
+            feed.close()
+            listener.close()
+
+    def testringbuffer(self):
+        ring = RingBuffer(8)
+        ring.append('abcdef')
+        self.assertEqual(ring.view(2).tobytes(), 'cdef')
+        # Data across the end of the buffer is read in two parts
+        ring.append('ghij')
+        self.assertEqual(ring.head, 10)
+        self.assertEqual(ring.view(4).tobytes(), 'efgh')
+        self.assertEqual(ring.view(8).tobytes(), 'ij')
+        ring.append('0123456789')
+        self.assertEqual(ring.view(12).tobytes(), '2345')
+        self.assertEqual(ring.view(16).tobytes(), '6789')
+
+    def testbroadcastserver(self):
+        poller = Poller()
+        server = BroadcastServer(('127.0.0.1', 0), poller, maxlag=100000)
+        clients = [socket.create_connection(server.sock.getsockname()) for i in range(2)]
+        try:
+            while len(server.clients) < 2:
+                for item, events in poller.poll(1):
+                    server.ready(item, events)
+            line = '!AIVDM,1,1,,A,13uTAH002nJRLAHEwTi674rh04:8,0*2B\r\n'
+            server.send(line * 10)
+            for client in clients:
+                data = ''
+                while len(data) < len(line) * 10:
+                    data += client.recv(4096)
+                self.assertEqual(data, line * 10)
+            self.assertEqual([stats['lag'] for stats in server.stats()], [0, 0])
+            # Keep the socket buffers of the second client small
+            clients[1].setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+            server.clients[1].sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+            # A client that does not read is disconnected when it is too
+            # far behind, the others get everything
+            data = ''
+            for i in range(200):
+                server.send(line * 100)
+                for item, events in poller.poll(0):
+                    server.ready(item, events)
+                try:
+                    clients[0].setblocking(False)
+                    while True:
+                        data += clients[0].recv(65536)
+                except socket.error:
+                    pass
+            self.assertEqual(server.evicted, 1)
+            self.assertEqual(len(server.clients), 1)
+            clients[0].setblocking(True)
+            while len(data) < len(line) * 20000:
+                data += clients[0].recv(65536)
+            self.assertEqual(data, line * 20000)
+            # Clients that disconnect are removed
+            clients[0].close()
+            while server.clients:
+                for item, events in poller.poll(1):
+                    server.ready(item, events)
+        finally:
+            server.close()
+            for client in clients:
+                client.close()
+
+    def testsubscriptions(self):
+        class Keys(object):
+            def __init__(self, keys):
+                self.keys = keys
+            def accept(self, key, now):
+                return key in self.keys
+        def subscribe(line):
+            words = line.split()
+            if words[0] != 'SUBSCRIBE' or '=' in line:
+                raise ValueError("not a subscription")
+            return words[1:] and Keys(words[1:]) or None
+        def serve(until):
+            while not until():
+                for item, events in poller.poll(1):
+                    server.ready(item, events)
+        def receive(client, size):
+            data = ''
+            while len(data) < size:
+                data += client.recv(4096)
+            return data
+        poller = Poller()
+        server = BroadcastServer(('127.0.0.1', 0), poller, subscribe=subscribe)
+        clients = [socket.create_connection(server.sock.getsockname()) for i in range(4)]
+        try:
+            serve(lambda: len(server.clients) == 4)
+            clients[0].sendall('SUBSCRIBE a c\r\n')
+            # Lines that are not subscriptions are ignored, a bad
+            # subscription disconnects the client
+            clients[2].sendall('HELLO\n!AIVDM,1,1,,A,13uTAH002nJRLAHEwTi674rh04:8,0*2B\r\n')
+            clients[3].sendall('SUBSCRIBE area=1\n')
+            serve(lambda: len(server.clients) == 3 and server.clients[0].subscription)
+            # Subscribed clients only get the items they accept, the
+            # others everything
+            items = [('1a,', 'a'), ('2b,', 'b'), ('3-,', None), ('4c,', 'c')]
+            server.send('1a,2b,3-,4c,', items=items)
+            self.assertEqual(receive(clients[0], 6), '1a,4c,')
+            self.assertEqual(receive(clients[1], 12), '1a,2b,3-,4c,')
+            self.assertEqual(receive(clients[2], 12), '1a,2b,3-,4c,')
+            self.assertEqual([stats['subscribed'] for stats in server.stats()], [True, False, False])
+            # A subscription to everything takes the client back to the
+            # ring buffer
+            clients[0].sendall('SUBSCRIBE\n')
+            serve(lambda: server.clients[0].subscription is None)
+            server.send('1a,2b,3-,4c,', items=items)
+            self.assertEqual(receive(clients[0], 12), '1a,2b,3-,4c,')
+            self.assertEqual(server.clients[0].pending, None)
+        finally:
+            server.close()
+            for client in clients:
+                client.close()
+
+    def testudp(self):
+        poller = Poller()
+        udpinput = UdpInput('udp:test', ('127.0.0.1', 0), poller,
+                            rcvbuf=65536)
+        output = UdpOutput([udpinput.sock.getsockname()], size=100)
+        try:
+            self.assertTrue(ismulticast('239.192.0.1'))
+            self.assertFalse(ismulticast('127.0.0.1'))
+            sentence = '!AIVDM,1,1,,A,13uTAH002nJRLAHEwTi674rh04:8,0*2B\r\n'
+            # Two sentences fit in each datagram of 100 bytes
+            output.send(sentence * 5)
+            self.assertEqual(output.stats()['datagrams'], 3)
+            output.send('x' * 150 + '\n' + sentence[:-2])
+            self.assertEqual(output.stats()['datagrams'], 5)
+            lines = []
+            while len(lines) < 7:
+                self.assertEqual(poller.poll(1), [(udpinput, READ)])
+                lines.extend(udpinput.ready(100.0, READ))
+            # Lines without a line break get one
+            self.assertEqual(lines, [sentence] * 5 + ['x' * 150 + '\n', sentence])
+            self.assertEqual(udpinput.stats()['datagrams'], 5)
+            self.assertEqual(udpinput.ready(100.0, READ), [])
+        finally:
+            udpinput.close()
+            output.close()
+
+if __name__ == '__main__':
+    unittest.main()
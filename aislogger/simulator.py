@@ -0,0 +1,344 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# simulator.py (part of "AIS Logger")
+# Simulated AIS traffic
+#
+# Simulates vessels moving in an area and makes the AIVDM sentences
+# they send, to load test the program. The traffic can be written to
+# a file, served to clients over TCP like the network server of the
+# program does, or put directly in the queue of CommHubThread
+#
+# Copyright (c) 2006-2009 Erik I.J. Olsson <olcai@users.sourceforge.net>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import datetime
+import heapq
+import math
+import optparse
+import random
+import socket
+import SocketServer
+import sys
+import threading
+import time
+
+import decode
+import encode
+
+# The area vessels move in as (south, west, north, east)
+default_bbox = (57.0, 10.5, 58.0, 12.0)
+
+# Seconds between the reports of each kind
+position_interval = {'A': 10, 'B': 30}
+static_interval = 360
+
+# Country codes (MID) used for the MMSI numbers
+mids = [219, 230, 244, 257, 265, 266, 211]
+# Words for the names of vessels
+name_words = ['NORDIC', 'STAR', 'SEA', 'BREEZE', 'WIND', 'OCEAN', 'STENA',
+              'POLAR', 'NORTH', 'CARRIER', 'SPIRIT', 'KARIN', 'MARIA',
+              'VIKING', 'ISLAND', 'PRINCESS']
+destinations = ['GOTEBORG', 'FREDERIKSHAVN', 'OSLO', 'KIEL', 'HAMBURG',
+                'ROTTERDAM', 'SKAGEN', 'AARHUS']
+
+
+class TrafficSimulator(object):
+    # Simulates count vessels moving in a straight line in the area
+    # bbox, turning back at its edges. A share classb of them are
+    # class B. Class A vessels send message 1 (now and then 2 or 3)
+    # every 10 seconds and message 5 every 6 minutes, class B vessels
+    # message 18 every 30 seconds and both parts of message 24 every 6
+    # minutes. The time is simulated and starts at start (the UNIX
+    # time, now if None). With the same seed, the same traffic is made
+    # every time. If tagblocks is set, each sentence gets an NMEA 4
+    # tag block with its time
+    def __init__(self, count, bbox=default_bbox, classb=0.3, start=None,
+                 seed=None, tagblocks=False):
+        self.random = random.Random(seed)
+        self.bbox = bbox
+        self.tagblocks = tagblocks
+        if start is None:
+            start = time.time()
+        self.time = start
+        self.seqid = 0
+        # The vessels, as dicts with the fields of their messages
+        self.vessels = []
+        # The reports to send, as (time, vessel number, kind)
+        self.schedule = []
+        for number in xrange(count):
+            vessel = self.makevessel(self.random.random() < classb)
+            vessel['updated'] = start
+            self.vessels.append(vessel)
+            # Spread the first reports over the intervals
+            interval = position_interval[vessel['class']]
+            self.schedule.append((start + self.random.random() * interval,
+                                  number, 'position'))
+            self.schedule.append((start + self.random.random() * static_interval,
+                                  number, 'static'))
+        heapq.heapify(self.schedule)
+
+    def makevessel(self, classb):
+        # Returns a new vessel at a random place in the area
+        rand = self.random
+        south, west, north, east = self.bbox
+        vessel = {'mmsi': rand.choice(mids) * 1000000 + rand.randint(0, 999999),
+                  'class': classb and 'B' or 'A',
+                  'latitude': rand.uniform(south, north),
+                  'longitude': rand.uniform(west, east),
+                  'cog': rand.uniform(0, 360),
+                  'posacc': rand.randint(0, 1),
+                  'rot': 0,
+                  'name': '%s %s' % (rand.choice(name_words), rand.choice(name_words)),
+                  'callsign': ''.join([rand.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789')
+                                       for i in range(5)]),
+                  'destination': rand.choice(destinations),
+                  'eta': '%02d%02d%02d%02d' % (rand.randint(1, 12), rand.randint(1, 28),
+                                               rand.randint(0, 23), rand.randint(0, 59))}
+        if classb:
+            vessel.update({'sog': rand.uniform(2, 12), 'type': 37,
+                           'vendor': 'SIMUL', 'length': rand.randint(6, 20),
+                           'width': rand.randint(2, 6)})
+        else:
+            vessel.update({'sog': rand.uniform(8, 22),
+                           'navstatus': 0,
+                           'imo': rand.randint(7000000, 9999999),
+                           'type': rand.choice([30, 52, 60, 70, 80]),
+                           'length': rand.randint(50, 300),
+                           'width': rand.randint(10, 45),
+                           'draught': rand.randint(30, 150) / 10.0})
+            # Some ships are at anchor
+            if rand.random() < 0.1:
+                vessel.update({'sog': 0.0, 'navstatus': 1})
+        vessel['heading'] = int(vessel['cog'])
+        return vessel
+
+    def move(self, vessel, now):
+        # Moves vessel from where it was at its last update to where
+        # it is at now, turning back at the edges of the area
+        seconds = now - vessel['updated']
+        vessel['updated'] = now
+        if not vessel['sog']:
+            return
+        south, west, north, east = self.bbox
+        # Nautical miles are minutes of latitude
+        distance = vessel['sog'] * seconds / 3600.0 / 60
+        course = math.radians(vessel['cog'])
+        latitude = vessel['latitude'] + distance * math.cos(course)
+        longitude = vessel['longitude'] + (distance * math.sin(course) /
+                                           math.cos(math.radians(latitude)))
+        if not south <= latitude <= north:
+            vessel['cog'] = (180 - vessel['cog']) % 360
+            latitude = min(max(latitude, south), north)
+        if not west <= longitude <= east:
+            vessel['cog'] = (360 - vessel['cog']) % 360
+            longitude = min(max(longitude, west), east)
+        # Change course a little now and then
+        if self.random.random() < 0.05:
+            vessel['cog'] = (vessel['cog'] + self.random.uniform(-20, 20)) % 360
+        vessel['heading'] = int(vessel['cog'])
+        vessel['latitude'] = latitude
+        vessel['longitude'] = longitude
+
+    def report(self, vessel, kind, now):
+        # Returns the AIVDM sentences vessel sends for a report of kind
+        # ('position' or 'static'), with the radio channel by random
+        channel = self.random.choice('AB')
+        if kind == 'position':
+            self.move(vessel, now)
+            if vessel['class'] == 'B':
+                return encode.encodesentences(vessel, channel, messagetype=18)
+            # Mostly scheduled reports
+            messagetype = self.random.choice([1, 1, 1, 1, 1, 1, 1, 1, 2, 3])
+            return encode.encodesentences(vessel, channel, messagetype=messagetype)
+        if vessel['class'] == 'B':
+            return (encode.encodesentences(vessel, channel, messagetype=24, part=0) +
+                    encode.encodesentences(vessel, channel, messagetype=24, part=1))
+        self.seqid = (self.seqid + 1) % 10
+        return encode.encodesentences(vessel, channel, self.seqid, messagetype=5)
+
+    def advance(self, seconds):
+        # Runs the simulation seconds forward and returns the lines
+        # (with line breaks) sent during that time, in time order
+        end = self.time + seconds
+        schedule = self.schedule
+        lines = []
+        while schedule and schedule[0][0] <= end:
+            now, number, kind = schedule[0]
+            vessel = self.vessels[number]
+            if kind == 'position':
+                interval = position_interval[vessel['class']]
+            else:
+                interval = static_interval
+            heapq.heapreplace(schedule, (now + interval, number, kind))
+            if self.tagblocks:
+                tag = 'c:%d' % now
+                prefix = '\\%s*%02X\\' % (tag, decode.xorbytes(tag))
+            else:
+                prefix = ''
+            for sentence in self.report(vessel, kind, now):
+                lines.append(prefix + sentence + '\r\n')
+        self.time = end
+        return lines
+
+    def rate(self):
+        # Returns the average number of sentences sent each second
+        rate = 0.0
+        for vessel in self.vessels:
+            if vessel['class'] == 'B':
+                rate += 1.0 / position_interval['B'] + 2.0 / static_interval
+            else:
+                rate += 1.0 / position_interval['A'] + 2.0 / static_interval
+        return rate
+
+
+def run(simulator, output, speed=1.0, duration=None, step=1.0):
+    # Runs simulator for duration simulated seconds (for ever if None),
+    # speed times faster than real time or as fast as possible if speed
+    # is 0, and calls output with the lines made in each step seconds.
+    # Returns the number of lines made
+    count = 0
+    started = time.time()
+    elapsed = 0.0
+    while duration is None or elapsed < duration:
+        if duration is not None:
+            step = min(step, duration - elapsed)
+        lines = simulator.advance(step)
+        elapsed += step
+        output(lines)
+        count += len(lines)
+        if speed:
+            # Wait until it is time for the next step
+            delay = started + elapsed / speed - time.time()
+            if delay > 0:
+                time.sleep(delay)
+    return count
+
+def writefile(simulator, filename, duration, speed=0):
+    # Writes duration seconds of simulated traffic to the file
+    # filename, as fast as possible unless speed is given. Returns the
+    # number of lines written
+    output = open(filename, 'wb')
+    try:
+        return run(simulator, lambda lines: output.write(''.join(lines)),
+                   speed, duration)
+    finally:
+        output.close()
+
+def inject(simulator, put, source='Simulator', speed=1.0, duration=None):
+    # Puts the simulated traffic in a queue, like CommHubThread.put,
+    # as [source, line, time read] items, as if read from an input.
+    # The lines are "read" once for each step
+    def output(lines):
+        received = datetime.datetime.now()
+        for line in lines:
+            put([source, line, received])
+    return run(simulator, output, speed, duration)
+
+
+class TrafficServer(SocketServer.ThreadingTCPServer):
+    # A TCP server sending the simulated traffic to all clients
+    # connected to it, like NetworkServerThread does with the data it
+    # gets
+    daemon_threads = True
+    allow_reuse_address = True
+
+    class ClientHandler(SocketServer.BaseRequestHandler):
+        def handle(self):
+            # Register the client and wait until it disconnects
+            self.server.add(self.request)
+            try:
+                while self.request.recv(1024):
+                    pass
+            except socket.error:
+                pass
+            self.server.remove(self.request)
+
+    def __init__(self, address):
+        SocketServer.ThreadingTCPServer.__init__(self, address, self.ClientHandler)
+        self.clients = []
+        self.lock = threading.Lock()
+
+    def add(self, client):
+        self.lock.acquire()
+        self.clients.append(client)
+        self.lock.release()
+
+    def remove(self, client):
+        self.lock.acquire()
+        if client in self.clients:
+            self.clients.remove(client)
+        self.lock.release()
+
+    def send(self, lines):
+        # Sends lines to all clients, dropping the clients that fail
+        data = ''.join(lines)
+        self.lock.acquire()
+        clients = self.clients[:]
+        self.lock.release()
+        for client in clients:
+            try:
+                client.sendall(data)
+            except socket.error:
+                self.remove(client)
+
+def serve(simulator, address, speed=1.0, duration=None):
+    # Serves the simulated traffic over TCP on address (host, port)
+    server = TrafficServer(address)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.setDaemon(1)
+    thread.start()
+    try:
+        return run(simulator, server.send, speed, duration)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == '__main__':
+    cmdlineparser = optparse.OptionParser(usage="%prog [options] [file]")
+    cmdlineparser.add_option("-n", "--vessels", type="int", dest="vessels", default=1000, help="Number of vessels")
+    cmdlineparser.add_option("-b", "--bbox", dest="bbox", default=','.join(map(str, default_bbox)), help="Area as south,west,north,east in decimal degrees")
+    cmdlineparser.add_option("-d", "--duration", type="float", dest="duration", default=None, help="Simulated seconds to run (default for ever, or an hour for a file)")
+    cmdlineparser.add_option("-s", "--speed", type="float", dest="speed", default=None, help="Times faster than real time, 0 for as fast as possible (default 1, or 0 for a file)")
+    cmdlineparser.add_option("-p", "--port", type="int", dest="port", default=None, help="Serve the traffic over TCP on this port instead of writing a file")
+    cmdlineparser.add_option("-a", "--address", dest="address", default="localhost", help="Address to serve the traffic on")
+    cmdlineparser.add_option("-r", "--seed", type="int", dest="seed", default=None, help="Seed for random numbers, to make the same traffic every time")
+    cmdlineparser.add_option("-t", "--tagblocks", action="store_true", dest="tagblocks", default=False, help="Put the time in a tag block before each sentence")
+    (options, args) = cmdlineparser.parse_args()
+    bbox = tuple([float(value) for value in options.bbox.split(',')])
+    simulator = TrafficSimulator(options.vessels, bbox, seed=options.seed,
+                                 tagblocks=options.tagblocks)
+    print >> sys.stderr, "%d vessels, %.0f sentences/s at real time" % (options.vessels, simulator.rate())
+    started = time.time()
+    if options.port:
+        if options.speed is None:
+            options.speed = 1.0
+        count = serve(simulator, (options.address, options.port),
+                      options.speed, options.duration)
+    elif args:
+        if options.duration is None:
+            options.duration = 3600
+        count = writefile(simulator, args[0], options.duration,
+                          options.speed or 0)
+    else:
+        cmdlineparser.error("No file or port to send the traffic to")
+    elapsed = time.time() - started
+    print >> sys.stderr, "%d sentences in %.1f s (%.0f sentences/s)" % (count, elapsed, count / elapsed)
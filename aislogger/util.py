@@ -210,44 +210,59 @@ def georef(lat,long):
     # Extract letters for longitude
     # Degrees E/W are converted to degrees 0-360
     # Big square = abs value, small square = the reminder
-    if long > 0: longdegree = 180 + int(long)
-    elif long < 0: longdegree = 179 + int(long)
+    longdegree, longminute = georefdegrees(long, 180)
     bigsqlong = letters[longdegree / 15]
     smallsqlong = letters[longdegree % 15]
 
     # Extract letters for latitude
     # Degrees N/S are converted to degrees 0-180
     # Big square = abs value, small square = the reminder
-    if lat > 0: latdegree = 90 + int(lat)
-    elif lat < 0: latdegree = 89 + int(lat)
+    latdegree, latminute = georefdegrees(lat, 90)
     bigsqlat = letters[latdegree / 15]
     smallsqlat = letters[latdegree % 15]
 
-    # Extract minutes from latitude and logitude
-    # Take into account that minutes start from the zero
-    # meridian and the equator - GEOREF start from the
-    # international date line...
-    longdecmin = abs(long - int(long))
-    latdecmin = abs(lat - int(lat))
-    if long > 0: # East
-        longminute = longdecmin * 60
-    elif long < 0: # West
-        longminute = (1 - longdecmin) * 60
-    if lat > 0: # North
-        latminute = latdecmin * 60
-    elif lat < 0: # South
-        latminute = (1 - latdecmin) * 60
-    minutes = str(int(longminute)).zfill(2) + str(int(latminute)).zfill(2)
+    minutes = str(longminute).zfill(2) + str(latminute).zfill(2)
 
     return bigsqlong + bigsqlat + smallsqlong + smallsqlat + ' ' + minutes
 
+def georefdegrees(value, offset):
+    # Returns the whole degrees and minutes of a latitude or longitude
+    # in DD format as used by GEOREF, where the degrees are counted
+    # from -offset degrees (the international date line or the south
+    # pole). Take into account that minutes start from the zero
+    # meridian and the equator - GEOREF start from the
+    # international date line...
+    if isinstance(value, float):
+        # Floats are calculated in millionths of degrees, so that the
+        # minutes are truncated like for the decimals from decode
+        micro = int(round(value * 1000000))
+        degree, fraction = divmod(abs(micro), 1000000)
+        if micro > 0: # North/East
+            return offset + degree, fraction * 60 // 1000000
+        elif micro < 0: # South/West
+            return offset - 1 - degree, (1000000 - fraction) * 60 // 1000000
+    else:
+        decmin = abs(value - int(value))
+        if value > 0: # North/East
+            return offset + int(value), int(decmin * 60)
+        elif value < 0: # South/West
+            return offset - 1 + int(value), int((1 - decmin) * 60)
+    # There is no GEOREF for positions on the zero meridian or the
+    # equator
+    raise ValueError("No GEOREF for %s" % value)
+
 
 
 ###############################################################################
 #
 # From WxPython demo file images.py
 
-from wx import ImageFromStream, BitmapFromImage
+# The bitmaps are only used by the GUI, the rest of this module is also
+# used without wxPython (see archive.py)
+try:
+    from wx import ImageFromStream, BitmapFromImage
+except ImportError:
+    pass
 import cStringIO
 
 def getSmallUpArrowData():